@@ -1 +1,50 @@
-from . import data 
\ No newline at end of file
+import asyncio
+import importlib
+from typing import Optional
+
+# RAG.data pulls in LangChain, OpenAI and PGVector and builds its clients when
+# imported, which takes seconds and fails without OPENAI_API_KEY. It is only
+# imported on first use or by the startup warm-up, and off the event loop.
+RAG_DATA_MODULE = "RAG.data"
+
+# Set once the import has finished, never to a half-imported module
+_recommender = None
+# The import in progress, shared by the warm-up and every request waiting on it
+_load_task: Optional[asyncio.Task] = None
+
+
+async def load_recommender():
+    global _recommender, _load_task
+    if _recommender is not None:
+        return _recommender
+
+    if _load_task is None:
+        _load_task = asyncio.create_task(
+            asyncio.to_thread(importlib.import_module, RAG_DATA_MODULE)
+        )
+    task = _load_task
+    try:
+        # A cancelled request must not cancel the load for everyone else
+        module = await asyncio.shield(task)
+    except Exception:
+        # A failed import leaves nothing behind, the next use tries again
+        if _load_task is task:
+            _load_task = None
+        raise
+
+    _recommender = module
+    return module
+
+
+async def get_recommendations(interests: str):
+    recommender = await load_recommender()
+    return await recommender.get_recommendations(interests)
+
+
+async def warm_up_recommender():
+    try:
+        await load_recommender()
+        print("Recommendation system loaded.")
+    except Exception as e:
+        # Retried on first use
+        print(f"Recommendation system could not be loaded: {e}")
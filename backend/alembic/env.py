@@ -16,6 +16,10 @@ from models import (  # noqa: F401
     session,
     transaction,
     user_tracker,
+    idempotency,
+    email_outbox,
+    catalog_version,
+    pubsub_payload,
 )
 
 sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
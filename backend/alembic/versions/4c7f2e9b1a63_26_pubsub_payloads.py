@@ -0,0 +1,36 @@
+"""26_pubsub payloads
+
+Revision ID: 4c7f2e9b1a63
+Revises: 7b1e5d3a8c42
+Create Date: 2026-10-19 21:14:38.904127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c7f2e9b1a63'
+down_revision: Union[str, Sequence[str], None] = '7b1e5d3a8c42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'pubsub_payloads',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_pubsub_payloads_created_at', 'pubsub_payloads', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_pubsub_payloads_created_at', table_name='pubsub_payloads')
+    op.drop_table('pubsub_payloads')
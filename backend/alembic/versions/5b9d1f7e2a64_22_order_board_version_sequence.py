@@ -0,0 +1,28 @@
+"""22_order board version sequence
+
+Revision ID: 5b9d1f7e2a64
+Revises: e3a8c6f0b912
+Create Date: 2026-10-19 14:02:37.118264
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b9d1f7e2a64'
+down_revision: Union[str, Sequence[str], None] = 'e3a8c6f0b912'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(sa.schema.CreateSequence(sa.Sequence('order_board_version_seq')))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(sa.schema.DropSequence(sa.Sequence('order_board_version_seq')))
@@ -0,0 +1,37 @@
+"""25_catalog versions
+
+Revision ID: 7b1e5d3a8c42
+Revises: 2f8d4b6c9e15
+Create Date: 2026-10-19 19:02:17.386215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b1e5d3a8c42'
+down_revision: Union[str, Sequence[str], None] = '2f8d4b6c9e15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    catalog_versions = op.create_table(
+        'catalog_versions',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    op.bulk_insert(
+        catalog_versions,
+        [{'name': 'catalog', 'version': 0}, {'name': 'settings', 'version': 0}],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('catalog_versions')
@@ -0,0 +1,39 @@
+"""20_pending return partial index
+
+Revision ID: 7d2e5b8a4c31
+Revises: c4f1a9d27e10
+Create Date: 2026-10-19 11:03:54.871265
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2e5b8a4c31'
+down_revision: Union[str, Sequence[str], None] = 'c4f1a9d27e10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_borrow_order_books_pending_return',
+        'borrow_order_books',
+        ['expected_return_date', 'user_id'],
+        unique=False,
+        postgresql_where=sa.text(
+            "return_order_id IS NULL AND actual_return_date IS NULL "
+            "AND borrow_book_problem = 'NORMAL'"
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        'ix_borrow_order_books_pending_return', table_name='borrow_order_books'
+    )
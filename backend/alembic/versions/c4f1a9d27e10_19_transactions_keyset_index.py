@@ -0,0 +1,32 @@
+"""19_transactions keyset index
+
+Revision ID: c4f1a9d27e10
+Revises: ee24dddc0fdf
+Create Date: 2026-10-19 10:12:31.204118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f1a9d27e10'
+down_revision: Union[str, Sequence[str], None] = 'ee24dddc0fdf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_transactions_user_id_created_at_id',
+        'transactions',
+        ['user_id', 'created_at', 'id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_transactions_user_id_created_at_id', table_name='transactions')
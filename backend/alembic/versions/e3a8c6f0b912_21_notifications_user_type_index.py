@@ -0,0 +1,32 @@
+"""21_notifications user type index
+
+Revision ID: e3a8c6f0b912
+Revises: 7d2e5b8a4c31
+Create Date: 2026-10-19 12:41:08.502337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a8c6f0b912'
+down_revision: Union[str, Sequence[str], None] = '7d2e5b8a4c31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_notifications_user_id_type_id',
+        'notifications',
+        ['user_id', 'type', 'id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_notifications_user_id_type_id', table_name='notifications')
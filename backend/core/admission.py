@@ -0,0 +1,212 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict, List, Optional, Tuple
+
+from core.serialization import JSONResponse
+from settings import settings
+
+CRITICAL = "critical"
+DEFAULT = "default"
+LOW = "low"
+
+# Lower number is served first
+LANE_PRIORITIES = {CRITICAL: 0, DEFAULT: 1, LOW: 2}
+
+# (method, path prefix, lane, route concurrency limit), first match wins.
+# Route limits cap endpoints that are expensive whatever the load.
+ROUTE_RULES: List[Tuple[str, str, str, Optional[int]]] = [
+    ("POST", "/api/order/", CRITICAL, None),
+    ("POST", "/api/auth/", CRITICAL, None),
+    ("GET", "/api/auth/me", CRITICAL, None),
+    ("POST", "/api/wallet/create-checkout-session", CRITICAL, None),
+    ("GET", "/api/wallet/payment-success", CRITICAL, None),
+    # Scrapes matter most under load, and don't touch the database
+    ("GET", "/metrics", CRITICAL, None),
+    ("GET", "/api/interests", LOW, 4),
+    ("GET", "/api/manager/dashboard-stats", LOW, 4),
+    ("GET", "/api/books/borrow", LOW, None),
+    ("GET", "/api/books/purchase", LOW, None),
+    ("GET", "/api/books/bestsellers", LOW, None),
+    ("GET", "/api/books/authors", LOW, None),
+    ("GET", "/api/books/categories", LOW, None),
+]
+
+
+def classify_request(
+    method: str, path: str
+) -> Tuple[str, Optional[str], Optional[int]]:
+    """Lane, route key and route limit of a request."""
+    for rule_method, prefix, lane, route_limit in ROUTE_RULES:
+        if method == rule_method and path.startswith(prefix):
+            return lane, f"{rule_method} {prefix}", route_limit
+    return DEFAULT, None, None
+
+
+class Overloaded(Exception):
+    pass
+
+
+class AdmissionController:
+    """
+    Caps how many requests run at once, sized to the database pool. Each lane
+    may only fill part of the capacity, so listing and recommendations leave
+    room for checkout and auth. When a lane is full, requests wait a short
+    while in priority order and are then rejected instead of piling up on the
+    pool.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        lane_shares: Dict[str, float],
+        max_queue: int,
+        queue_timeout_seconds: float,
+    ):
+        self.lane_limits = {
+            lane: max(1, int(max_concurrency * share))
+            for lane, share in lane_shares.items()
+        }
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.in_flight = 0
+        self.route_in_flight: Dict[str, int] = {}
+        # (priority, order, lane, future)
+        self.waiters: list = []
+        self.counter = itertools.count()
+        self.stats = {
+            lane: {
+                "admitted": 0,
+                "queued": 0,
+                "rejected": 0,
+                "queue_wait_seconds_total": 0.0,
+            }
+            for lane in lane_shares
+        }
+
+    async def acquire(
+        self, lane: str, route: Optional[str], route_limit: Optional[int]
+    ):
+        stats = self.stats[lane]
+        if route_limit is not None:
+            if self.route_in_flight.get(route, 0) >= route_limit:
+                stats["rejected"] += 1
+                raise Overloaded()
+            # Reserved before queueing, so queued requests count against the cap
+            self.route_in_flight[route] = self.route_in_flight.get(route, 0) + 1
+
+        try:
+            self._drop_timed_out_waiters()
+            # Only waiters of the same or a higher priority go first
+            queue_ahead = self.waiters and self.waiters[0][0] <= LANE_PRIORITIES[lane]
+            if self.in_flight < self.lane_limits[lane] and not queue_ahead:
+                self.in_flight += 1
+            else:
+                await self._wait(lane)
+        except BaseException:
+            if route_limit is not None:
+                self.route_in_flight[route] -= 1
+            raise
+
+        stats["admitted"] += 1
+
+    def release(self, route: Optional[str]):
+        if route in self.route_in_flight:
+            self.route_in_flight[route] -= 1
+        self.in_flight -= 1
+        self._wake()
+
+    def get_metrics(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": sum(not waiter[3].done() for waiter in self.waiters),
+            "lanes": self.stats,
+        }
+
+    async def _wait(self, lane: str):
+        stats = self.stats[lane]
+        if len(self.waiters) >= self.max_queue:
+            stats["rejected"] += 1
+            raise Overloaded()
+
+        stats["queued"] += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self.waiters, (LANE_PRIORITIES[lane], next(self.counter), lane, future)
+        )
+        queued_at = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.queue_timeout_seconds):
+                await future
+        except (TimeoutError, asyncio.CancelledError) as e:
+            # The slot may have been handed over just as the wait ended
+            if future.done() and not future.cancelled():
+                self.release(None)
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            stats["rejected"] += 1
+            raise Overloaded()
+        finally:
+            stats["queue_wait_seconds_total"] += time.perf_counter() - queued_at
+
+    def _drop_timed_out_waiters(self):
+        while self.waiters and self.waiters[0][3].done():
+            heapq.heappop(self.waiters)
+
+    def _wake(self):
+        self._drop_timed_out_waiters()
+        while self.waiters:
+            _, _, lane, future = self.waiters[0]
+            # Lower priority lanes have smaller limits, so they can't run either
+            if self.in_flight >= self.lane_limits[lane]:
+                return
+            heapq.heappop(self.waiters)
+            self.in_flight += 1
+            future.set_result(None)
+            self._drop_timed_out_waiters()
+
+
+admission_controller = AdmissionController(
+    max_concurrency=settings.ADMISSION_MAX_CONCURRENCY,
+    lane_shares={
+        CRITICAL: 1.0,
+        DEFAULT: settings.ADMISSION_DEFAULT_LANE_SHARE,
+        LOW: settings.ADMISSION_LOW_LANE_SHARE,
+    },
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    queue_timeout_seconds=settings.ADMISSION_QUEUE_TIMEOUT_MS / 1000,
+)
+
+
+def overloaded_response() -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The server is busy, please retry shortly."},
+        headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)},
+    )
+
+
+class AdmissionMiddleware:
+    """ASGI middleware running every HTTP request through the controller."""
+
+    def __init__(self, app, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        lane, route, route_limit = classify_request(scope["method"], scope["path"])
+        try:
+            await self.controller.acquire(lane, route, route_limit)
+        except Overloaded:
+            return await overloaded_response()(scope, receive, send)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route if route_limit is not None else None)
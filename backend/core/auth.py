@@ -1,15 +1,22 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Literal, Optional
+from typing import Literal, Optional, Tuple
 
-from fastapi import BackgroundTasks
-from fastapi_mail import ConnectionConfig, FastMail, MessageSchema, MessageType # type: ignore
 from jose import ExpiredSignatureError, JWTError, jwt # type: ignore
 from passlib.context import CryptContext # type: ignore
-from pydantic import SecretStr
 from settings import settings
 
 # Password Hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with other rounds than configured are flagged for an update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -20,6 +27,88 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class PasswordHasher:
+    """
+    Runs bcrypt off the event loop on a small thread pool. bcrypt releases the
+    GIL while hashing, so threads hash in parallel without the pickling and
+    start-up cost of a process pool. At most `max_concurrency` hashes run at
+    once, later ones wait their turn instead of piling onto the CPU.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="password-hashing"
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        self.running = 0
+        self.stats = {
+            "hashes": 0,
+            "verifications": 0,
+            "rehashes": 0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+            "hash_seconds_total": 0.0,
+        }
+
+    async def hash(self, password: str) -> str:
+        self.stats["hashes"] += 1
+        return await self._run(pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        self.stats["verifications"] += 1
+        return await self._run(pwd_context.verify, password, hashed_password)
+
+    async def verify_and_update(
+        self, password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Verifies the password and, when its hash uses outdated parameters,
+        returns a new hash for the caller to store. Only possible at login,
+        the one time the plain password is known.
+        """
+        self.stats["verifications"] += 1
+        valid, new_hash = await self._run(
+            pwd_context.verify_and_update, password, hashed_password
+        )
+        if new_hash is not None:
+            self.stats["rehashes"] += 1
+        return valid, new_hash
+
+    def get_metrics(self) -> dict:
+        return {"waiting": self.waiting, "running": self.running, **self.stats}
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, func, *args):
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        started_at = time.perf_counter()
+        queue_wait = started_at - queued_at
+        self.stats["queue_wait_seconds_total"] += queue_wait
+        self.stats["queue_wait_seconds_max"] = max(
+            self.stats["queue_wait_seconds_max"], queue_wait
+        )
+
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.running -= 1
+            self.stats["hash_seconds_total"] += time.perf_counter() - started_at
+            self.semaphore.release()
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_CONCURRENCY)
+
+
 # Token generation and decoding
 def create_token_generic(
     email: str,
@@ -66,54 +155,3 @@ def decode_token_generic(
             raise
         except JWTError:
             return None
-
-
-if (
-    settings.MAIL_USERNAME is None
-    or settings.MAIL_PASSWORD is None
-    or settings.MAIL_FROM is None
-    or settings.MAIL_SERVER is None
-    or settings.MAIL_PORT is None
-    or settings.MAIL_STARTTLS is None
-):
-    raise ValueError("Email configuration is incomplete. Please check your settings.")
-
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.MAIL_USERNAME,
-    MAIL_PASSWORD=SecretStr(settings.MAIL_PASSWORD),
-    MAIL_FROM=settings.MAIL_FROM,
-    MAIL_PORT=settings.MAIL_PORT,
-    MAIL_SERVER=settings.MAIL_SERVER,
-    MAIL_STARTTLS=settings.MAIL_STARTTLS,
-    MAIL_SSL_TLS=settings.MAIL_SSL_TLS,
-    USE_CREDENTIALS=settings.USE_CREDENTIALS,
-)
-
-
-# Sending mails
-async def send_email(
-    user_email: str,
-    subject: str,
-    html_body: str,
-    background_tasks: BackgroundTasks,
-):
-    # Validate email configuration
-    if (
-        not settings.MAIL_USERNAME
-        or not settings.MAIL_PASSWORD
-        or not settings.MAIL_FROM
-        or not settings.MAIL_SERVER
-        or not settings.MAIL_PORT
-    ):
-        raise ValueError("Email configuration is incomplete.")
-
-    message = MessageSchema(
-        subject=subject,
-        recipients=[user_email],
-        body=html_body,
-        subtype=MessageType.html,
-    )
-
-    fm = FastMail(conf)
-    background_tasks.add_task(fm.send_message, message)
-    print(f"Added task to send email to {user_email}")
@@ -0,0 +1,164 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import List, Optional
+
+import aiosmtplib
+from core.templates import render_template
+from db.database import BackgroundSessionLocal
+from models.email_outbox import EmailOutbox, EmailStatus
+from settings import settings
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Errors that mean the connection, not the message, is the problem
+CONNECTION_ERRORS = (aiosmtplib.SMTPServerDisconnected, ConnectionError, OSError)
+
+
+def enqueue_email(
+    db: AsyncSession, recipient: str, subject: str, template_name: str, **context
+) -> EmailOutbox:
+    """
+    Adds a rendered email to the outbox. It is only queued once the caller
+    commits, together with whatever the email is about.
+    """
+    email = EmailOutbox(
+        recipient=recipient,
+        subject=subject,
+        html_body=render_template(template_name, **context),
+    )
+    db.add(email)
+    return email
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff after `attempts` failed sends, capped."""
+    seconds = settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.EMAIL_OUTBOX_RETRY_MAX_SECONDS))
+
+
+class EmailOutboxWorker:
+    """
+    Sends queued emails in batches over one SMTP connection that is kept open
+    between batches. Rows are claimed with SKIP LOCKED, so several workers can
+    drain the same outbox without sending an email twice.
+    """
+
+    def __init__(self):
+        self.smtp: Optional[aiosmtplib.SMTP] = None
+        self.last_used = 0.0
+
+    async def run_forever(self):
+        if not settings.MAIL_SERVER or not settings.MAIL_FROM:
+            print("Email configuration is incomplete, the outbox won't be sent.")
+            return
+
+        print("Email outbox worker started.")
+        try:
+            while True:
+                try:
+                    sent = await self.send_batch()
+                except Exception as e:
+                    print(f"Email outbox batch failed: {e}")
+                    await self.disconnect()
+                    sent = 0
+
+                # Keep going while there is a backlog
+                if sent < settings.EMAIL_OUTBOX_BATCH_SIZE:
+                    idle = time.monotonic() - self.last_used
+                    if idle > settings.EMAIL_SMTP_IDLE_SECONDS:
+                        await self.disconnect()
+                    await asyncio.sleep(settings.EMAIL_OUTBOX_POLL_SECONDS)
+        finally:
+            await self.disconnect()
+
+    async def send_batch(self) -> int:
+        """Claims due emails and sends them. Returns how many were claimed."""
+        async with BackgroundSessionLocal() as db:
+            now = datetime.now(timezone.utc)
+            result = await db.execute(
+                select(EmailOutbox)
+                .where(
+                    EmailOutbox.status == EmailStatus.PENDING,
+                    EmailOutbox.next_attempt_at <= now,
+                )
+                .order_by(EmailOutbox.next_attempt_at)
+                .limit(settings.EMAIL_OUTBOX_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )
+            emails: List[EmailOutbox] = list(result.scalars())
+            if not emails:
+                return 0
+
+            # Server down: leave the batch as is, without using up attempts
+            await self.connect()
+
+            for email in emails:
+                await self.send(email)
+
+            await db.commit()
+            return len(emails)
+
+    async def send(self, email: EmailOutbox):
+        message = EmailMessage()
+        message["From"] = settings.MAIL_FROM
+        message["To"] = email.recipient
+        message["Subject"] = email.subject
+        message.set_content(email.html_body, subtype="html")
+
+        try:
+            try:
+                await self.connect()
+                await self.smtp.send_message(message)
+            except CONNECTION_ERRORS:
+                # Servers drop idle connections, retry once on a fresh one
+                await self.disconnect()
+                await self.connect()
+                await self.smtp.send_message(message)
+        except Exception as e:
+            if isinstance(e, CONNECTION_ERRORS):
+                await self.disconnect()
+
+            email.attempts += 1
+            email.last_error = str(e)
+            if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                email.status = EmailStatus.FAILED
+                print(f"Giving up on email {email.id} to {email.recipient}: {e}")
+            else:
+                email.next_attempt_at = datetime.now(timezone.utc) + retry_delay(
+                    email.attempts
+                )
+            return
+
+        self.last_used = time.monotonic()
+        email.status = EmailStatus.SENT
+        email.sent_at = datetime.now(timezone.utc)
+
+    async def connect(self):
+        if self.smtp is not None and self.smtp.is_connected:
+            return
+
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.MAIL_SERVER,
+            port=settings.MAIL_PORT,
+            use_tls=settings.MAIL_SSL_TLS,
+            start_tls=settings.MAIL_STARTTLS,
+            timeout=settings.EMAIL_SMTP_TIMEOUT_SECONDS,
+        )
+        await smtp.connect()
+        if settings.USE_CREDENTIALS:
+            await smtp.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
+
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+
+    async def disconnect(self):
+        if self.smtp is None:
+            return
+        smtp, self.smtp = self.smtp, None
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except Exception:
+            smtp.close()
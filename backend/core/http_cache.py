@@ -0,0 +1,155 @@
+import time
+from typing import Dict, Optional
+
+from core.pubsub import PostgresPubSub
+from core.query_tracker import UNTRACKED
+from core.serialization import dumps_str
+from db.database import REPLICA_MAX_LAG_SECONDS, get_db, internal_engine
+from fastapi import Depends, HTTPException, Request, Response, status
+from models.catalog_version import CatalogVersion
+from settings import settings
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.auth import get_user_id_via_session, get_user_session, session_cache
+
+# Version stamp names, one per group of data that changes together
+CATALOG = "catalog"
+SETTINGS = "settings"
+
+
+class CatalogVersions:
+    """
+    Local copy of the catalog_versions table. Writes bump a stamp in their own
+    transaction and NOTIFY in the same one, so every worker hears about the
+    change exactly when it commits. Stamps are reloaded whenever the listener
+    (re)connects, and are not trusted while it is down.
+    """
+
+    def __init__(self, channel: str):
+        self.pubsub = PostgresPubSub(channel)
+        self.versions: Dict[str, int] = {}
+        self.changed_at: Dict[str, float] = {}
+        self.loaded = False
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded and self.pubsub.listening
+
+    async def start(self):
+        await self.pubsub.start(self.apply, on_connect=self.load)
+
+    async def stop(self):
+        await self.pubsub.stop()
+        self.loaded = False
+
+    async def load(self):
+        try:
+            async with internal_engine.connect() as conn:
+                result = await conn.execute(
+                    select(CatalogVersion.name, CatalogVersion.version)
+                )
+                for name, version in result:
+                    self.apply({"name": name, "version": version})
+            self.loaded = True
+        except Exception as e:
+            self.loaded = False
+            print(f"Failed to load catalog versions: {e}")
+
+    def apply(self, event: dict):
+        name, version = event["name"], event["version"]
+        if version > self.versions.get(name, -1):
+            if name in self.versions:
+                self.changed_at[name] = time.monotonic()
+            self.versions[name] = version
+
+    def get_stable_version(self, name: str) -> Optional[int]:
+        """
+        Current version of stamp `name`, or None when it can't be trusted
+        yet: the listener is down, or the stamp changed so recently that a
+        replica may not have replayed the change.
+        """
+        version = self.versions.get(name)
+        if not self.ready or version is None:
+            return None
+        changed_at = self.changed_at.get(name)
+        if changed_at is not None:
+            if time.monotonic() - changed_at < REPLICA_MAX_LAG_SECONDS:
+                return None
+        return version
+
+    def get_etag(self, *names: str, bucket_seconds: Optional[int] = None):
+        """
+        Weak ETag for data stamped with every one of `names`, or None when
+        any stamp can't be trusted. `bucket_seconds` also expires the ETag on
+        a clock, for data that changes without a stamp bump (stock, order
+        counts).
+        """
+        parts = []
+        for name in names:
+            version = self.get_stable_version(name)
+            if version is None:
+                return None
+            parts.append(f"{name}-{version}")
+
+        if bucket_seconds:
+            parts.append(str(int(time.time() // bucket_seconds)))
+        return f'W/"{"-".join(parts)}"'
+
+
+catalog_versions = CatalogVersions(settings.CATALOG_VERSIONS_CHANNEL)
+
+
+async def bump_catalog_version(db: AsyncSession, name: str):
+    """
+    Bumps stamp `name` in the caller's transaction. The NOTIFY is only
+    delivered if it commits.
+    """
+    stmt = (
+        insert(CatalogVersion)
+        .values(name=name, version=1)
+        .on_conflict_do_update(
+            index_elements=[CatalogVersion.name],
+            set_={"version": CatalogVersion.version + 1},
+        )
+        .returning(CatalogVersion.version)
+    )
+    version = (await db.execute(stmt, execution_options=UNTRACKED)).scalar_one()
+    payload = dumps_str({"name": name, "version": version})
+    channel = settings.CATALOG_VERSIONS_CHANNEL
+    await db.execute(
+        select(func.pg_notify(channel, payload)), execution_options=UNTRACKED
+    )
+
+
+def if_none_match(*names: str, bucket_seconds: Optional[int] = None):
+    """
+    Dependency answering a matching If-None-Match with 304 and tagging the
+    response otherwise, for data stamped with `names`. Only signed-in users
+    get a 304: the session is checked against `session_cache` first, and
+    only looked up in the database when this worker hasn't seen it valid
+    recently. Responses that aren't a 304 leave the session to the route.
+    """
+
+    async def dependency(
+        request: Request,
+        response: Response,
+        session_token: str = Depends(get_user_session),
+        db: AsyncSession = Depends(get_db),
+    ):
+        etag = catalog_versions.get_etag(*names, bucket_seconds=bucket_seconds)
+        if etag is None:
+            return
+
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        client_etags = request.headers.get("if-none-match", "")
+        client_etags = {tag.strip() for tag in client_etags.split(",")}
+        if etag in client_etags or "*" in client_etags:
+            if session_cache.get(session_token) is None:
+                await get_user_id_via_session(session_token, db)
+            raise HTTPException(
+                status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+            )
+        response.headers.update(headers)
+
+    return dependency
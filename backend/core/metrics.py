@@ -0,0 +1,295 @@
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from core.query_tracker import QueryStats, current_query_stats
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+
+# Seconds, from a cached read to a slow report
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, object]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues, **extra) -> Dict[str, object]:
+        return {**dict(zip(self.labelnames, key)), **extra}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        return lines + list(self.samples())
+
+    def samples(self) -> Iterable[str]:
+        return []
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            labels = _format_labels(self._labels(key))
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: count per bucket (the last one is +Inf), sum
+        self.values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        if key not in self.values:
+            self.values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = self.values[key]
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def samples(self):
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self._labels(key, le=_format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self._labels(key))
+            yield f"{self.name}_sum{labels} {_format_value(total[0])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class GaugeFamily(Metric):
+    """Gauge values read when scraped, returned by a collector."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+    def samples(self):
+        for key, value in self.values.items():
+            labels = _format_labels(self._labels(key))
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class CounterFamily(GaugeFamily):
+    """Running totals kept elsewhere, read when scraped."""
+
+    type = "counter"
+
+
+class MetricsRegistry:
+    """
+    In-process metrics in the Prometheus text format. Counters and histograms
+    are updated as things happen; gauges come from collectors that read the
+    current state of pools, sockets and queues at scrape time. Every worker
+    keeps its own registry, so scrape each worker, not the load balancer.
+    """
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], Iterable[Metric]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        counter = Counter(name, help, labelnames)
+        self.metrics.append(counter)
+        return counter
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        histogram = Histogram(name, help, labelnames, buckets)
+        self.metrics.append(histogram)
+        return histogram
+
+    def collector(self, collect: Callable[[], Iterable[Metric]]):
+        """Registers `collect`, usable as a decorator."""
+        self.collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            try:
+                for metric in collect():
+                    lines.extend(metric.render())
+            except Exception as e:
+                print(f"Metrics collector {collect.__name__} failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "Time to handle a request, by route template.",
+    ("method", "route", "status"),
+)
+http_request_queries = registry.histogram(
+    "http_request_db_queries",
+    "Database statements run per request.",
+    ("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds",
+    "Time spent executing a statement, by pool.",
+    ("pool",),
+)
+
+
+def instrument_engine(engine, pool_name: str):
+    """Times every statement of `engine` and counts it against the request."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    def get_stats(context) -> Optional[QueryStats]:
+        if not context.execution_options.get("track_queries", True):
+            return None
+        return current_query_stats.get()
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, params, context, many):
+        stats = get_stats(context)
+        # On the execution context, so a failed statement leaves nothing behind
+        context._query_shape = stats.before_execute(statement) if stats else None
+        context._query_started_at = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, params, context, many):
+        duration = time.perf_counter() - context._query_started_at
+        db_query_duration.observe(duration, pool=pool_name)
+
+        stats = get_stats(context)
+        if stats is not None:
+            stats.record(context._query_shape, duration)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request and counting its queries."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        # Shared with the query tracker when it runs outside this middleware
+        stats = current_query_stats.get()
+        token = None
+        if stats is None:
+            stats = QueryStats(track_statements=False)
+            token = current_query_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            if token is not None:
+                current_query_stats.reset(token)
+
+            # The template, not the path, keeps the label set bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            http_request_duration.observe(
+                duration, method=method, route=route, status=status_code
+            )
+            http_request_queries.observe(stats.count, method=method, route=route)
+
+
+def metrics_response() -> PlainTextResponse:
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+
+async def serve_metrics(port: int) -> asyncio.AbstractServer:
+    """
+    Minimal HTTP listener answering every request with the registry, for
+    processes without a web app (the scheduler).
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # Request line and headers, nothing else is read
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            body = registry.render().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                + f"Content-Type: {CONTENT_TYPE}\r\n".encode()
+                + f"Content-Length: {len(body)}\r\n".encode()
+                + b"Connection: close\r\n\r\n"
+                + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "0.0.0.0", port)
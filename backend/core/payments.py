@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import stripe
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from settings import settings
+
+CURRENCY = "egp"
+
+
+class CheckoutSession(BaseModel):
+    id: str
+    url: Optional[str] = None
+    status: Optional[str] = None
+    # In piasters
+    amount_total: Optional[int] = None
+    metadata: Dict[str, str] = {}
+
+
+class PaymentGateway(ABC):
+    """
+    Async front for a blocking payment SDK. Every call runs on the gateway's
+    own bounded thread pool, so a slow provider neither holds up the event loop
+    nor takes the default executor away from other work.
+    """
+
+    def __init__(self, max_workers: int, deadline_seconds: float):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="payments"
+        )
+        self.deadline_seconds = deadline_seconds
+
+    async def create_checkout_session(
+        self,
+        amount: int,
+        name: str,
+        description: str,
+        success_url: str,
+        cancel_url: str,
+        metadata: Dict[str, str],
+    ) -> CheckoutSession:
+        return await self._run(
+            self._create_checkout_session,
+            amount,
+            name,
+            description,
+            success_url,
+            cancel_url,
+            metadata,
+        )
+
+    async def retrieve_checkout_session(self, session_id: str) -> CheckoutSession:
+        return await self._run(self._retrieve_checkout_session, session_id)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        try:
+            # Covers queueing for a worker plus every SDK attempt. The thread
+            # can't be interrupted, its result is just dropped.
+            async with asyncio.timeout(self.deadline_seconds):
+                return await loop.run_in_executor(self.executor, func, *args)
+        except TimeoutError:
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="The payment provider did not respond in time.",
+            )
+
+    @abstractmethod
+    def _create_checkout_session(
+        self, amount, name, description, success_url, cancel_url, metadata
+    ) -> CheckoutSession:
+        ...
+
+    @abstractmethod
+    def _retrieve_checkout_session(self, session_id: str) -> CheckoutSession:
+        ...
+
+
+class StripeGateway(PaymentGateway):
+    def __init__(self, max_workers: int, deadline_seconds: float):
+        if not settings.STRIPE_SECRET_KEY:
+            raise ValueError("STRIPE_SECRET_KEY environment variable not set.")
+
+        super().__init__(max_workers, deadline_seconds)
+        # The SDK retries network errors, 409s and 5xx with backoff and reuses
+        # an idempotency key on POST retries, so a retried create is safe
+        self.client = stripe.StripeClient(
+            settings.STRIPE_SECRET_KEY,
+            http_client=stripe.RequestsClient(timeout=settings.STRIPE_TIMEOUT_SECONDS),
+            max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+        )
+
+    def _create_checkout_session(
+        self, amount, name, description, success_url, cancel_url, metadata
+    ) -> CheckoutSession:
+        session = self.client.checkout.sessions.create(
+            params={
+                "line_items": [
+                    {
+                        "price_data": {
+                            "currency": CURRENCY,
+                            "unit_amount": amount,
+                            "product_data": {
+                                "name": name,
+                                "description": description,
+                            },
+                        },
+                        "quantity": 1,
+                    },
+                ],
+                "mode": "payment",
+                "success_url": success_url,
+                "cancel_url": cancel_url,
+                "metadata": metadata,
+            }
+        )
+        return self._to_checkout_session(session)
+
+    def _retrieve_checkout_session(self, session_id: str) -> CheckoutSession:
+        session = self.client.checkout.sessions.retrieve(session_id)
+        return self._to_checkout_session(session)
+
+    @staticmethod
+    def _to_checkout_session(session) -> CheckoutSession:
+        return CheckoutSession(
+            id=session.id,
+            url=session.get("url"),
+            status=session.get("status"),
+            amount_total=session.get("amount_total"),
+            metadata=dict(session.get("metadata") or {}),
+        )
+
+
+class FakePaymentGateway(PaymentGateway):
+    """
+    In-memory gateway for local runs, tests and benchmarks. Sessions are paid
+    as soon as they are created, the checkout url goes straight to the success
+    url. `latency` blocks the worker thread like a real SDK round trip.
+    """
+
+    def __init__(self, max_workers: int, deadline_seconds: float, latency: float = 0):
+        super().__init__(max_workers, deadline_seconds)
+        self.latency = latency
+        self.sessions: Dict[str, CheckoutSession] = {}
+        self.lock = threading.Lock()
+
+    def _create_checkout_session(
+        self, amount, name, description, success_url, cancel_url, metadata
+    ) -> CheckoutSession:
+        time.sleep(self.latency)
+        session_id = f"cs_fake_{uuid.uuid4().hex}"
+        session = CheckoutSession(
+            id=session_id,
+            url=success_url.replace("{CHECKOUT_SESSION_ID}", session_id),
+            status="complete",
+            amount_total=amount,
+            metadata=metadata,
+        )
+        with self.lock:
+            self.sessions[session_id] = session
+        return session
+
+    def _retrieve_checkout_session(self, session_id: str) -> CheckoutSession:
+        time.sleep(self.latency)
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            raise stripe.InvalidRequestError(
+                f"No such checkout.session: '{session_id}'", "id"
+            )
+        return session
+
+
+def create_payment_gateway() -> PaymentGateway:
+    if settings.PAYMENT_GATEWAY == "fake":
+        print("Using the fake payment gateway, no real payments are taken.")
+        return FakePaymentGateway(
+            max_workers=settings.PAYMENT_GATEWAY_MAX_WORKERS,
+            deadline_seconds=settings.PAYMENT_GATEWAY_DEADLINE_SECONDS,
+        )
+    return StripeGateway(
+        max_workers=settings.PAYMENT_GATEWAY_MAX_WORKERS,
+        deadline_seconds=settings.PAYMENT_GATEWAY_DEADLINE_SECONDS,
+    )
+
+
+payment_gateway = create_payment_gateway()
@@ -0,0 +1,164 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
+import asyncpg
+from sqlalchemy import insert, select, text
+
+from core.serialization import dumps, loads
+from db.database import SQLALCHEMY_DATABASE_URL, internal_engine
+from models.pubsub_payload import PubSubPayload
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD_BYTES = 7900
+RECONNECT_DELAY_SECONDS = 5
+# Key of the NOTIFY payload pointing at an event stored in pubsub_payloads
+PAYLOAD_ID_KEY = "pubsub_payload_id"
+
+
+class PostgresPubSub:
+    """
+    Publishes events with Postgres NOTIFY and hands every event received on the
+    channel, including this process's own, to a local handler. Events too large
+    for NOTIFY are stored in pubsub_payloads and only their id is sent; events
+    are handled one at a time, in the order they were received, so fetching a
+    stored one never lets a later event overtake it.
+    """
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.handler: Optional[Callable[[dict], None]] = None
+        self.on_connect: Optional[Callable[[], Awaitable[None]]] = None
+        self.connection: Optional[asyncpg.Connection] = None
+        self.task: Optional[asyncio.Task] = None
+        self.delivery_task: Optional[asyncio.Task] = None
+        self.received: asyncio.Queue[str] = asyncio.Queue()
+
+    @property
+    def listening(self) -> bool:
+        return self.connection is not None and not self.connection.is_closed()
+
+    async def start(
+        self,
+        handler: Callable[[dict], None],
+        on_connect: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        """
+        `on_connect` runs every time the listener (re)connects, for state that
+        may have missed events while it was down.
+        """
+        self.handler = handler
+        self.on_connect = on_connect
+        self.task = asyncio.create_task(self._listen_forever())
+        self.delivery_task = asyncio.create_task(self._deliver_forever())
+
+    async def stop(self):
+        for task in (self.task, self.delivery_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.task = None
+        self.delivery_task = None
+
+    async def publish(self, event: dict) -> bool:
+        return await self.publish_many([event])
+
+    async def publish_many(self, events: List[dict]) -> bool:
+        """
+        Publishes `events` in order, over one connection and in one statement.
+        Returns False when this process's own listener won't receive them and
+        the caller has to deliver them locally instead. Other processes still
+        get them while this listener is reconnecting; only a failed NOTIFY is
+        lost to them. Postgres drops repeats of an identical payload within
+        one transaction, so events of a batch should differ.
+        """
+        if self.task is None or not events:
+            return False
+
+        # Checked first, as a listener coming back misses what was sent before
+        listening = self.listening
+        payloads = [dumps(event) for event in events]
+        oversized = [
+            index
+            for index, payload in enumerate(payloads)
+            if len(payload) > MAX_PAYLOAD_BYTES
+        ]
+        try:
+            async with internal_engine.connect() as conn:
+                if oversized:
+                    result = await conn.execute(
+                        insert(PubSubPayload).returning(
+                            PubSubPayload.id, sort_by_parameter_order=True
+                        ),
+                        [{"payload": payloads[index].decode()} for index in oversized],
+                    )
+                    for index, payload_id in zip(oversized, result.scalars()):
+                        payloads[index] = dumps({PAYLOAD_ID_KEY: payload_id})
+                # Sent on commit, with the stored payloads already visible
+                await conn.execute(
+                    text(
+                        "SELECT pg_notify(:channel, payload) "
+                        "FROM unnest(CAST(:payloads AS text[])) AS payload"
+                    ),
+                    {
+                        "channel": self.channel,
+                        "payloads": [payload.decode() for payload in payloads],
+                    },
+                )
+                await conn.commit()
+        except Exception as e:
+            print(f"Failed to publish {len(events)} pub/sub event(s): {e}")
+            return False
+        return listening
+
+    async def _listen_forever(self):
+        # asyncpg takes a plain postgresql:// DSN
+        dsn = SQLALCHEMY_DATABASE_URL.replace("+asyncpg", "")
+
+        while True:
+            lost = asyncio.Event()
+            try:
+                self.connection = await asyncpg.connect(dsn)
+                self.connection.add_termination_listener(lambda _: lost.set())
+                await self.connection.add_listener(self.channel, self._on_notify)
+                print(f"Listening for pub/sub events on '{self.channel}'")
+                if self.on_connect is not None:
+                    await self.on_connect()
+                await lost.wait()
+                print("Pub/sub connection lost, reconnecting...")
+            except asyncio.CancelledError:
+                if self.connection is not None:
+                    await self.connection.close()
+                raise
+            except Exception as e:
+                print(f"Pub/sub listener failed: {e}")
+            finally:
+                if self.connection is not None and self.connection.is_closed():
+                    self.connection = None
+
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.received.put_nowait(payload)
+
+    async def _deliver_forever(self):
+        while True:
+            payload = await self.received.get()
+            try:
+                event = loads(payload)
+                if PAYLOAD_ID_KEY in event:
+                    event = await self._fetch_payload(event[PAYLOAD_ID_KEY])
+                self.handler(event)
+            except Exception as e:
+                print(f"Failed to handle pub/sub event: {e}")
+
+    async def _fetch_payload(self, payload_id: int) -> dict:
+        async with internal_engine.connect() as conn:
+            payload = await conn.scalar(
+                select(PubSubPayload.payload).where(PubSubPayload.id == payload_id)
+            )
+        if payload is None:
+            raise LookupError(f"Pub/sub payload {payload_id} no longer exists")
+        return loads(payload)
@@ -0,0 +1,209 @@
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from settings import settings
+
+MAX_HEADER_FINGERPRINT_LENGTH = 200
+
+_PLACEHOLDER = re.compile(r"\$\d+(::[\w ]+)?|%\(\w+\)s|\?")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(\.\d+)?\b")
+_VALUE_LIST = re.compile(r"\?(\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    """
+    The statement with every parameter and literal replaced by `?`, so the
+    same query for a different row, or an IN list of any length, matches.
+    """
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _VALUE_LIST.sub("?", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryStats:
+    """
+    Statements run on behalf of one request (or one `track_queries` block):
+    how many, how long, and how often each statement shape repeated. The
+    same shape run `repeat_threshold` times is a suspected N+1, usually a
+    lazy load or a query inside a loop.
+    """
+
+    def __init__(
+        self,
+        track_statements: bool = True,
+        budget: int = 0,
+        repeat_threshold: int = settings.QUERY_REPEAT_THRESHOLD,
+        strict: bool = False,
+    ):
+        self.count = 0
+        self.duration = 0.0
+        self.track_statements = track_statements
+        self.fingerprints: Dict[str, int] = {}
+        # 0 for no budget
+        self.budget = budget
+        self.repeat_threshold = repeat_threshold
+        self.strict = strict
+
+    def before_execute(self, statement: str) -> Optional[str]:
+        """Fails the statement in strict mode when it breaks a limit."""
+        if self.strict and self.budget and self.count >= self.budget:
+            raise QueryBudgetExceeded(
+                f"Query budget of {self.budget} exceeded by: {statement[:200]}"
+            )
+        if not self.track_statements:
+            return None
+
+        shape = fingerprint(statement)
+        seen = self.fingerprints.get(shape, 0)
+        if self.strict and seen + 1 >= self.repeat_threshold:
+            raise QueryBudgetExceeded(
+                f"Statement repeated {seen + 1} times (suspected N+1): {shape[:200]}"
+            )
+        return shape
+
+    def record(self, shape: Optional[str], duration: float):
+        self.count += 1
+        self.duration += duration
+        if shape is not None:
+            self.fingerprints[shape] = self.fingerprints.get(shape, 0) + 1
+
+    @property
+    def over_budget(self) -> bool:
+        return bool(self.budget) and self.count > self.budget
+
+    def get_suspected_n_plus_one(self) -> List[Tuple[str, int]]:
+        """Repeated statement shapes, most repeated first."""
+        repeated = [
+            (shape, count)
+            for shape, count in self.fingerprints.items()
+            if count >= self.repeat_threshold
+        ]
+        return sorted(repeated, key=lambda item: -item[1])
+
+
+# Execution options for the app's own bookkeeping statements (pub/sub, version
+# stamps), which are not counted against the request that triggered them
+UNTRACKED = {"track_queries": False}
+
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+@contextmanager
+def track_queries(budget: int = 0, strict: bool = True, **kwargs):
+    """
+    Tracks the statements run inside the block, for tests:
+
+        with track_queries(budget=3) as stats:
+            await get_cart_crud(db, user_id)
+        assert not stats.get_suspected_n_plus_one()
+
+    In strict mode, the statement that breaks the budget or repeats too
+    often raises QueryBudgetExceeded.
+    """
+    stats = QueryStats(budget=budget, strict=strict, **kwargs)
+    token = current_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
+
+
+def query_budget(max_queries: int):
+    """
+    Dependency setting the statement budget of a route, e.g.
+    `dependencies=[Depends(query_budget(5))]`.
+    """
+
+    async def dependency():
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.budget = max_queries
+
+    return dependency
+
+
+def _header_value(value: str) -> bytes:
+    return value.encode("latin-1", errors="replace")
+
+
+class QueryTrackerMiddleware:
+    """
+    ASGI middleware tracking the statements of every HTTP request. Requests
+    over their budget or with suspected N+1 patterns are logged and, with
+    debug headers on, described in X-DB-* response headers.
+    """
+
+    def __init__(
+        self,
+        app,
+        debug_headers: bool = settings.QUERY_DEBUG_HEADERS,
+        strict: bool = settings.QUERY_STRICT_MODE,
+        budget: int = settings.QUERY_BUDGET_PER_REQUEST,
+    ):
+        self.app = app
+        self.debug_headers = debug_headers
+        self.strict = strict
+        self.budget = budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats(budget=self.budget, strict=self.strict)
+
+        async def send_wrapper(message):
+            # The endpoint has finished its queries by the time it responds
+            if message["type"] == "http.response.start" and self.debug_headers:
+                headers = list(message.get("headers", []))
+                headers.extend(self._debug_headers(stats))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = current_query_stats.set(stats)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_query_stats.reset(token)
+            self._report(scope, stats)
+
+    def _debug_headers(self, stats: QueryStats) -> List[Tuple[bytes, bytes]]:
+        headers = [
+            (b"x-db-query-count", str(stats.count).encode()),
+            (b"x-db-query-time-ms", f"{stats.duration * 1000:.1f}".encode()),
+        ]
+        suspects = stats.get_suspected_n_plus_one()
+        if suspects:
+            shape, count = suspects[0]
+            headers.append((b"x-db-n-plus-one-count", str(len(suspects)).encode()))
+            headers.append(
+                (
+                    b"x-db-n-plus-one",
+                    _header_value(f"{count}x {shape[:MAX_HEADER_FINGERPRINT_LENGTH]}"),
+                )
+            )
+        return headers
+
+    def _report(self, scope, stats: QueryStats):
+        route = getattr(scope.get("route"), "path", scope["path"])
+        request = f"{scope['method']} {route}"
+        if stats.over_budget:
+            print(
+                f"{request} ran {stats.count} statements, "
+                f"over its budget of {stats.budget}"
+            )
+        for shape, count in stats.get_suspected_n_plus_one():
+            print(f"Suspected N+1 on {request}: {count}x {shape[:200]}")
@@ -0,0 +1,67 @@
+import asyncio
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from core.http_cache import catalog_versions
+
+
+class ReferenceList:
+    """
+    Small reference table (authors, categories) sorted by name, with
+    case-insensitive name-prefix lookup.
+    """
+
+    def __init__(self, entries: List[Dict[str, Any]]):
+        self.entries = sorted(entries, key=lambda entry: entry["name"].lower())
+        self.keys = [entry["name"].lower() for entry in self.entries]
+        self.by_id = {entry["id"]: entry for entry in self.entries}
+
+    def lookup(self, prefix: Optional[str] = None) -> List[Dict[str, Any]]:
+        if not prefix:
+            return self.entries
+        prefix = prefix.lower()
+        start = bisect_left(self.keys, prefix)
+        end = start
+        while end < len(self.keys) and self.keys[end].startswith(prefix):
+            end += 1
+        return self.entries[start:end]
+
+    def get_books_counts(self) -> Dict[int, int]:
+        return {entry["id"]: entry["books_count"] for entry in self.entries}
+
+
+class VersionedCache:
+    """
+    Holds one value per process for as long as catalog stamp `stamp` keeps
+    the version it was loaded at. Writes bump the stamp and every worker
+    hears about it over LISTEN/NOTIFY, so nothing expires on a timer. While
+    the stamp can't be trusted, reads go straight to the database.
+    """
+
+    def __init__(self, name: str, stamp: str):
+        self.name = name
+        self.stamp = stamp
+        self.version: Optional[int] = None
+        self.value: Any = None
+        # One reload at a time, concurrent misses wait for it
+        self.lock = asyncio.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    async def get(self, db, loader: Callable[[Any], Awaitable[Any]]):
+        version = catalog_versions.get_stable_version(self.stamp)
+        if version is not None and version == self.version:
+            self.stats["hits"] += 1
+            return self.value
+
+        self.stats["misses"] += 1
+        if version is None:
+            return await loader(db)
+
+        async with self.lock:
+            if self.version == version:
+                return self.value
+            value = await loader(db)
+            # A bump that landed during the load makes this copy stale already
+            if catalog_versions.get_stable_version(self.stamp) == version:
+                self.version, self.value = version, value
+            return value
@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+import orjson
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import APIRoute, get_request_handler
+
+
+def _default(o):
+    # orjson handles datetime, date, UUID and Enum natively
+    if isinstance(o, Decimal):
+        # Money stays exact on the wire
+        return str(o)
+    # ORM objects returned by routes without a response model
+    return jsonable_encoder(o)
+
+
+def dumps(obj) -> bytes:
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def dumps_str(obj) -> str:
+    """For websocket text frames and NOTIFY payloads, which take str."""
+    return dumps(obj).decode()
+
+
+loads = orjson.loads
+
+
+class JSONResponse(ORJSONResponse):
+    """Default response class; Decimal renders as a string."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class _PassThroughField:
+    """
+    Response field for routes without a response model, handing the return
+    value to the response class as is. FastAPI would otherwise walk it with
+    jsonable_encoder before orjson sees it.
+    """
+
+    def validate(self, value, values, *, loc):
+        return value, []
+
+    def serialize(self, value, **kwargs):
+        return value
+
+
+class ORJSONRoute(APIRoute):
+    """Route class rendering responses without a model straight with orjson."""
+
+    def get_route_handler(self):
+        response_class = self.response_class
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = response_class.value
+        if self.response_field is not None or not issubclass(
+            response_class, JSONResponse
+        ):
+            return super().get_route_handler()
+
+        return get_request_handler(
+            dependant=self.dependant,
+            body_field=self.body_field,
+            status_code=self.status_code,
+            response_class=self.response_class,
+            response_field=_PassThroughField(),
+            dependency_overrides_provider=self.dependency_overrides_provider,
+            embed_body_fields=self._embed_body_fields,
+        )
@@ -3,12 +3,22 @@ import os
 
 templates_dir = os.path.join(os.path.dirname(__file__), "..", "templates")
 
+# Templates only change with a deploy, so they are compiled once at import
+# and never checked against the files again
 jinja_env = Environment(
     loader=FileSystemLoader(templates_dir),
     autoescape=select_autoescape(["html", "xml"]),
+    auto_reload=False,
 )
 
+compiled_templates = {
+    template_name: jinja_env.get_template(template_name)
+    for template_name in jinja_env.list_templates()
+}
+
 
 def render_template(template_name: str, **kwargs) -> str:
-    template = jinja_env.get_template(template_name)
+    template = compiled_templates.get(template_name)
+    if template is None:
+        template = jinja_env.get_template(template_name)
     return template.render(**kwargs)
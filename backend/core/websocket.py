@@ -1,12 +1,91 @@
-import json
-from typing import Dict, Set
-from fastapi import WebSocket
+import asyncio
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+from fastapi import WebSocket, status
+from core.pubsub import PostgresPubSub
+from core.serialization import dumps_str
+from db.database import internal_engine
+from models.order import order_board_version_seq
 from models.user import UserRole
+from settings import settings
+from sqlalchemy import select, text
+
+# Outbound messages buffered per connection before it counts as too slow
+SEND_QUEUE_SIZE = 100
+SEND_TIMEOUT_SECONDS = 5
+
+
+class ConnectionWriter:
+    """
+    Owns the outbound queue of one websocket and the task that drains it, so a
+    slow or dead client never blocks the sender.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: int, user_role: UserRole):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.user_role = user_role
+        self.last_seen = asyncio.get_running_loop().time()
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.closed = False
+        # Set when the client asked for the versioned order-board stream
+        self.board_subscriber = False
+        self.task = asyncio.create_task(self._drain())
+
+    def touch(self):
+        """Record that the client is alive (any frame counts, not only pongs)."""
+        self.last_seen = asyncio.get_running_loop().time()
+
+    def enqueue(self, message_str: str) -> bool:
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(message_str)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _drain(self):
+        try:
+            while True:
+                message_str = await self.queue.get()
+                async with asyncio.timeout(SEND_TIMEOUT_SECONDS):
+                    await self.websocket.send_text(message_str)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"WebSocket send failed, closing connection: {e}")
+            await self.close(status.WS_1011_INTERNAL_ERROR)
+
+    def stop(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.task.cancel()
+
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE):
+        if self.task is not asyncio.current_task():
+            self.stop()
+        self.closed = True
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            # The socket is already gone
+            pass
 
 
 class ConnectionManager:
+    """
+    Tracks the sockets attached to this process, any number per user. Outgoing
+    messages are published through Postgres so every worker delivers them to
+    its own sockets.
+    """
+
     def __init__(self):
-        self.active_connections: Dict[int, WebSocket] = {}
+        self.active_connections: Dict[int, Set[ConnectionWriter]] = {}
+        self.pubsub = PostgresPubSub(settings.WEBSOCKET_PUBSUB_CHANNEL)
+        self.heartbeat_task: Optional[asyncio.Task] = None
+        self.order_board = OrderBoardStream(self)
 
         self.connections_by_role: Dict[UserRole, Set[int]] = {
             UserRole.CLIENT: set(),
@@ -15,40 +94,339 @@ class ConnectionManager:
             UserRole.COURIER: set(),
         }
 
-    async def connect(self, websocket: WebSocket, user_id: int, user_role: UserRole):
+    async def connect(
+        self, websocket: WebSocket, user_id: int, user_role: UserRole
+    ) -> ConnectionWriter:
         await websocket.accept()
-        self.active_connections[user_id] = websocket
+
+        connection = ConnectionWriter(websocket, user_id, user_role)
+        self.active_connections.setdefault(user_id, set()).add(connection)
 
         # Add the user_id to the set for their role
         if user_role in self.connections_by_role:
             self.connections_by_role[user_role].add(user_id)
 
-    def disconnect(self, user_id: int, user_role: UserRole):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
+        return connection
+
+    def disconnect(self, connection: ConnectionWriter):
+        connection.stop()
+
+        connections = self.active_connections.get(connection.user_id)
+        if connections is None or connection not in connections:
+            return
+
+        connections.discard(connection)
+        if not connections:
+            del self.active_connections[connection.user_id]
 
             # Remove the user_id from the set for their role
-            if user_role in self.connections_by_role:
-                self.connections_by_role[user_role].discard(user_id)
+            if connection.user_role in self.connections_by_role:
+                self.connections_by_role[connection.user_role].discard(
+                    connection.user_id
+                )
+
+    def _evict(self, connection: ConnectionWriter, code: int, reason: str):
+        """Drop a connection and close its socket in the background."""
+        print(f"Evicting WebSocket of user {connection.user_id}: {reason}")
+        self.disconnect(connection)
+        asyncio.create_task(connection.close(code))
+
+    def _fan_out(self, message_str: str, user_ids):
+        self._send(
+            message_str,
+            [
+                connection
+                for user_id in user_ids
+                for connection in self.active_connections.get(user_id, ())
+            ],
+        )
+
+    def _send(self, message_str: str, connections):
+        # Enqueueing never blocks, so the cost does not depend on slow clients
+        overflowed_connections = [
+            connection
+            for connection in connections
+            if not connection.enqueue(message_str)
+        ]
+        for connection in overflowed_connections:
+            self._evict(
+                connection, status.WS_1013_TRY_AGAIN_LATER, "send queue full"
+            )
+
+    async def start_heartbeat(self):
+        self.heartbeat_task = asyncio.create_task(self._heartbeat_forever())
+
+    async def stop_heartbeat(self):
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            try:
+                await self.heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self.heartbeat_task = None
+
+    async def _heartbeat_forever(self):
+        while True:
+            await asyncio.sleep(settings.WEBSOCKET_PING_INTERVAL_SECONDS)
+            self.check_heartbeats()
+
+    def check_heartbeats(self):
+        """
+        Evict connections that have not sent anything within the idle timeout
+        (half-open sockets never raise on receive) and ping the rest.
+        """
+        deadline = (
+            asyncio.get_running_loop().time()
+            - settings.WEBSOCKET_IDLE_TIMEOUT_SECONDS
+        )
+        ping_str = dumps_str({"message": "ping"})
+
+        for connections in list(self.active_connections.values()):
+            for connection in list(connections):
+                if connection.last_seen < deadline:
+                    self._evict(
+                        connection, status.WS_1001_GOING_AWAY, "idle timeout"
+                    )
+                elif not connection.enqueue(ping_str):
+                    self._evict(
+                        connection, status.WS_1013_TRY_AGAIN_LATER, "send queue full"
+                    )
+
+    def get_connection_gauges(self) -> Dict[str, int]:
+        """Number of open sockets on this worker, per role."""
+        gauges = {role.value: 0 for role in self.connections_by_role}
+        for connections in self.active_connections.values():
+            for connection in connections:
+                gauges[connection.user_role.value] += 1
+        return gauges
+
+    def get_role_connections(self, role: UserRole) -> List[ConnectionWriter]:
+        return [
+            connection
+            for user_id in self.connections_by_role.get(role, ())
+            for connection in self.active_connections.get(user_id, ())
+        ]
+
+    async def start_pubsub(self):
+        if settings.WEBSOCKET_PUBSUB_ENABLED:
+            await self.pubsub.start(self.deliver, on_connect=self.order_board.reset)
+        else:
+            # Only this worker publishes, so one read covers every delta
+            await self.order_board.reset()
+
+    async def stop_pubsub(self):
+        await self.pubsub.stop()
+
+    async def _publish(self, event: dict):
+        await self._publish_many([event])
+
+    async def _publish_many(self, events: List[dict]):
+        # Local sockets are served directly when this worker's listener is down
+        if not await self.pubsub.publish_many(events):
+            for event in events:
+                self.deliver(event)
+
+    def deliver(self, event: dict):
+        """Send an event published by any worker to the matching local sockets."""
+        # Serialized once for every recipient
+        message_str = dumps_str(event["message"])
+
+        if event["target"] == "user":
+            self._fan_out(message_str, [event["user_id"]])
+        elif event["target"] == "role":
+            role = UserRole(event["role"])
+            if role in self.connections_by_role:
+                self._fan_out(message_str, list(self.connections_by_role[role]))
+        elif event["target"] == "all":
+            self._fan_out(message_str, list(self.active_connections))
+        elif event["target"] == "board":
+            role = UserRole(event["role"])
+            # Clients without the delta stream keep getting the plain message
+            self._send(
+                message_str,
+                [
+                    connection
+                    for connection in self.get_role_connections(role)
+                    if not connection.board_subscriber
+                ],
+            )
+            self.order_board.append(event["version"], role, event["message"])
 
     async def send_personal_message(self, message: dict, user_id: int):
-        if user_id in self.active_connections:
-            websocket = self.active_connections[user_id]
-            await websocket.send_text(json.dumps(message))
+        await self._publish({"target": "user", "user_id": user_id, "message": message})
+
+    async def send_personal_messages(self, messages: List[Tuple[dict, int]]):
+        """Send each (message, user_id) pair, published as one batch."""
+        await self._publish_many(
+            [
+                {"target": "user", "user_id": user_id, "message": message}
+                for message, user_id in messages
+            ]
+        )
 
     async def broadcast_to_role(self, message: dict, role: UserRole):
-        message_str = json.dumps(message)
-        if role in self.connections_by_role:
-            user_ids = self.connections_by_role[role]
-            for user_id in user_ids:
-                if user_id in self.active_connections:  # Safety check
-                    websocket = self.active_connections[user_id]
-                    await websocket.send_text(message_str)
+        await self._publish({"target": "role", "role": role.value, "message": message})
 
     async def broadcast(self, message: dict):
-        message_str = json.dumps(message)
-        for connection in self.active_connections.values():
-            await connection.send_text(message_str)
+        await self._publish({"target": "all", "message": message})
+
+    async def publish_board_change(self, message: dict, role: UserRole):
+        """Broadcast an order-board change to a role as a versioned delta."""
+        try:
+            async with internal_engine.connect() as conn:
+                version = await conn.scalar(
+                    select(order_board_version_seq.next_value())
+                )
+        except Exception as e:
+            print(f"Failed to allocate order board version: {e}")
+            await self.broadcast_to_role(message, role)
+            return
+
+        await self._publish(
+            {
+                "target": "board",
+                "role": role.value,
+                "version": version,
+                "message": message,
+            }
+        )
+
+
+def _delta_key(delta: dict):
+    """Deltas with the same key supersede each other, e.g. status updates."""
+    for field in ("order_id", "return_order_id"):
+        if field in delta:
+            return delta["message"], delta[field]
+    return None
+
+
+def coalesce_deltas(deltas: List[dict]) -> List[dict]:
+    """Keep only the latest delta per key, preserving version order."""
+    latest_by_key = {}
+    for delta in deltas:
+        key = _delta_key(delta)
+        if key is not None:
+            latest_by_key[key] = delta["version"]
+
+    return [
+        delta
+        for delta in deltas
+        if _delta_key(delta) is None
+        or latest_by_key[_delta_key(delta)] == delta["version"]
+    ]
+
+
+class OrderBoardStream:
+    """
+    Sequenced order-board deltas for staff and couriers. Versions come from a
+    Postgres sequence so they agree across workers; each worker keeps the
+    latest deltas in a ring buffer so reconnecting clients can resume with
+    `since=<version>`, and deltas arriving close together are sent as one frame.
+    """
+
+    def __init__(self, manager: "ConnectionManager"):
+        self.manager = manager
+        self.buffer: deque = deque(maxlen=settings.ORDER_BOARD_BUFFER_SIZE)
+        # Every delta after this version is in the buffer; None until known
+        self.complete_since: Optional[int] = None
+        self.pending: Dict[UserRole, List[dict]] = {}
+
+    async def reset(self):
+        """
+        Forget the buffered deltas and restart the stream at the current
+        version. Run whenever the listener (re)connects: LISTEN is already
+        active by then, so no delta can fall between the read and the first
+        notification, while those published during an outage are lost, and
+        clients resuming from before it are told to reload the board.
+        """
+        self.buffer.clear()
+        self.complete_since = None
+        try:
+            async with internal_engine.connect() as conn:
+                result = await conn.execute(
+                    text("SELECT last_value, is_called FROM order_board_version_seq")
+                )
+                last_value, is_called = result.one()
+            self.complete_since = last_value if is_called else 0
+        except Exception as e:
+            print(f"Failed to read order board version: {e}")
+
+    @property
+    def latest_version(self) -> Optional[int]:
+        if self.buffer:
+            return self.buffer[-1]["version"]
+        return self.complete_since
+
+    def append(self, version: int, role: UserRole, message: dict):
+        delta = {"version": version, "role": role, **message}
+
+        if len(self.buffer) == self.buffer.maxlen:
+            self.complete_since = self.buffer[0]["version"]
+        elif self.complete_since is None:
+            self.complete_since = version - 1
+        self.buffer.append(delta)
+
+        pending = self.pending.setdefault(role, [])
+        if not pending:
+            asyncio.get_running_loop().call_later(
+                settings.ORDER_BOARD_COALESCE_MS / 1000, self._flush, role
+            )
+        pending.append(delta)
+
+    def _flush(self, role: UserRole):
+        deltas = self.pending.pop(role, [])
+        if not deltas:
+            return
+
+        subscribers = [
+            connection
+            for connection in self.manager.get_role_connections(role)
+            if connection.board_subscriber
+        ]
+        if subscribers:
+            self.manager._send(self._frame(deltas), subscribers)
+
+    def _frame(self, deltas: List[dict]) -> str:
+        deltas = coalesce_deltas(deltas)
+        return dumps_str(
+            {
+                "message": "order_board_deltas",
+                "version": deltas[-1]["version"],
+                "deltas": [
+                    {key: value for key, value in delta.items() if key != "role"}
+                    for delta in deltas
+                ],
+            }
+        )
+
+    def subscribe(self, connection: ConnectionWriter, since: int):
+        """
+        Subscribe a connection to the stream and replay what it missed. When
+        the buffer no longer covers `since` the client must reload the board.
+        Replayed deltas may repeat ones that are about to be flushed, so
+        clients ignore versions they have already applied.
+        """
+        connection.board_subscriber = True
+
+        if self.complete_since is None or since < self.complete_since:
+            self.manager._send(
+                dumps_str(
+                    {"message": "order_board_reset", "version": self.latest_version}
+                ),
+                [connection],
+            )
+            return
+
+        missed = sorted(
+            (
+                delta
+                for delta in self.buffer
+                if delta["version"] > since and delta["role"] == connection.user_role
+            ),
+            key=lambda delta: delta["version"],
+        )
+        if missed:
+            self.manager._send(self._frame(missed), [connection])
 
 
 webSocket_connection_manager = ConnectionManager()
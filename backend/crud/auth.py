@@ -4,13 +4,10 @@ from typing import Tuple
 from core.auth import (
     create_token_generic,
     decode_token_generic,
-    get_password_hash,
-    send_email,
-    verify_password,
+    password_hasher,
 )
-from core.templates import render_template
+from core.email_outbox import enqueue_email
 from fastapi import (
-    BackgroundTasks,
     HTTPException,
     status,
 )
@@ -30,12 +27,10 @@ from settings import settings  # type: ignore
 from sqlalchemy import delete, select
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
-from utils.auth import get_user_by_email
+from utils.auth import get_user_by_email, session_cache
 
 
-async def register_crud(
-    user_data: RegisterRequest, background_tasks: BackgroundTasks, db: AsyncSession
-):
+async def register_crud(user_data: RegisterRequest, db: AsyncSession):
     try:
         result = await db.execute(select(User).where(User.email == user_data.email))
         if result.scalars().first():
@@ -52,7 +47,7 @@ async def register_crud(
         if result.scalars().first():
             raise HTTPException(status_code=400, detail="National ID already exists")
 
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await password_hasher.hash(user_data.password)
 
         new_user = User(
             first_name=user_data.first_name,
@@ -86,33 +81,24 @@ async def register_crud(
         )
         new_user.email_verification_token = token
         db.add(new_user)
-        await db.commit()
-        await db.refresh(new_user)
-
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Token generation failed: {str(e)}"
-        )
-
-    verification_link = f"{settings.APP_HOST}/verify-email?token={token}"
-
-    email_body = render_template(
-        "emails/verify_email.html",
-        first_name=new_user.first_name,
-        verification_link=verification_link,
-    )
 
-    try:
-        await send_email(
+        # Queued with the user, the outbox worker sends it
+        verification_link = f"{settings.APP_HOST}/verify-email?token={token}"
+        enqueue_email(
+            db,
             new_user.email,
             "Verify Your Book Nook Account Email",
-            email_body,
-            background_tasks,
+            "emails/verify_email.html",
+            first_name=new_user.first_name,
+            verification_link=verification_link,
         )
 
+        await db.commit()
+        await db.refresh(new_user)
+
     except Exception as e:
         raise HTTPException(
-            status_code=500, detail=f"Failed to send verification email: {str(e)}"
+            status_code=500, detail=f"Token generation failed: {str(e)}"
         )
 
 
@@ -163,7 +149,16 @@ async def login_crud(
 ) -> Tuple[str, datetime, User]:
     user = await get_user_by_email(login_data.email, db)
 
-    if not user or not verify_password(login_data.password, user.password):
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+        )
+
+    valid, new_hash = await password_hasher.verify_and_update(
+        login_data.password, user.password
+    )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -184,6 +179,10 @@ async def login_crud(
         minutes=settings.SESSION_EXPIRE_MINUTES
     )
 
+    # The hash cost changed since this password was set, store the new hash
+    if new_hash is not None:
+        user.password = new_hash
+
     new_session = Session(
         session=session_token, expires_at=session_expires_at, user_id=user.id
     )
@@ -195,7 +194,6 @@ async def login_crud(
 
 async def forget_password_crud(
     forget_password_data: ForgetPasswordRequest,
-    background_tasks: BackgroundTasks,
     db: AsyncSession,
 ):
     user = await get_user_by_email(forget_password_data.email, db)
@@ -216,19 +214,20 @@ async def forget_password_crud(
 
     user.forget_password_token = forget_password_token
 
-    await db.commit()
-
     reset_link = (
         f"{settings.APP_HOST}{settings.RESET_PASSWORD_URL}/{forget_password_token}"
     )
 
-    email_body = render_template(
+    enqueue_email(
+        db,
+        user.email,
+        "Password Reset Request",
         "emails/reset_password.html",
         reset_link=reset_link,
         reset_token_expiration_minutes=settings.RESET_PASSWORD_TOKEN_EXPIRATION_MINUTES,
     )
 
-    await send_email(user.email, "Password Reset Request", email_body, background_tasks)
+    await db.commit()
 
 
 async def reset_password_crud(
@@ -274,7 +273,7 @@ async def reset_password_crud(
             content={"message": "User not found"},
         )
 
-    hashed_password = get_password_hash(reset_password_data.new_password)
+    hashed_password = await password_hasher.hash(reset_password_data.new_password)
 
     user.password = hashed_password
     user.forget_password_token = None
@@ -283,6 +282,7 @@ async def reset_password_crud(
     await db.execute(delete(Session).where(Session.user_id == user.id))
 
     await db.commit()
+    session_cache.discard_user(user.id)
 
 
 async def logout_crud(session_token: str | None, db: AsyncSession):
@@ -295,3 +295,4 @@ async def logout_crud(session_token: str | None, db: AsyncSession):
     # Delete session from DB
     await db.execute(delete(Session).where(Session.session == session_token))
     await db.commit()
+    session_cache.discard(session_token)
@@ -1,8 +1,11 @@
 from typing import List, Optional
 
+from core.http_cache import CATALOG, bump_catalog_version
+from core.reference_cache import ReferenceList, VersionedCache
 from fastapi import HTTPException, status
 from models.book import Author, Book, BookDetails, BookStatus, Category
 from models.order import BorrowOrderBook, PurchaseOrderBook
+from models.settings import Settings
 from schemas.book import (
     BestSellerBookSchema,
     BookDetailsForUpdateResponse,
@@ -17,9 +20,60 @@ from sqlalchemy import func, insert, or_, select, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload, selectinload
-from utils.order import calculate_borrow_order_book_fees
+from utils.pricing import borrow_fee_columns
+
+
+# Only the columns the catalog responses need, so rows are plain tuples
+# instead of hydrated BookDetails/Book/Author/Category objects
+CATALOG_COLUMNS = (
+    BookDetails.id.label("book_details_id"),
+    BookDetails.available_stock,
+    Book.id.label("book_id"),
+    Book.title,
+    Book.description,
+    Book.cover_img,
+    Book.publish_year,
+    Book.price,
+    Book.rating,
+    Author.id.label("author_id"),
+    Author.name.label("author_name"),
+    Category.id.label("category_id"),
+    Category.name.label("category_name"),
+    # Total matches across all pages, returned with the page itself
+    func.count().over().label("total_count"),
+)
+
+
+def _catalog_book_info(row) -> dict:
+    return {
+        "book_details_id": row.book_details_id,
+        "title": row.title,
+        "description": row.description,
+        "cover_img": row.cover_img,
+        "publish_year": row.publish_year,
+        "category": {"id": row.category_id, "name": row.category_name},
+        "author": {"id": row.author_id, "name": row.author_name},
+        "available_stock": row.available_stock,
+        "book_id": row.book_id,
+        "rating": str(row.rating),
+    }
 
-from crud.settings import get_settings_crud
+
+async def _get_catalog_page(db, base_query, page: int, limit: int):
+    """Fetch one page of a projected catalog query along with the total count."""
+    offset = (page - 1) * limit
+    rows = (await db.execute(base_query.limit(limit).offset(offset))).all()
+
+    if rows:
+        total_count = rows[0].total_count
+    elif page > 1:
+        # Past the last page the window count has no row to ride on
+        count_query = select(func.count()).select_from(base_query.subquery())
+        total_count = (await db.execute(count_query)).scalar()
+    else:
+        total_count = 0
+
+    return rows, total_count
 
 
 async def get_borrow_books_crud(
@@ -31,13 +85,24 @@ async def get_borrow_books_crud(
     limit: int = 10,
     book_details_id: Optional[int] = None,
 ):
-    # 1. Join with all necessary tables upfront
+    # 1. Join with all necessary tables upfront, along with the fee settings so
+    #    the whole page, fees included, comes back in a single round trip
     base_query = (
-        select(BookDetails)
+        select(
+            *CATALOG_COLUMNS,
+            *borrow_fee_columns(
+                Book.price,
+                Settings.borrow_perc,
+                Settings.deposit_perc,
+                Settings.min_borrow_fee,
+            ),
+        )
+        .select_from(BookDetails)
         .where(BookDetails.status == BookStatus.BORROW)
         .join(BookDetails.book)
         .join(Book.author)
         .join(Book.category)
+        .outerjoin(Settings, Settings.id == 1)
     )
 
     # 2. Apply filters based on optional arguments
@@ -63,63 +128,21 @@ async def get_borrow_books_crud(
         # Filter by category ID
         base_query = base_query.where(Category.id.in_(category_ids_list))
 
-    # --- 3. Calculate pagination parameters and retrieve the data. ---
-
-    # Get the total count of items that match the filters.
-    count_query = select(func.count()).select_from(base_query.subquery())
-    total_count = (await db.execute(count_query)).scalar()
-
-    # Calculate offset for pagination
-    offset = (page - 1) * limit
+    # --- 3. Retrieve the page and the total count of matching items. ---
+    rows, total_count = await _get_catalog_page(db, base_query, page, limit)
 
-    # Construct the final query with eager loading, limit, and offset
-    query = (
-        base_query.options(
-            selectinload(BookDetails.book).selectinload(Book.author),
-            selectinload(BookDetails.book).selectinload(Book.category),
+    # Without the settings row the outer join leaves the fees NULL
+    if rows and rows[0].borrow_fees_per_week is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Settings not found in database.",
         )
-        .limit(limit)
-        .offset(offset)
-    )
-
-    books_for_borrowing = await db.execute(query)
-
-    # Fetch settings for fee calculation
-    settings = await get_settings_crud(db)
 
     result_list = []
-    for book_details in books_for_borrowing.scalars():
-        # Calculate fees for each book
-        fees = calculate_borrow_order_book_fees(
-            book_price=book_details.book.price,
-            borrowing_weeks=1,
-            borrow_perc=settings.borrow_perc,
-            deposit_perc=settings.deposit_perc,
-            delay_perc=settings.delay_perc,
-            min_borrow_fee=settings.min_borrow_fee,
-            promo_code_perc=None,
-        )
-
-        book_info = {
-            "book_details_id": book_details.id,
-            "title": book_details.book.title,
-            "description": book_details.book.description,
-            "cover_img": book_details.book.cover_img,
-            "publish_year": book_details.book.publish_year,
-            "category": {
-                "id": book_details.book.category.id,
-                "name": book_details.book.category.name,
-            },
-            "author": {
-                "id": book_details.book.author.id,
-                "name": book_details.book.author.name,
-            },
-            "available_stock": book_details.available_stock,
-            "book_id": book_details.book.id,
-            "borrow_fees_per_week": fees["borrow_fees_per_week"],
-            "deposit_fees": fees["deposit_fees"],
-            "rating": str(book_details.book.rating),
-        }
+    for row in rows:
+        book_info = _catalog_book_info(row)
+        book_info["borrow_fees_per_week"] = row.borrow_fees_per_week
+        book_info["deposit_fees"] = row.deposit_fees
         result_list.append(book_info)
 
     # Return a dictionary with the list of books and pagination metadata
@@ -159,7 +182,8 @@ async def get_purchase_books_crud(
     # 1. Join with all necessary tables upfront to ensure all fields are accessible for filtering
     #    and the final response schema.
     base_query = (
-        select(BookDetails)
+        select(*CATALOG_COLUMNS)
+        .select_from(BookDetails)
         .where(BookDetails.status == BookStatus.PURCHASE)
         .join(BookDetails.book)
         .join(Book.author)
@@ -187,49 +211,14 @@ async def get_purchase_books_crud(
         ]
         base_query = base_query.where(Category.id.in_(category_ids_list))
 
-    # --- Step 4: Calculate pagination parameters and retrieve the data. ---
-
-    # Get the total count of items that match the filters.
-    count_query = select(func.count()).select_from(base_query.subquery())
-    total_count = (await db.execute(count_query)).scalar()
-
-    # Calculate offset for pagination
-    offset = (page - 1) * limit
-
-    # Construct the final query with eager loading, limit, and offset
-    query = (
-        base_query.options(
-            selectinload(BookDetails.book).selectinload(Book.author),
-            selectinload(BookDetails.book).selectinload(Book.category),
-        )
-        .limit(limit)
-        .offset(offset)
-    )
-
-    books_for_purchase = await db.execute(query)
+    # --- Step 4: Retrieve the page and the total count of matching items. ---
+    rows, total_count = await _get_catalog_page(db, base_query, page, limit)
 
     return_list = []
-    for book_details in books_for_purchase.scalars():
-        # Map the ORM object to the required response schema
-        book_info = {
-            "book_details_id": book_details.id,
-            "title": book_details.book.title,
-            "description": book_details.book.description,
-            "cover_img": book_details.book.cover_img,
-            "publish_year": book_details.book.publish_year,
-            "category": {
-                "id": book_details.book.category.id,
-                "name": book_details.book.category.name,
-            },
-            "author": {
-                "id": book_details.book.author.id,
-                "name": book_details.book.author.name,
-            },
-            "available_stock": book_details.available_stock,
-            "book_id": book_details.book.id,
-            "price": book_details.book.price,
-            "rating": str(book_details.book.rating),
-        }
+    for row in rows:
+        # Map the row to the required response schema
+        book_info = _catalog_book_info(row)
+        book_info["price"] = row.price
         return_list.append(book_info)
 
     # Return a dictionary with the list of books and pagination metadata
@@ -242,10 +231,32 @@ async def get_purchase_books_crud(
     }
 
 
-async def get_authors_crud(db):
-    result = await db.execute(select(Author))
-    authors = result.scalars().all()
-    return authors
+# Filter sidebar data, reloaded only when the catalog stamp is bumped
+authors_cache = VersionedCache("authors", CATALOG)
+categories_cache = VersionedCache("categories", CATALOG)
+
+
+async def _load_reference_list(db, model, book_fk) -> ReferenceList:
+    """All rows of `model` with the number of books pointing at each."""
+    result = await db.execute(
+        select(model.id, model.name, func.count(Book.id).label("books_count"))
+        .outerjoin(Book, book_fk == model.id)
+        .group_by(model.id)
+    )
+    return ReferenceList([row._asdict() for row in result])
+
+
+async def _load_authors(db) -> ReferenceList:
+    return await _load_reference_list(db, Author, Book.author_id)
+
+
+async def _load_categories(db) -> ReferenceList:
+    return await _load_reference_list(db, Category, Book.category_id)
+
+
+async def get_authors_crud(db, prefix: Optional[str] = None):
+    authors = await authors_cache.get(db, _load_authors)
+    return authors.lookup(prefix)
 
 
 async def get_author_by_id(db, author_id: int):
@@ -276,6 +287,7 @@ async def create_author_crud(
     try:
         new_author = Author(name=author_data.name)
         db.add(new_author)
+        await bump_catalog_version(db, CATALOG)
         await db.commit()
         await db.refresh(new_author)
         return new_author
@@ -287,10 +299,9 @@ async def create_author_crud(
         )
 
 
-async def get_categories_crud(db):
-    result = await db.execute(select(Category))
-    categories = result.scalars().all()
-    return categories
+async def get_categories_crud(db, prefix: Optional[str] = None):
+    categories = await categories_cache.get(db, _load_categories)
+    return categories.lookup(prefix)
 
 
 async def get_category_by_id(db, category_id: int):
@@ -320,6 +331,7 @@ async def create_category_crud(
     try:
         new_category = Category(name=category_data.name)
         db.add(new_category)
+        await bump_catalog_version(db, CATALOG)
         await db.commit()
         await db.refresh(new_category)
         return new_category
@@ -360,6 +372,8 @@ async def create_book(book_data: CreateBookRequest, db: AsyncSession):
         )
         db.add(book_to_create)
         await db.flush()
+        # Committed with the book details
+        await bump_catalog_version(db, CATALOG)
     except Exception as e:
         await db.rollback()
         raise HTTPException(
@@ -482,6 +496,7 @@ async def update_book_crud(book_id: int, book_data: UpdateBookData, db: AsyncSes
         )
         await db.execute(borrow_stock_stmt)
 
+    await bump_catalog_version(db, CATALOG)
     try:
         await db.commit()
     except Exception as e:
@@ -9,7 +9,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload, selectinload
 from utils.cart import validate_borrowing_limit
-from utils.order import calculate_borrow_order_book_fees
+from utils.pricing import BorrowPricing
 
 from crud.settings import get_settings_crud
 
@@ -32,6 +32,7 @@ async def display_cart(db: AsyncSession, user_id: int):
 
 async def read_user_cart_crud(db: AsyncSession, user: User) -> dict[str, Any]:
     settings = await get_settings_crud(db)
+    pricing = BorrowPricing.from_settings(settings)
     cart_items = await display_cart(db, user.id)
     borrow_items = []
     purchase_items = []
@@ -43,14 +44,7 @@ async def read_user_cart_crud(db: AsyncSession, user: User) -> dict[str, Any]:
         ):
             book_price = cart_item.book_details.book.price
 
-            fees_data = calculate_borrow_order_book_fees(
-                book_price=book_price,
-                borrowing_weeks=1,
-                borrow_perc=settings.borrow_perc,
-                deposit_perc=settings.deposit_perc,
-                delay_perc=settings.delay_perc,
-                min_borrow_fee=settings.min_borrow_fee,
-            )
+            fees_data = pricing.fees(book_price=book_price, borrowing_weeks=1)
 
             borrow_object = BorrowItemResponse(
                 id=cart_item.id,
@@ -1,6 +1,7 @@
 from decimal import Decimal
 
-from core.auth import get_password_hash
+from core.auth import password_hasher
+from core.http_cache import SETTINGS, bump_catalog_version
 from fastapi import HTTPException, status
 from models.book import Book, BookDetails
 from models.order import (
@@ -270,6 +271,7 @@ async def update_settings_crud(db: AsyncSession, settings_update: SettingsUpdate
             create_data = {**default_values, **provided_values}
             new_settings = Settings(**create_data)
             db.add(new_settings)
+            await bump_catalog_version(db, SETTINGS)
             await db.commit()
             await db.refresh(new_settings)
             return new_settings
@@ -292,6 +294,7 @@ async def update_settings_crud(db: AsyncSession, settings_update: SettingsUpdate
 
         result = await db.execute(stmt)
         updated_settings = result.scalar_one()
+        await bump_catalog_version(db, SETTINGS)
         await db.commit()
 
         # Refresh to get the updated object
@@ -325,7 +328,7 @@ async def add_new_staff_crud(db: AsyncSession, user_data: AddNewUserRequest):
         if result.scalars().first():
             raise HTTPException(status_code=400, detail="National ID already exists")
 
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await password_hasher.hash(user_data.password)
 
         new_user = User(
             first_name=user_data.first_name,
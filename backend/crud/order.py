@@ -1,9 +1,9 @@
 from datetime import datetime, timedelta
 from decimal import Decimal
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from fastapi import HTTPException, status
-from models.book import BookDetails
+from models.book import Book, BookDetails, BookStatus
 from models.cart import Cart
 from models.notification import NotificationType
 from models.order import (
@@ -16,29 +16,49 @@ from models.order import (
     ReturnOrder,
     ReturnOrderStatus,
 )
+from models.settings import PromoCode, Settings
+from models.transaction import Transaction, TransactionType
 from models.user import User, UserRole
 from schemas.order import (
     CreateOrderRequest,
     UpdateOrderStatusRequest,
 )
-from sqlalchemy import delete, select
+from sqlalchemy import (
+    String,
+    cast,
+    delete,
+    func,
+    insert,
+    literal,
+    select,
+    true,
+    update,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload, selectinload
-from utils.cart import get_user_cart, validate_borrowing_limit
+from sqlalchemy.orm.attributes import set_committed_value
+from utils.idempotency import (
+    claim_idempotency_key,
+    hash_request,
+    store_idempotent_response,
+)
 from utils.notification import send_notification
 from utils.order import (
-    calculate_borrow_order_book_fees,
     calculate_purchase_order_book_fees,
     get_delivery_fees,
-    get_promo_code_discount_perc,
     validate_borrow_book_and_borrowing_weeks_and_available_stock,
     validate_purchase_book_and_available_stock,
 )
+from utils.order_lines import (
+    adjust_book_stock,
+    insert_borrow_order_lines,
+    insert_purchase_order_lines,
+    sum_stock_changes,
+)
+from utils.pricing import BorrowPricing
 from utils.socket import send_created_order, send_updated_order
 from utils.wallet import pay_from_wallet
 
-from crud.settings import get_settings_crud
-
 
 async def get_orders_for_staff_crud(db: AsyncSession, staff_user: User):
     try:
@@ -194,13 +214,200 @@ async def get_order_details_crud(
         )
 
 
+def _checkout_snapshot_query(user_id: int, promo_code_id: Optional[int]):
+    """
+    Everything checkout needs to validate and price an order, in one query:
+    one row per cart line (or a single row for an empty cart) carrying the fee
+    settings, the user's balance and borrow count, and the promo code.
+    """
+    cart_lines = (
+        select(
+            Cart.book_details_id,
+            Cart.quantity,
+            Cart.borrowing_weeks,
+            BookDetails.status,
+            BookDetails.available_stock,
+            Book.price,
+        )
+        .join(Cart.book_details)
+        .join(BookDetails.book)
+        .where(Cart.user_id == user_id)
+        .cte("cart_lines")
+    )
+
+    return (
+        select(
+            Settings.borrow_perc,
+            Settings.deposit_perc,
+            Settings.delay_perc,
+            Settings.min_borrow_fee,
+            Settings.delivery_fees,
+            Settings.max_num_of_borrow_books,
+            User.wallet,
+            User.current_borrowed_books,
+            PromoCode.discount_perc.label("promo_code_perc"),
+            PromoCode.is_active.label("promo_code_is_active"),
+            # Named like BookDetails so the line validators accept the row
+            cart_lines.c.book_details_id.label("id"),
+            cart_lines.c.quantity,
+            cart_lines.c.borrowing_weeks,
+            cart_lines.c.status,
+            cart_lines.c.available_stock,
+            cart_lines.c.price,
+        )
+        .select_from(Settings)
+        .join(User, User.id == user_id)
+        .outerjoin(PromoCode, PromoCode.id == promo_code_id)
+        .outerjoin(cart_lines, true())
+        .where(Settings.id == 1)
+    )
+
+
+def _checkout_write_statement(
+    user: User,
+    order_data: CreateOrderRequest,
+    delivery_fees: Optional[Decimal],
+    total_order_value: Decimal,
+    borrow_lines: list,
+    purchase_lines: list,
+):
+    """
+    The order, its lines, the stock decrements, the wallet debit with its
+    transaction and the cart clear as data-modifying CTEs of one statement.
+    Stock and wallet updates are conditional; the returned counts tell the
+    caller whether every one of them applied.
+    """
+    new_order = (
+        insert(Order)
+        .values(
+            address=order_data.address,
+            phone_number=order_data.phone_number,
+            pickup_date=None,
+            pickup_type=order_data.pickup_type,
+            status=OrderStatus.CREATED.value,
+            delivery_fees=delivery_fees,
+            user_id=user.id,
+            promo_code_id=order_data.promo_code_id,
+        )
+        .returning(
+            Order.id,
+            Order.created_at,
+            Order.address,
+            Order.phone_number,
+            Order.pickup_type,
+            Order.pickup_date,
+            Order.courier_id,
+            Order.status,
+        )
+        .cte("new_order")
+    )
+
+    new_order_id = select(new_order.c.id).scalar_subquery()
+    checks = {}
+
+    if borrow_lines:
+        checks["borrow_lines"] = insert_borrow_order_lines(
+            new_order_id, user.id, borrow_lines
+        ).cte("inserted_borrow_lines")
+
+    if purchase_lines:
+        checks["purchase_lines"] = insert_purchase_order_lines(
+            new_order_id, user.id, purchase_lines
+        ).cte("inserted_purchase_lines")
+
+    # One decrement per book, only where enough stock is left
+    stock_changes = sum_stock_changes(
+        [(line["book_details_id"], -1) for line in borrow_lines]
+        + [(line["book_details_id"], -line["quantity"]) for line in purchase_lines]
+    )
+    if stock_changes:
+        checks["stock_updates"] = adjust_book_stock(stock_changes).cte("stock_updates")
+
+    wallet_update = (
+        update(User)
+        .where(User.id == user.id, User.wallet >= total_order_value)
+        .values(
+            wallet=User.wallet - total_order_value,
+            current_borrowed_books=User.current_borrowed_books + len(borrow_lines),
+        )
+        .returning(User.wallet, User.current_borrowed_books)
+        .cte("wallet_update")
+    )
+
+    # Pay money and add to transaction history
+    payment = (
+        insert(Transaction)
+        .from_select(
+            ["user_id", "amount", "transaction_type", "description"],
+            select(
+                literal(user.id),
+                literal(total_order_value, Transaction.amount.type),
+                literal(TransactionType.WITHDRAWING.value),
+                literal("Payment for Order ID: ") + cast(new_order.c.id, String),
+            ),
+        )
+        .returning(Transaction.id)
+        .cte("payment")
+    )
+    checks["payment"] = payment
+
+    # Delete cart items after order creation
+    cleared_cart = (
+        delete(Cart)
+        .where(Cart.user_id == user.id)
+        .returning(Cart.id)
+        .cte("cleared_cart")
+    )
+    checks["cleared_cart"] = cleared_cart
+
+    return select(
+        *new_order.c,
+        select(wallet_update.c.wallet).scalar_subquery().label("wallet"),
+        select(wallet_update.c.current_borrowed_books)
+        .scalar_subquery()
+        .label("current_borrowed_books"),
+        *(
+            select(func.count()).select_from(cte).scalar_subquery().label(name)
+            for name, cte in checks.items()
+        ),
+    )
+
+
 async def create_order_crud(
     db: AsyncSession,
     user: User,
     order_data: CreateOrderRequest,
+    idempotency_key: Optional[str] = None,
 ):
     try:
-        settings = await get_settings_crud(db)
+        if idempotency_key is not None:
+            # Keys are per user, so clients can't collide with each other
+            idempotency_key = f"order:{user.id}:{idempotency_key}"
+            stored = await claim_idempotency_key(
+                db, idempotency_key, hash_request(order_data.model_dump(mode="json"))
+            )
+            if stored is not None:
+                return stored.response_body
+
+        # Read everything in one round trip
+        result = await db.execute(
+            _checkout_snapshot_query(user.id, order_data.promo_code_id)
+        )
+        rows = result.all()
+        if not rows:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Settings not found in database.",
+            )
+        snapshot = rows[0]
+        cart_lines = [row for row in rows if row.id is not None]
+
+        pricing = BorrowPricing(
+            borrow_perc=snapshot.borrow_perc,
+            deposit_perc=snapshot.deposit_perc,
+            delay_perc=snapshot.delay_perc,
+            min_borrow_fee=snapshot.min_borrow_fee,
+        )
         if order_data.pickup_type == PickUpType.COURIER and (
             not order_data.address or not order_data.phone_number
         ):
@@ -209,169 +416,151 @@ async def create_order_crud(
                 detail="Address and phone number are required for courier orders.",
             )
 
-        cart = await get_user_cart(user.id, db)
+        borrow_cart_lines = [
+            row for row in cart_lines if row.status == BookStatus.BORROW
+        ]
+        purchase_cart_lines = [
+            row for row in cart_lines if row.status == BookStatus.PURCHASE
+        ]
 
         # Check borrowing limit
-        borrowing_book_count = len(cart["borrow_books"])
-
-        await validate_borrowing_limit(db, user, settings.max_num_of_borrow_books)
-
-        promo_code_discount_perc = await get_promo_code_discount_perc(order_data, db)
-
-        # Fetch all BookDetails and their related Book objects
-        book_details_ids = [
-            item["book_details_id"] for item in cart["borrow_books"]
-        ] + [item["book_details_id"] for item in cart["purchase_books"]]
-
-        stmt = (
-            select(BookDetails)
-            .options(joinedload(BookDetails.book))
-            .where(BookDetails.id.in_(book_details_ids))
-        )
-        result = await db.execute(stmt)
+        if (
+            snapshot.current_borrowed_books
+            + sum(row.quantity for row in borrow_cart_lines)
+            > snapshot.max_num_of_borrow_books
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Cannot borrow more than {snapshot.max_num_of_borrow_books} books at once.",
+            )
 
-        book_details_map = {
-            book_details.id: book_details for book_details in result.scalars().all()
-        }
+        # Check for and validate promo code if an ID is provided
+        promo_code_discount_perc = None
+        if order_data.promo_code_id is not None:
+            if not snapshot.promo_code_is_active:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Invalid or inactive promo code.",
+                )
+            promo_code_discount_perc = snapshot.promo_code_perc
 
-        borrow_order_books = []
-        purchase_order_books = []
+        borrow_lines = []
+        purchase_lines = []
         total_order_value = Decimal("0.0")
 
         # Delivery fees
-        delivery_fees = get_delivery_fees(order_data, settings.delivery_fees)
+        delivery_fees = get_delivery_fees(order_data, snapshot.delivery_fees)
         if delivery_fees is not None:
             total_order_value = total_order_value + delivery_fees
 
-        # Create the main Order object
-        order = Order(
-            address=order_data.address,
-            phone_number=order_data.phone_number,
-            pickup_date=None,
-            pickup_type=order_data.pickup_type,
-            status=OrderStatus.CREATED.value,
-            delivery_fees=delivery_fees,
-            user_id=user.id,
-            promo_code_id=order_data.promo_code_id,
-        )
-        db.add(order)
-
         # Borrowed books
-        for item in cart["borrow_books"]:
-            book_details = book_details_map.get(item["book_details_id"])
-            if not book_details:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Book details with id {item['book_details_id']} not found.",
-                )
-            validate_borrow_book_and_borrowing_weeks_and_available_stock(
-                item, book_details
-            )
+        for row in borrow_cart_lines:
+            item = {"book_details_id": row.id, "borrowing_weeks": row.borrowing_weeks}
+            validate_borrow_book_and_borrowing_weeks_and_available_stock(item, row)
 
-            # Calculate borrowing fees for each book using the updated function
-            fees_data = calculate_borrow_order_book_fees(
-                book_price=book_details.book.price,
-                borrowing_weeks=item["borrowing_weeks"],
-                borrow_perc=settings.borrow_perc,
-                deposit_perc=settings.deposit_perc,
-                delay_perc=settings.delay_perc,
-                min_borrow_fee=settings.min_borrow_fee,
+            fees_data = pricing.fees(
+                book_price=row.price,
+                borrowing_weeks=row.borrowing_weeks,
                 promo_code_perc=promo_code_discount_perc,
             )
-
-            borrow_fees = fees_data["borrow_fees"]
-            deposit_fees = fees_data["deposit_fees"]
-            delay_fees_per_day = fees_data["delay_fees_per_day"]
-            promo_code_discount = fees_data["promo_code_discount"]
-
-            total_order_value = total_order_value + borrow_fees + deposit_fees
-
-            # Create a single BorrowOrderBook record for each borrowed item
-            borrow_book = BorrowOrderBook(
-                borrowing_weeks=item["borrowing_weeks"],
-                borrow_book_problem=BorrowBookProblem.NORMAL.value,
-                deposit_fees=deposit_fees,
-                borrow_fees=borrow_fees,
-                delay_fees_per_day=delay_fees_per_day,
-                promo_code_discount=promo_code_discount,
-                original_book_price=book_details.book.price,
-                book_details_id=book_details.id,
-                order=order,
-                user_id=user.id,
-                actual_return_date=None,
-                expected_return_date=None,
-                return_order_id=None,
+            total_order_value = (
+                total_order_value + fees_data["borrow_fees"] + fees_data["deposit_fees"]
             )
-            borrow_order_books.append(borrow_book)
 
-            # Decrement stock
-            book_details.available_stock -= 1
+            borrow_lines.append(
+                {
+                    "book_details_id": row.id,
+                    "borrowing_weeks": row.borrowing_weeks,
+                    "deposit_fees": fees_data["deposit_fees"],
+                    "borrow_fees": fees_data["borrow_fees"],
+                    "delay_fees_per_day": fees_data["delay_fees_per_day"],
+                    "promo_code_discount": fees_data["promo_code_discount"],
+                    "original_book_price": row.price,
+                }
+            )
 
         # Purchased books
-        for item in cart["purchase_books"]:
-            book_details = book_details_map.get(item["book_details_id"])
-            if not book_details:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Book details with id {item['book_details_id']} not found.",
-                )
+        for row in purchase_cart_lines:
+            item = {"book_details_id": row.id, "quantity": row.quantity}
+            validate_purchase_book_and_available_stock(item, row)
 
-            validate_purchase_book_and_available_stock(item, book_details)
-
-            # Use the new function to calculate fees for purchased books
             purchase_fees_data = calculate_purchase_order_book_fees(
-                book_price=book_details.book.price,
+                book_price=row.price,
                 promo_code_perc=promo_code_discount_perc,
             )
-
             paid_price_per_book = purchase_fees_data["paid_price_per_book"]
-            promo_code_discount_per_book = purchase_fees_data[
-                "promo_code_discount_per_book"
-            ]
 
             # Add the total price (after discount) to the overall order value
-            total_order_value = (
-                total_order_value + paid_price_per_book * item["quantity"]
+            total_order_value = total_order_value + paid_price_per_book * row.quantity
+
+            purchase_lines.append(
+                {
+                    "book_details_id": row.id,
+                    "quantity": row.quantity,
+                    "paid_price_per_book": paid_price_per_book,
+                    "promo_code_discount_per_book": purchase_fees_data[
+                        "promo_code_discount_per_book"
+                    ],
+                }
             )
 
-            # Create a single PurchaseOrderBook record
-            purchase_book = PurchaseOrderBook(
-                quantity=item["quantity"],
-                paid_price_per_book=paid_price_per_book,
-                promo_code_discount_per_book=promo_code_discount_per_book,
-                order=order,
-                book_details_id=book_details.id,
-                user_id=user.id,
+        if snapshot.wallet < total_order_value:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Insufficient funds in wallet. Current balance: {snapshot.wallet}, required: {total_order_value}",
             )
-            purchase_order_books.append(purchase_book)
-
-            # Decrement stock
-            book_details.available_stock -= item["quantity"]
 
-        # This ensures order.id is available to link the transaction as transaction is not a direct child to order
-        await db.flush()
-
-        # Pay money and add to transaction history
-        await pay_from_wallet(
-            db=db,
-            user=user,
-            amount=total_order_value,
-            description=f"Payment for Order ID: {order.id}",
+        # Write everything in one round trip
+        result = await db.execute(
+            _checkout_write_statement(
+                user,
+                order_data,
+                delivery_fees,
+                total_order_value,
+                borrow_lines,
+                purchase_lines,
+            )
         )
-        user.current_borrowed_books += borrowing_book_count
+        order = result.one()
 
-        # Add all new order books to the session
-        db.add_all(borrow_order_books)
-        db.add_all(purchase_order_books)
-        # Delete cart items after order creation
-        await db.execute(delete(Cart).where(Cart.user_id == user.id))
+        # A concurrent checkout took the stock or the balance since the read
+        if order.wallet is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Insufficient funds in wallet.",
+            )
+        ordered_book_details_ids = {
+            line["book_details_id"] for line in borrow_lines + purchase_lines
+        }
+        if ordered_book_details_ids and order.stock_updates != len(
+            ordered_book_details_ids
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Not enough stock left for one of the books in your cart.",
+            )
+
+        response = {"message": "Order created successfully", "order_id": order.id}
+        if idempotency_key is not None:
+            await store_idempotent_response(
+                db, idempotency_key, status.HTTP_201_CREATED, response
+            )
 
         # Commit the transaction
         await db.commit()
 
-        await send_created_order(order, borrow_order_books, purchase_order_books)
+        # Keep the session's user in line with what was written
+        set_committed_value(user, "wallet", order.wallet)
+        set_committed_value(
+            user, "current_borrowed_books", order.current_borrowed_books
+        )
+
+        number_of_books = len(borrow_lines) + sum(
+            line["quantity"] for line in purchase_lines
+        )
+        await send_created_order(order, user, number_of_books)
 
-        return {"message": "Order created successfully", "order_id": order.id}
+        return response
 
     except HTTPException as e:
         # If an HTTPException is raised, rollback and re-raise the exception
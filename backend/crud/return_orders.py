@@ -3,7 +3,7 @@ from decimal import Decimal
 from typing import Any, Dict, List
 
 from fastapi import HTTPException, status
-from models.book import BookDetails
+from models.book import Book, BookDetails
 from models.notification import NotificationType
 from models.order import (
     BorrowBookProblem,
@@ -24,11 +24,13 @@ from schemas.return_order import (
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from utils.notification import send_notification
 from utils.order import (
     validate_return_order_for_courier,
     validate_return_order_for_employee,
 )
+from utils.order_lines import adjust_book_stock, assign_return_order, sum_stock_changes
 from utils.socket import (
     send_courier_return_order,
     send_created_return_order,
@@ -170,6 +172,45 @@ async def create_return_order_crud(
 
         delivery_fees = Decimal(settings.delivery_fees)
 
+    # Validate the requested lines with one projected query
+    stmt_books_to_return = (
+        select(
+            BorrowOrderBook.id,
+            BorrowOrderBook.borrow_book_problem,
+            Order.status.label("order_status"),
+            Book.title,
+        )
+        .join(BorrowOrderBook.order)
+        .join(BorrowOrderBook.book_details)
+        .join(BookDetails.book)
+        .where(
+            BorrowOrderBook.id.in_(return_order_data.borrowed_books_ids),
+            BorrowOrderBook.user_id == user.id,
+            BorrowOrderBook.return_order_id.is_(None),
+        )
+    )
+
+    result_books_to_return = await db.execute(stmt_books_to_return)
+    books_to_return = result_books_to_return.all()
+
+    if len(books_to_return) != len(return_order_data.borrowed_books_ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="One or more selected books are not valid for return or not currently loaned to you.",
+        )
+
+    for book in books_to_return:
+        if book.order_status != OrderStatus.PICKED_UP:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Book ID {book.id} (Title: {book.title}) has not been picked up yet.",
+            )
+        if book.borrow_book_problem != BorrowBookProblem.NORMAL:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Book ID {book.id} (Title: {book.title}) has a problem status and cannot be returned normally.",
+            )
+
     return_order = ReturnOrder(
         address=return_order_data.address,
         phone_number=return_order_data.phone_number,
@@ -191,39 +232,20 @@ async def create_return_order_crud(
             apply_negative_balance=False,
         )
 
-    stmt_books_to_return = (
-        select(BorrowOrderBook)
-        .where(
-            BorrowOrderBook.id.in_(return_order_data.borrowed_books_ids),
-            BorrowOrderBook.user_id == user.id,
-            BorrowOrderBook.return_order_id.is_(None),
+    # Attach every line in one statement; a line claimed by a concurrent
+    # return order in the meantime is skipped and fails the request
+    result_returned_ids = await db.execute(
+        assign_return_order(
+            return_order.id, user.id, return_order_data.borrowed_books_ids
         )
-        .options(selectinload(BorrowOrderBook.order))
     )
-
-    result_books_to_return = await db.execute(stmt_books_to_return)
-    books_to_update = result_books_to_return.scalars().all()
-
-    if len(books_to_update) != len(return_order_data.borrowed_books_ids):
+    if len(result_returned_ids.all()) != len(books_to_return):
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="One or more selected books are not valid for return or not currently loaned to you.",
         )
 
-    for book in books_to_update:
-        if book.order.status != OrderStatus.PICKED_UP:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Book ID {book.id} (Title: {book.book_details.book.title}) has not been picked up yet.",
-            )
-        if book.borrow_book_problem != BorrowBookProblem.NORMAL:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Book ID {book.id} (Title: {book.book_details.book.title}) has a problem status and cannot be returned normally.",
-            )
-
-        book.return_order_id = return_order.id
-
     await db.commit()
     await db.refresh(return_order)
 
@@ -283,6 +305,7 @@ async def update_return_order_status_crud(
             amount_to_add: Decimal = Decimal(0)
             amount_to_withdraw: Decimal = Decimal(0)
             now_utc = datetime.now(timezone.utc)
+            restocked_book_details = []
 
             for book in db_return_order.borrow_order_books_details:
                 book.actual_return_date = now_utc
@@ -310,7 +333,7 @@ async def update_return_order_status_crud(
                     else:
                         amount_to_add += book.deposit_fees
 
-                    book.book_details.available_stock += 1
+                    restocked_book_details.append(book.book_details)
 
                 elif book.borrow_book_problem == BorrowBookProblem.LOST.value:
                     book_price_after_discount = book.original_book_price
@@ -319,6 +342,23 @@ async def update_return_order_status_crud(
 
                     amount_to_withdraw += book_price_after_discount - book.deposit_fees
 
+            # Put every returned copy back in stock with one statement
+            if restocked_book_details:
+                await db.execute(
+                    adjust_book_stock(
+                        sum_stock_changes(
+                            (book_details.id, 1)
+                            for book_details in restocked_book_details
+                        )
+                    )
+                )
+                for book_details in restocked_book_details:
+                    set_committed_value(
+                        book_details,
+                        "available_stock",
+                        book_details.available_stock + 1,
+                    )
+
             await send_notification(
                 db,
                 db_return_order.user_id,
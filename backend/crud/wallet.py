@@ -1,16 +1,28 @@
+from datetime import datetime
 from decimal import Decimal
+from typing import Optional
 
 import stripe
+from core.payments import payment_gateway
 from fastapi import HTTPException
-from models.transaction import Transaction
+from models.transaction import Transaction, TransactionType
 from models.user import User
 from schemas.wallet import CreateCheckoutRequest
 from settings import settings  # type: ignore
-from sqlalchemy import select
+from sqlalchemy import and_, case, func, not_, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.responses import RedirectResponse
 from utils.auth import get_user_by_id
-from utils.wallet import add_to_wallet
+from utils.idempotency import (
+    claim_idempotency_key,
+    hash_request,
+    store_idempotent_response,
+)
+from utils.wallet import (
+    add_to_wallet,
+    decode_transactions_cursor,
+    encode_transactions_cursor,
+)
 
 
 async def create_checkout_session_crud(
@@ -22,21 +34,10 @@ async def create_checkout_session_crud(
         success_url = f"{settings.SERVER_DOMAIN}/wallet/payment-success?session_id={{CHECKOUT_SESSION_ID}}"  # Backend
         cancel_url = f"{settings.APP_HOST}/checkout/cancel"  # Frontend
 
-        checkout_session = stripe.checkout.Session.create(
-            line_items=[
-                {
-                    "price_data": {
-                        "currency": "egp",
-                        "unit_amount": checkout_data.amount,  # Amount is expected in piasters (e.g., 100 for 1 EGP)
-                        "product_data": {
-                            "name": "Wallet Top-up",
-                            "description": f"Add EGP {checkout_data.amount / 100:.2f} to your e-wallet",
-                        },
-                    },
-                    "quantity": 1,
-                },
-            ],
-            mode="payment",
+        checkout_session = await payment_gateway.create_checkout_session(
+            amount=checkout_data.amount,  # Amount is expected in piasters (e.g., 100 for 1 EGP)
+            name="Wallet Top-up",
+            description=f"Add EGP {checkout_data.amount / 100:.2f} to your e-wallet",
             success_url=success_url,
             cancel_url=cancel_url,
             # Pass the user_id as metadata to retrieve it in the success endpoint
@@ -51,17 +52,19 @@ async def create_checkout_session_crud(
         return {"url": checkout_session.url}
     except stripe.StripeError as e:
         raise HTTPException(status_code=400, detail=f"Stripe Error: {e.user_message}")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
 
 
 async def payment_success_crud(session_id: str, db: AsyncSession):
     try:
-        session = stripe.checkout.Session.retrieve(session_id)
+        session = await payment_gateway.retrieve_checkout_session(session_id)
 
         if session.status == "complete":
-            user_id = session.get("metadata", {}).get("user_id")
-            amount_total_piasters = session.get("amount_total")
+            user_id = session.metadata.get("user_id")
+            amount_total_piasters = session.amount_total
 
             if amount_total_piasters is None:
                 print(
@@ -81,6 +84,18 @@ async def payment_success_crud(session_id: str, db: AsyncSession):
                 )
 
             try:
+                # Stripe sessions complete once, so the session id is the key.
+                # A reloaded or duplicated redirect replays the first outcome.
+                idempotency_key = f"payment_success:{session_id}"
+                stored = await claim_idempotency_key(
+                    db, idempotency_key, hash_request(session_id)
+                )
+                if stored is not None:
+                    return RedirectResponse(
+                        url=stored.response_body["url"],
+                        status_code=stored.status_code,
+                    )
+
                 user = await get_user_by_id(int(user_id), db)
 
                 if user is None:
@@ -103,11 +118,17 @@ async def payment_success_crud(session_id: str, db: AsyncSession):
 
                 user.stripe_session_id = None
 
+                success_url = f"{settings.APP_HOST}/transaction-success"
+                await store_idempotent_response(
+                    db, idempotency_key, 302, {"url": success_url}
+                )
+
                 await db.commit()
 
-                return RedirectResponse(
-                    url=f"{settings.APP_HOST}/transaction-success", status_code=302
-                )
+                return RedirectResponse(url=success_url, status_code=302)
+            except HTTPException:
+                await db.rollback()
+                raise
             except Exception as e:
                 await db.rollback()
                 raise HTTPException(
@@ -118,6 +139,8 @@ async def payment_success_crud(session_id: str, db: AsyncSession):
     except stripe.StripeError as e:
         await db.rollback()
         raise HTTPException(status_code=400, detail=f"Stripe Error: {e.user_message}")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
 
@@ -133,3 +156,114 @@ async def get_transactions_crud(user_id: int, db: AsyncSession):
     transactions = result.scalars().all()
 
     return transactions
+
+
+async def get_transactions_page_crud(
+    user_id: int,
+    db: AsyncSession,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    with_balance: bool = False,
+):
+    """
+    Keyset-paginated wallet history, newest first, over (created_at, id).
+
+    Args:
+        user_id: Owner of the transactions.
+        db: The database session.
+        limit: Maximum number of transactions in the page.
+        cursor: Opaque `next_cursor` returned by the previous page.
+        from_date: Only include transactions created at or after this time.
+        to_date: Only include transactions created before this time.
+        with_balance: Add the wallet balance right after each transaction.
+
+    Returns:
+        A dictionary with the page items and the cursor of the next page.
+    """
+    # Conditions bounding the page from above (newer side)
+    upper_conditions = []
+    if cursor:
+        cursor_created_at, cursor_id = decode_transactions_cursor(cursor)
+        upper_conditions.append(
+            tuple_(Transaction.created_at, Transaction.id)
+            < tuple_(cursor_created_at, cursor_id)
+        )
+    if to_date:
+        upper_conditions.append(Transaction.created_at < to_date)
+
+    conditions = [Transaction.user_id == user_id, *upper_conditions]
+    if from_date:
+        conditions.append(Transaction.created_at >= from_date)
+
+    columns = [
+        Transaction.id,
+        Transaction.amount,
+        Transaction.transaction_type,
+        Transaction.description,
+        Transaction.created_at,
+        Transaction.user_id,
+    ]
+
+    # Fetch one extra row to know whether there is a next page
+    page_query = (
+        select(*columns)
+        .where(*conditions)
+        .order_by(Transaction.created_at.desc(), Transaction.id.desc())
+        .limit(limit + 1)
+    )
+
+    if with_balance:
+        signed_amount = case(
+            (
+                Transaction.transaction_type == TransactionType.ADDING.value,
+                Transaction.amount,
+            ),
+            else_=-Transaction.amount,
+        )
+
+        # Sum of every transaction newer than the page
+        newer_sum = Decimal(0)
+        if upper_conditions:
+            newer_sum = (
+                select(func.coalesce(func.sum(signed_amount), 0))
+                .where(Transaction.user_id == user_id, not_(and_(*upper_conditions)))
+                .scalar_subquery()
+            )
+
+        page = page_query.subquery()
+        page_signed_amount = case(
+            (
+                page.c.transaction_type == TransactionType.ADDING.value,
+                page.c.amount,
+            ),
+            else_=-page.c.amount,
+        )
+
+        # Walk back from the current wallet balance: the balance after a
+        # transaction is the current balance minus everything that came after it
+        newer_in_page = func.coalesce(
+            func.sum(page_signed_amount).over(
+                order_by=(page.c.created_at.desc(), page.c.id.desc()),
+                rows=(None, -1),
+            ),
+            0,
+        )
+        wallet = select(User.wallet).where(User.id == user_id).scalar_subquery()
+
+        page_query = select(
+            *page.c,
+            (wallet - newer_sum - newer_in_page).label("balance_after"),
+        ).order_by(page.c.created_at.desc(), page.c.id.desc())
+
+    result = await db.execute(page_query)
+    rows = result.mappings().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_row = rows[-1]
+        next_cursor = encode_transactions_cursor(last_row["created_at"], last_row["id"])
+
+    return {"items": rows, "next_cursor": next_cursor, "limit": limit}
@@ -1,8 +1,12 @@
+import asyncio
 import os
+import time
 
+from core.metrics import instrument_engine
+from core.query_tracker import UNTRACKED
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 
 
 SQLALCHEMY_DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL")
@@ -10,24 +14,213 @@ SQLALCHEMY_DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL")
 if SQLALCHEMY_DATABASE_URL is None:
     raise ValueError("SQLALCHEMY_DATABASE_URL is not set")
 
-async_engine = create_async_engine(
-    SQLALCHEMY_DATABASE_URL, echo=True, pool_size=10, max_overflow=20
+
+def _pool_setting(pool_class: str, name: str, default: int) -> int:
+    return int(os.getenv(f"DB_{pool_class.upper()}_{name}", default))
+
+
+# Each workload gets its own pool and statement_timeout, so a slow report or a
+# background scan can neither take the connections checkout needs nor run on.
+POOL_CLASSES = {
+    # Request traffic: checkout, cart, wallet, catalog
+    "oltp": {
+        "pool_size": _pool_setting("oltp", "POOL_SIZE", 10),
+        "max_overflow": _pool_setting("oltp", "MAX_OVERFLOW", 20),
+        "pool_timeout": _pool_setting("oltp", "POOL_TIMEOUT", 2),
+        "statement_timeout_ms": _pool_setting("oltp", "STATEMENT_TIMEOUT_MS", 5000),
+    },
+    # Manager dashboard and other reporting aggregates
+    "analytics": {
+        "pool_size": _pool_setting("analytics", "POOL_SIZE", 3),
+        "max_overflow": _pool_setting("analytics", "MAX_OVERFLOW", 2),
+        "pool_timeout": _pool_setting("analytics", "POOL_TIMEOUT", 5),
+        "statement_timeout_ms": _pool_setting(
+            "analytics", "STATEMENT_TIMEOUT_MS", 30000
+        ),
+    },
+    # Scheduler jobs, the email outbox and RAG ingestion
+    "background": {
+        "pool_size": _pool_setting("background", "POOL_SIZE", 2),
+        "max_overflow": _pool_setting("background", "MAX_OVERFLOW", 3),
+        "pool_timeout": _pool_setting("background", "POOL_TIMEOUT", 30),
+        "statement_timeout_ms": _pool_setting(
+            "background", "STATEMENT_TIMEOUT_MS", 120000
+        ),
+    },
+}
+
+
+def create_pool_engine(url: str, pool_class: str, **kwargs):
+    config = POOL_CLASSES[pool_class]
+    return create_async_engine(
+        url,
+        echo=True,
+        pool_size=config["pool_size"],
+        max_overflow=config["max_overflow"],
+        # Give up on a busy pool quickly, the request gets a 503 to retry
+        pool_timeout=config["pool_timeout"],
+        connect_args={
+            "server_settings": {
+                "statement_timeout": str(config["statement_timeout_ms"]),
+                # Tells the pools apart in pg_stat_activity
+                "application_name": f"backend-{pool_class}",
+            }
+        },
+        **kwargs,
+    )
+
+
+def create_session_factory(engine):
+    return async_sessionmaker(
+        bind=engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+    )
+
+
+engines = {
+    pool_class: create_pool_engine(SQLALCHEMY_DATABASE_URL, pool_class)
+    for pool_class in POOL_CLASSES
+}
+session_factories = {
+    pool_class: create_session_factory(engine) for pool_class, engine in engines.items()
+}
+
+for pool_class, engine in engines.items():
+    instrument_engine(engine, pool_class)
+
+async_engine = engines["oltp"]
+# Same pool, for statements that aren't part of the request's own work
+internal_engine = async_engine.execution_options(**UNTRACKED)
+AsyncSessionLocal = session_factories["oltp"]
+AnalyticsSessionLocal = session_factories["analytics"]
+BackgroundSessionLocal = session_factories["background"]
+
+
+# Optional streaming replica for read-only traffic, with the same pool classes
+SQLALCHEMY_REPLICA_DATABASE_URL = os.getenv("SQLALCHEMY_REPLICA_DATABASE_URL")
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", 5))
+
+replica_engines = {}
+replica_session_factories = {}
+if SQLALCHEMY_REPLICA_DATABASE_URL:
+    replica_engines = {
+        pool_class: create_pool_engine(
+            SQLALCHEMY_REPLICA_DATABASE_URL,
+            pool_class,
+            execution_options={"postgresql_readonly": True},
+        )
+        for pool_class in POOL_CLASSES
+    }
+    replica_session_factories = {
+        pool_class: create_session_factory(engine)
+        for pool_class, engine in replica_engines.items()
+    }
+    for pool_class, engine in replica_engines.items():
+        instrument_engine(engine, f"replica_{pool_class}")
+
+# Seconds behind the primary, 0 when every received change is replayed and
+# NULL when that can't be told yet. A server that isn't a standby has no lag.
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+    """
 )
 
-AsyncSessionLocal = async_sessionmaker(
-    bind=async_engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
+
+class ReplicaRouter:
+    """
+    Decides where read-only sessions go: the replica while its replay lag is
+    within the limit, the primary when it falls behind or can't be reached.
+    The lag is checked at most once per interval, by a single request.
+    """
+
+    def __init__(self, engine, max_lag_seconds: float, check_interval_seconds: float):
+        self.engine = engine
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self.lag_seconds = None
+        self.use_replica = False
+        self.checked_at = float("-inf")
+        self.lock = asyncio.Lock()
+
+    async def should_use_replica(self) -> bool:
+        if self.engine is None:
+            return False
+        due = time.monotonic() - self.checked_at >= self.check_interval_seconds
+        # Others keep the last decision while one request checks
+        if due and not self.lock.locked():
+            async with self.lock:
+                await self.check_lag()
+        return self.use_replica
+
+    async def check_lag(self):
+        lag = None
+        try:
+            # A struggling replica must not hold up the request checking it
+            async with asyncio.timeout(1):
+                async with self.engine.connect() as conn:
+                    lag = (await conn.execute(REPLICA_LAG_QUERY)).scalar()
+        except Exception as e:
+            print(f"Replica lag check failed: {e}")
+
+        self.lag_seconds = float(lag) if lag is not None else None
+        use_replica = (
+            self.lag_seconds is not None and self.lag_seconds <= self.max_lag_seconds
+        )
+        if use_replica != self.use_replica:
+            target = "replica" if use_replica else "primary"
+            print(f"Routing reads to the {target} (lag: {self.lag_seconds}s)")
+        self.use_replica = use_replica
+        self.checked_at = time.monotonic()
+
+
+replica_router = ReplicaRouter(
+    replica_engines.get("oltp"), REPLICA_MAX_LAG_SECONDS, REPLICA_LAG_CHECK_SECONDS
 )
 
 
-async def get_db():
-    async with AsyncSessionLocal() as session:
-        yield session
+def get_db_for(pool_class: str, read_only: bool = False):
+    """
+    Builds a get_db dependency for a pool class. Read-only ones go to the
+    replica while it is caught up, for endpoints that can take slightly stale
+    data; flows that read their own writes stay on the primary.
+    """
+
+    async def get_pool_db():
+        session_factory = session_factories[pool_class]
+        if read_only and await replica_router.should_use_replica():
+            session_factory = replica_session_factories[pool_class]
+        async with session_factory() as session:
+            yield session
+
+    return get_pool_db
+
+
+get_db = get_db_for("oltp")
+get_read_db = get_db_for("oltp", read_only=True)
+get_analytics_db = get_db_for("analytics", read_only=True)
+
+
+_sync_engine = None
+
 
 def get_db_sync():
-    sync_engine = create_engine(
-        SQLALCHEMY_DATABASE_URL.replace("asyncpg", "psycopg2"), echo=True
-    )
-    SyncSessionLocal = sessionmaker(bind=sync_engine, expire_on_commit=False)
-    return SyncSessionLocal()
\ No newline at end of file
+    """Sync session for RAG ingestion, with the background statement_timeout."""
+    global _sync_engine
+    if _sync_engine is None:
+        timeout_ms = POOL_CLASSES["background"]["statement_timeout_ms"]
+        _sync_engine = create_engine(
+            SQLALCHEMY_DATABASE_URL.replace("asyncpg", "psycopg2"),
+            echo=True,
+            pool_size=1,
+            max_overflow=1,
+            connect_args={"options": f"-c statement_timeout={timeout_ms}"},
+        )
+    SyncSessionLocal = sessionmaker(bind=_sync_engine, expire_on_commit=False)
+    return SyncSessionLocal()
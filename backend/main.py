@@ -1,13 +1,21 @@
-import json
+import asyncio
 import logging
 import os
 import sys
 from contextlib import asynccontextmanager
-from decimal import Decimal
 
+from core.admission import AdmissionMiddleware, overloaded_response
+from core.auth import password_hasher
 from core.cloudinary import init_cloudinary
+from core.http_cache import catalog_versions
+from core.metrics import MetricsMiddleware
+from core.query_tracker import QueryTrackerMiddleware
+from core.payments import payment_gateway
+from core.serialization import JSONResponse
+from core.websocket import webSocket_connection_manager
 from dotenv import load_dotenv
-from fastapi import APIRouter, FastAPI
+from fastapi import APIRouter, FastAPI, Request
+from RAG import warm_up_recommender
 
 # from RAG.data import ensure_vector_store_initialized
 from routers.auth import auth_router
@@ -15,6 +23,7 @@ from routers.book import book_router
 from routers.cart import cart_router
 from routers.interests import interest_router
 from routers.manager import manager_router
+from routers.metrics import metrics_router
 from routers.notification import notifications_router
 from routers.order import order_router
 from routers.promo_code import promo_code_router
@@ -22,6 +31,7 @@ from routers.return_order import return_order_router
 from routers.wallet import wallet_router
 from routers.websocket import websocket_router
 from settings import settings
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
 sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__))))
 
@@ -30,13 +40,6 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, Decimal):
-            return str(o)
-        return super().default(o)
-
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Logic here will run before the application starts receiving requests.
@@ -46,9 +49,23 @@ async def lifespan(app: FastAPI):
     print("Vector store initialized successfully!", "✌️✌️✌️")
     # RAG system will be initialized lazily on first use
     print("RAG system will initialize on first use")
+    if settings.RAG_WARMUP_ON_STARTUP:
+        # Doesn't hold up startup, requests that need it before it's done
+        # wait for the same import
+        app.state.rag_warm_up = asyncio.create_task(warm_up_recommender())
+    await webSocket_connection_manager.start_pubsub()
+    await webSocket_connection_manager.start_heartbeat()
+    await catalog_versions.start()
 
     yield
 
+    await catalog_versions.stop()
+
+    await webSocket_connection_manager.stop_heartbeat()
+    await webSocket_connection_manager.stop_pubsub()
+    payment_gateway.close()
+    password_hasher.close()
+
     # Logic here will run after the application finishes handling requests.
     print("Application shutdown.")
 
@@ -57,9 +74,23 @@ app = FastAPI(
     title=settings.APP_NAME,
     version=settings.VERSION,
     lifespan=lifespan,
-    json_encoder=CustomJSONEncoder,
+    default_response_class=JSONResponse,
 )
 
+if settings.ADMISSION_CONTROL_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+# Outside admission control, so time spent queued and 503s are measured too
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+if settings.QUERY_TRACKING_ENABLED:
+    app.add_middleware(QueryTrackerMiddleware)
+
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    # No connection freed up within the pool timeout
+    return overloaded_response()
+
 
 api_router = APIRouter(prefix="/api")
 
@@ -76,3 +107,5 @@ api_router.include_router(manager_router)
 api_router.include_router(websocket_router)
 
 app.include_router(api_router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router)
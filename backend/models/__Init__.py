@@ -1 +1 @@
-from . import order, user, book, cart, settings, notification, session, user_tracker  # noqa: F401
+from . import order, user, book, cart, settings, notification, session, user_tracker, idempotency, email_outbox, catalog_version, pubsub_payload  # noqa: F401
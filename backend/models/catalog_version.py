@@ -0,0 +1,11 @@
+from db.base import Base
+from sqlalchemy import BigInteger, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+
+class CatalogVersion(Base):
+    __tablename__ = "catalog_versions"
+
+    # e.g. "catalog" or "settings", bumped by every write to that data
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0)
@@ -6,7 +6,7 @@ from enum import Enum
 from typing import Optional
 
 from db.base import Base
-from sqlalchemy import DateTime, ForeignKey, Index, Numeric
+from sqlalchemy import DateTime, ForeignKey, Index, Numeric, Sequence, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
@@ -40,6 +40,18 @@ class ReturnOrderStatus(Enum):
 
 class BorrowOrderBook(Base):
     __tablename__ = "borrow_order_books"
+    __table_args__ = (
+        # Only un-returned NORMAL borrows are scanned by the reminder jobs
+        Index(
+            "ix_borrow_order_books_pending_return",
+            "expected_return_date",
+            "user_id",
+            postgresql_where=text(
+                "return_order_id IS NULL AND actual_return_date IS NULL "
+                "AND borrow_book_problem = 'NORMAL'"
+            ),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     borrowing_weeks: Mapped[int]
@@ -184,3 +196,7 @@ class ReturnOrder(Base):
     courier: Mapped[User] = relationship(  # noqa: F821 # type: ignore
         back_populates="courier_return_orders", foreign_keys=[courier_id]
     )
+
+
+# Versions of the order-board delta stream pushed over websockets
+order_board_version_seq = Sequence("order_board_version_seq", metadata=Base.metadata)
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from db.base import Base
+from sqlalchemy import BigInteger, DateTime, Index, Text
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+
+class PubSubPayload(Base):
+    __tablename__ = "pubsub_payloads"
+    __table_args__ = (Index("ix_pubsub_payloads_created_at", "created_at"),)
+
+    # Events too large for NOTIFY, which then only carries the id
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    payload: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
@@ -17,7 +17,13 @@ class TransactionType(Enum):
 
 class Transaction(Base):
     __tablename__ = "transactions"
-    __table_args__ = (Index("ix_transactions_user_id", "user_id"),)
+    __table_args__ = (
+        Index("ix_transactions_user_id", "user_id"),
+        # Backs keyset pagination of the wallet history over (created_at, id)
+        Index(
+            "ix_transactions_user_id_created_at_id", "user_id", "created_at", "id"
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     amount: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
@@ -1,3 +1,4 @@
+from core.serialization import ORJSONRoute
 from crud.auth import (
     forget_password_crud,
     login_crud,
@@ -9,7 +10,6 @@ from crud.auth import (
 from db.database import get_db
 from fastapi import (
     APIRouter,
-    BackgroundTasks,
     Cookie,
     Depends,
     Response,
@@ -31,6 +31,7 @@ from utils.auth import get_user_via_session
 auth_router = APIRouter(
     prefix="/auth",
     tags=["Auth"],
+    route_class=ORJSONRoute,
 )
 
 
@@ -44,10 +45,9 @@ async def get_current_user(
 @auth_router.post("/register", response_model=SuccessMessage)
 async def register(
     user_data: RegisterRequest,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
 ):
-    await register_crud(user_data, background_tasks, db)
+    await register_crud(user_data, db)
 
     return {
         "success": True,
@@ -90,10 +90,9 @@ async def login(
 @auth_router.post("/forget-password", response_model=MessageResponse)
 async def forget_password(
     forget_password_data: ForgetPasswordRequest,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
 ):
-    await forget_password_crud(forget_password_data, background_tasks, db)
+    await forget_password_crud(forget_password_data, db)
 
     return {"message": "Password reset email has been sent."}
 
@@ -3,6 +3,8 @@ from decimal import Decimal
 from typing import Annotated, List, Optional
 
 from core.cloudinary import upload_image
+from core.http_cache import CATALOG, SETTINGS, if_none_match
+from core.serialization import ORJSONRoute
 from crud.book import (
     create_author_crud,
     create_book,
@@ -23,7 +25,7 @@ from crud.book import (
     update_book_crud,
 )
 from crud.settings import get_settings_crud
-from db.database import get_db
+from db.database import get_db, get_read_db
 from fastapi import (
     APIRouter,
     Depends,
@@ -37,6 +39,7 @@ from fastapi import (
 from fastapi.responses import JSONResponse
 from models.user_tracker import UserTracker
 from schemas.book import (
+    AuthorCategoryCountSchema,
     AuthorCategorySchema,
     BestSellersResponse,
     BookDetailsForUpdateResponse,
@@ -51,15 +54,29 @@ from schemas.book import (
     UpdateBookData,
 )
 from schemas.manager import SettingsResponse
+from settings import settings
 from sqlalchemy.ext.asyncio import AsyncSession
 from utils.auth import get_staff_user, get_user_id_via_session
 
-book_router = APIRouter(prefix="/books", tags=["Books"])
+book_router = APIRouter(prefix="/books", tags=["Books"], route_class=ORJSONRoute)
+
+# Listings include stock, which changes without a stamp bump; borrow fees
+# come from the settings
+purchase_page_etag = if_none_match(
+    CATALOG, bucket_seconds=settings.CATALOG_STOCK_ETAG_SECONDS
+)
+borrow_page_etag = if_none_match(
+    CATALOG, SETTINGS, bucket_seconds=settings.CATALOG_STOCK_ETAG_SECONDS
+)
+bestsellers_etag = if_none_match(
+    CATALOG, bucket_seconds=settings.BESTSELLERS_ETAG_SECONDS
+)
 
 
 @book_router.get("/borrow", response_model=PaginatedBorrowBooksResponse)
 async def get_borrow_books(
-    db: AsyncSession = Depends(get_db),
+    _etag=Depends(borrow_page_etag),
+    db: AsyncSession = Depends(get_read_db),
     # Optional parameters for filtering and searching
     search: Optional[str] = Query(
         None, description="Search by book title or author name."
@@ -120,7 +137,8 @@ async def get_borrow_book_details(
 
 @book_router.get("/purchase", response_model=PaginatedPurchaseBooksResponse)
 async def get_purchase_books(
-    db: AsyncSession = Depends(get_db),
+    _etag=Depends(purchase_page_etag),
+    db: AsyncSession = Depends(get_read_db),
     # Optional parameters for filtering and searching
     search: Optional[str] = Query(
         None, description="Search by book title or author name."
@@ -174,24 +192,43 @@ async def get_purchase_book_details(
     return book_details_data
 
 
-@book_router.get("/authors", response_model=List[AuthorCategorySchema])
+@book_router.get("/authors", response_model=List[AuthorCategoryCountSchema])
 async def get_authors(
-    db: AsyncSession = Depends(get_db), _=Depends(get_user_id_via_session)
+    _etag=Depends(if_none_match(CATALOG)),
+    prefix: Optional[str] = Query(
+        None, max_length=255, description="Only authors whose name starts with this."
+    ),
+    db: AsyncSession = Depends(get_read_db),
+    _=Depends(get_user_id_via_session),
 ):
-    return await get_authors_crud(db)
+    """
+    All authors sorted by name, with the number of books of each, served from
+    a per-process cache.
+    """
+    return await get_authors_crud(db, prefix=prefix)
 
 
-@book_router.get("/categories", response_model=List[AuthorCategorySchema])
+@book_router.get("/categories", response_model=List[AuthorCategoryCountSchema])
 async def get_categories(
-    db: AsyncSession = Depends(get_db), _=Depends(get_user_id_via_session)
+    _etag=Depends(if_none_match(CATALOG)),
+    prefix: Optional[str] = Query(
+        None, max_length=255, description="Only categories whose name starts with this."
+    ),
+    db: AsyncSession = Depends(get_read_db),
+    _=Depends(get_user_id_via_session),
 ):
-    return await get_categories_crud(db)
+    """
+    All categories sorted by name, with the number of books of each, served from
+    a per-process cache.
+    """
+    return await get_categories_crud(db, prefix=prefix)
 
 
 @book_router.get("/bestsellers", response_model=BestSellersResponse)
 async def get_best_sellers(
+    _etag=Depends(bestsellers_etag),
     limit: int = 8,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     _=Depends(get_user_id_via_session),
 ):
     borrow_books = await get_top_borrow_books(db, limit)
@@ -354,6 +391,8 @@ async def update_book(
     response_model=SettingsResponse,
 )
 async def get_settings(
-    _=Depends(get_user_id_via_session), db: AsyncSession = Depends(get_db)
+    _etag=Depends(if_none_match(SETTINGS)),
+    _=Depends(get_user_id_via_session),
+    db: AsyncSession = Depends(get_db),
 ):
     return await get_settings_crud(db)
@@ -1,5 +1,6 @@
 from typing import Annotated, Optional
 
+from core.serialization import ORJSONRoute
 from crud.cart import (
     add_to_cart_crud,
     delete_cart_item_crud,
@@ -28,6 +29,7 @@ from utils.cart import (
 cart_router = APIRouter(
     prefix="/cart",
     tags=["Cart"],
+    route_class=ORJSONRoute,
 )
 
 
@@ -1,12 +1,13 @@
 import logging
 import random
 
+from core.serialization import ORJSONRoute
 from db.database import get_db
 from fastapi import APIRouter, Depends, HTTPException, status
 from models.book import Book
 from models.user import User
 from models.user_tracker import UserTracker
-from RAG.data import get_recommendations
+from RAG import get_recommendations
 from schemas.interest import InterestInput
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -15,7 +16,9 @@ from utils.auth import get_user_via_session
 
 logger = logging.getLogger(__name__)
 
-interest_router = APIRouter(prefix="/interests", tags=["Interests"])
+interest_router = APIRouter(
+    prefix="/interests", tags=["Interests"], route_class=ORJSONRoute
+)
 
 
 @interest_router.get("/")
@@ -72,6 +75,8 @@ async def recommend_endpoint(
             "recommendations": result,
             "interests": input.interests,
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Recommendation failed: {e}")
         raise HTTPException(status_code=500, detail=f"Recommendation failed: {str(e)}")
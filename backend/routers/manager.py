@@ -4,7 +4,9 @@ from crud.manager import (
     list_all_users_crud,
     update_settings_crud,
 )
-from db.database import get_db
+from core.serialization import ORJSONRoute
+from core.websocket import webSocket_connection_manager
+from db.database import get_analytics_db, get_db
 from fastapi import APIRouter, Depends
 from models.user import User
 from schemas.manager import (
@@ -20,17 +22,24 @@ from utils.auth import manager_required
 manager_router = APIRouter(
     prefix="/manager",
     tags=["Manager"],
+    route_class=ORJSONRoute,
 )
 
 
 @manager_router.get("/dashboard-stats", response_model=ManagerDashboardStats)
 async def get_manager_dashboard_stats(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_analytics_db),
     _=Depends(manager_required),
 ):
     return await get_manager_dashboard_stats_crud(db)
 
 
+@manager_router.get("/websocket-connections")
+async def get_websocket_connections(_=Depends(manager_required)):
+    # Sockets held by the worker that serves this request
+    return webSocket_connection_manager.get_connection_gauges()
+
+
 @manager_router.patch(
     "/settings",
     response_model=SettingsResponse,
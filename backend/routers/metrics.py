@@ -0,0 +1,108 @@
+import secrets
+from typing import Optional
+
+from core.admission import admission_controller
+from core.auth import password_hasher
+from core.metrics import CounterFamily, GaugeFamily, metrics_response, registry
+from core.serialization import ORJSONRoute
+from core.websocket import webSocket_connection_manager
+from db.database import engines, replica_engines, replica_router
+from fastapi import APIRouter, Header, HTTPException, status
+from settings import settings
+
+metrics_router = APIRouter(tags=["Metrics"], route_class=ORJSONRoute)
+
+
+@registry.collector
+def collect_db_pools():
+    size = GaugeFamily("db_pool_size", "Connections kept open by the pool.", ["pool"])
+    checked_out = GaugeFamily(
+        "db_pool_checked_out", "Connections currently in use.", ["pool"]
+    )
+    overflow = GaugeFamily(
+        "db_pool_overflow",
+        "Connections open beyond the pool size, negative while it fills up.",
+        ["pool"],
+    )
+    pools = {**engines, **{f"replica_{k}": v for k, v in replica_engines.items()}}
+    for name, engine in pools.items():
+        size.set(engine.pool.size(), pool=name)
+        checked_out.set(engine.pool.checkedout(), pool=name)
+        overflow.set(engine.pool.overflow(), pool=name)
+    return [size, checked_out, overflow]
+
+
+@registry.collector
+def collect_replica_lag():
+    lag = GaugeFamily(
+        "db_replica_lag_seconds", "Replay lag at the last check, -1 if unknown."
+    )
+    lag.set(-1 if replica_router.lag_seconds is None else replica_router.lag_seconds)
+    use_replica = GaugeFamily(
+        "db_replica_in_use", "1 while read-only sessions go to the replica."
+    )
+    use_replica.set(int(replica_router.use_replica))
+    return [lag, use_replica] if replica_router.engine is not None else []
+
+
+@registry.collector
+def collect_websockets():
+    connections = GaugeFamily(
+        "websocket_connections", "Open sockets on this worker.", ["role"]
+    )
+    gauges = webSocket_connection_manager.get_connection_gauges()
+    for role, count in gauges.items():
+        connections.set(count, role=role)
+    return [connections]
+
+
+@registry.collector
+def collect_admission():
+    admission = admission_controller.get_metrics()
+    in_flight = GaugeFamily("admission_in_flight", "Requests admitted and running.")
+    in_flight.set(admission["in_flight"])
+    queued = GaugeFamily("admission_queued", "Requests waiting for a slot.")
+    queued.set(admission["queued"])
+    lanes = CounterFamily(
+        "admission_requests_total",
+        "Requests per lane and outcome.",
+        ["lane", "outcome"],
+    )
+    for lane, stats in admission["lanes"].items():
+        for outcome in ("admitted", "queued", "rejected"):
+            lanes.set(stats[outcome], lane=lane, outcome=outcome)
+    return [in_flight, queued, lanes]
+
+
+@registry.collector
+def collect_password_hasher():
+    hasher = password_hasher.get_metrics()
+    jobs = GaugeFamily(
+        "password_hasher_jobs", "bcrypt jobs waiting or running.", ["state"]
+    )
+    jobs.set(hasher["waiting"], state="waiting")
+    jobs.set(hasher["running"], state="running")
+    operations = CounterFamily(
+        "password_hasher_operations_total", "bcrypt operations.", ["operation"]
+    )
+    for operation in ("hashes", "verifications", "rehashes"):
+        operations.set(hasher[operation], operation=operation)
+    seconds = CounterFamily(
+        "password_hasher_seconds_total", "Time spent waiting or hashing.", ["state"]
+    )
+    seconds.set(hasher["queue_wait_seconds_total"], state="waiting")
+    seconds.set(hasher["hash_seconds_total"], state="running")
+    return [jobs, operations, seconds]
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus scrape endpoint for this worker."""
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not secrets.compare_digest(authorization or "", expected):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid metrics token.",
+            )
+    return metrics_response()
@@ -1,18 +1,29 @@
 from datetime import datetime, timezone
 from typing import List
 
+from core.serialization import ORJSONRoute
 from db.database import get_db
 from fastapi import APIRouter, Depends, status
 from models.notification import Notification
-from schemas.notification import MarkAsReadRequest, NotificationOut, NotificationRequest
+from schemas.notification import (
+    BulkNotificationRequest,
+    MarkAsReadRequest,
+    NotificationOut,
+    NotificationRequest,
+)
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from utils.auth import get_user_id_via_session
-from utils.notification import get_scheduler_secret, send_notification
+from utils.notification import (
+    get_scheduler_secret,
+    send_bulk_notifications,
+    send_notification,
+)
 
 notifications_router = APIRouter(
     prefix="/notifications",
     tags=["Notifications"],
+    route_class=ORJSONRoute,
 )
 
 
@@ -61,3 +72,14 @@ async def push_notification(
     )
 
     return {"message": "Notification sent successfully"}
+
+
+@notifications_router.post("/notify/bulk", status_code=status.HTTP_200_OK)
+async def push_bulk_notifications(
+    bulk_data: BulkNotificationRequest,
+    db: AsyncSession = Depends(get_db),
+    _: bool = Depends(get_scheduler_secret),
+):
+    sent_count = await send_bulk_notifications(db, bulk_data.notifications)
+
+    return {"message": "Notifications sent successfully", "count": sent_count}
@@ -1,5 +1,6 @@
 from typing import Annotated
 
+from core.serialization import ORJSONRoute
 from crud.order import (
     create_order_crud,
     get_order_details_crud,
@@ -10,7 +11,7 @@ from crud.order import (
     update_order_status_crud,
 )
 from db.database import get_db
-from fastapi import APIRouter, Body, Depends, status
+from fastapi import APIRouter, Body, Depends, Header, status
 from models.order import (
     BorrowBookProblem,
 )
@@ -28,10 +29,12 @@ from schemas.order import (
 )
 from sqlalchemy.ext.asyncio import AsyncSession
 from utils.auth import get_staff_user, get_user_via_session
+from utils.idempotency import MAX_IDEMPOTENCY_KEY_LENGTH
 
 order_router = APIRouter(
     prefix="/order",
     tags=["Orders"],
+    route_class=ORJSONRoute,
 )
 
 
@@ -63,8 +66,13 @@ async def create_order(
     order_data: CreateOrderRequest,
     user: Annotated[User, Depends(get_user_via_session)],
     db: AsyncSession = Depends(get_db),
+    idempotency_key: Annotated[
+        str | None,
+        Header(alias="Idempotency-Key", max_length=MAX_IDEMPOTENCY_KEY_LENGTH),
+    ] = None,
 ):
-    return await create_order_crud(db, user, order_data)
+    # Retries with the same key get the first response instead of a new order
+    return await create_order_crud(db, user, order_data, idempotency_key)
 
 
 """ Client and Staff Router """
@@ -1,5 +1,6 @@
 from typing import Annotated
 
+from core.serialization import ORJSONRoute
 from crud.promo_code import (
     apply_promo_code,
     create_promo_code,
@@ -20,6 +21,7 @@ from utils.auth import get_user_id_via_session, manager_required
 promo_code_router = APIRouter(
     prefix="/promo-codes",
     tags=["Promo Codes"],
+    route_class=ORJSONRoute,
 )
 
 
@@ -1,5 +1,6 @@
 from typing import Annotated, List
 
+from core.serialization import ORJSONRoute
 from crud.return_orders import (
     create_return_order_crud,
     get_client_borrows_books_crud,
@@ -26,6 +27,7 @@ from utils.auth import get_staff_user, get_user_via_session
 return_order_router = APIRouter(
     prefix="/return-order",
     tags=["Return Order"],
+    route_class=ORJSONRoute,
 )
 
 
@@ -1,29 +1,30 @@
-from typing import Annotated, List
+from datetime import datetime
+from typing import Annotated, List, Optional
 
-import stripe
+from core.serialization import ORJSONRoute
 from crud.wallet import (
     create_checkout_session_crud,
     get_transactions_crud,
+    get_transactions_page_crud,
     payment_success_crud,
 )
 from db.database import get_db
 from fastapi import APIRouter, Depends, Query
 from models.user import User
-from schemas.wallet import CreateCheckoutRequest, TransactionSchema
-from settings import settings
+from schemas.wallet import (
+    CreateCheckoutRequest,
+    PaginatedTransactionsResponse,
+    TransactionSchema,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 from utils.auth import get_user_id_via_session, get_user_via_session
 
 wallet_router = APIRouter(
     prefix="/wallet",
     tags=["Wallet"],
+    route_class=ORJSONRoute,
 )
 
-if not settings.STRIPE_SECRET_KEY:
-    raise ValueError("STRIPE_SECRET_KEY environment variable not set.")
-
-stripe.api_key = settings.STRIPE_SECRET_KEY
-
 
 @wallet_router.post("/create-checkout-session")
 async def create_checkout_session(
@@ -46,3 +47,32 @@ async def get_transactions(
     user_id: int = Depends(get_user_id_via_session), db: AsyncSession = Depends(get_db)
 ):
     return await get_transactions_crud(user_id, db)
+
+
+@wallet_router.get("/transactions/history", response_model=PaginatedTransactionsResponse)
+async def get_transactions_history(
+    cursor: Optional[str] = Query(
+        None, description="Cursor returned as `next_cursor` by the previous page."
+    ),
+    limit: int = Query(20, ge=1, le=100, description="Number of items per page."),
+    from_date: Optional[datetime] = Query(
+        None, description="Only transactions created at or after this time."
+    ),
+    to_date: Optional[datetime] = Query(
+        None, description="Only transactions created before this time."
+    ),
+    with_balance: bool = Query(
+        False, description="Include the wallet balance after each transaction."
+    ),
+    user_id: int = Depends(get_user_id_via_session),
+    db: AsyncSession = Depends(get_db),
+):
+    return await get_transactions_page_crud(
+        user_id,
+        db,
+        limit=limit,
+        cursor=cursor,
+        from_date=from_date,
+        to_date=to_date,
+        with_balance=with_balance,
+    )
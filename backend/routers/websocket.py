@@ -1,4 +1,6 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from typing import Optional
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
 from core.websocket import webSocket_connection_manager
 from utils.auth import get_user_via_session
 from schemas.auth import LoginResponse
@@ -9,15 +11,24 @@ websocket_router = APIRouter(tags=["WebSocket"])
 
 @websocket_router.websocket("/ws")
 async def websocket_endpoint(
-    websocket: WebSocket, user: LoginResponse = Depends(get_user_via_session)
+    websocket: WebSocket,
+    since: Optional[int] = Query(None, ge=0),
+    user: LoginResponse = Depends(get_user_via_session),
 ):
-    await webSocket_connection_manager.connect(websocket, user.id, user.role)
+    connection = await webSocket_connection_manager.connect(
+        websocket, user.id, user.role
+    )
+    if since is not None:
+        # Staff resume the order-board delta stream from the last version they saw
+        webSocket_connection_manager.order_board.subscribe(connection, since)
     try:
         while True:
             # This loop keeps the connection alive and can be used to process incoming messages.
+            # Any frame, including the client's "pong", counts as a heartbeat.
             await websocket.receive_text()
+            connection.touch()
     except WebSocketDisconnect:
         # This is an expected exception when the client closes the connection.
         pass
     finally:
-        webSocket_connection_manager.disconnect(user.id, user.role)
+        webSocket_connection_manager.disconnect(connection)
@@ -1,91 +1,248 @@
 import asyncio
+import functools
+import time
 from datetime import datetime, timedelta, timezone
 import httpx
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler  # type: ignore
-from db.database import AsyncSessionLocal
-from models.book import BookDetails
-from models.notification import NotificationType
+from core.email_outbox import EmailOutboxWorker
+from core.metrics import registry, serve_metrics
+from db.database import BackgroundSessionLocal
+from models.book import Book, BookDetails
+from models.idempotency import IdempotencyKey
+from models.notification import Notification, NotificationType
 from models.order import BorrowBookProblem, BorrowOrderBook
+from models.pubsub_payload import PubSubPayload
 from pytz import utc  # type: ignore
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import (
+    Text,
+    and_,
+    case,
+    cast,
+    delete,
+    func,
+    literal_column,
+    or_,
+    select,
+)
+from sqlalchemy.dialects.postgresql import JSONB, aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
 from settings import settings
 
 SCHEDULER_SECRET = settings.SCHEDULER_SECRET
-BACKEND_URL = "http://backend:8000/api/notifications/notify"
+BACKEND_URL = "http://backend:8000/api/notifications/notify/bulk"
 
+# Notifications per bulk request and bulk requests in flight at once
+NOTIFICATION_BATCH_SIZE = 500
+MAX_CONCURRENT_REQUESTS = 4
 
-async def send_notification_via_api(user_id: int, type: NotificationType, data: dict):
-    if SCHEDULER_SECRET is None:
-        raise ValueError("SCHEDULER_SECRET must be set in environment variables.")
+# Rows fetched per round trip from the server-side cursor
+SCAN_CHUNK_SIZE = settings.SCHEDULER_SCAN_CHUNK_SIZE
 
-    payload = {"user_id": user_id, "type": type.value, "data": data}
-    headers = {"X-Scheduler-Secret": SCHEDULER_SECRET}
+# Each scheduler replica only scans the users of its own shard
+SCHEDULER_SHARD_INDEX = settings.SCHEDULER_SHARD_INDEX
+SCHEDULER_SHARD_COUNT = settings.SCHEDULER_SHARD_COUNT
+
+job_duration = registry.histogram(
+    "scheduler_job_duration_seconds",
+    "Time a job run took, by outcome.",
+    ("job", "outcome"),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+job_items = registry.counter(
+    "scheduler_job_items_total",
+    "Rows processed or notifications sent by successful job runs.",
+    ("job",),
+)
 
-    async with httpx.AsyncClient() as client:
+
+def instrument_job(job):
+    """
+    Records the duration and item count of every run of `job`. Jobs handle
+    their own errors; they return the number of items on success and None
+    when they failed.
+    """
+
+    @functools.wraps(job)
+    async def run():
+        started = time.perf_counter()
+        items = None
         try:
-            response = await client.post(BACKEND_URL, json=payload, headers=headers)
+            items = await job()
+            if items is not None:
+                job_items.inc(items, job=job.__name__)
+            return items
+        finally:
+            outcome = "error" if items is None else "success"
+            duration = time.perf_counter() - started
+            job_duration.observe(duration, job=job.__name__, outcome=outcome)
+
+    return run
+
+
+def build_notification_payload(
+    user_id: int, type: NotificationType, data: dict
+) -> dict:
+    return {"user_id": user_id, "type": type.value, "data": data}
+
+
+async def send_notification_batch(
+    client: httpx.AsyncClient, semaphore: asyncio.Semaphore, batch: list[dict]
+) -> int:
+    async with semaphore:
+        try:
+            response = await client.post(BACKEND_URL, json={"notifications": batch})
             response.raise_for_status()
-            print(f"Successfully sent notification for user {user_id} via API.")
+            print(f"Successfully sent {len(batch)} notifications via API.")
+            return len(batch)
         except httpx.HTTPStatusError as e:
             print(
-                f"Failed to send notification via API. Status: {e.response.status_code}, Detail: {e.response.text}"
+                f"Failed to send notifications via API. Status: {e.response.status_code}, Detail: {e.response.text}"
             )
         except Exception as e:
             print(f"An error occurred while calling the notification API: {e}")
+        return 0
+
+
+def create_notification_api_client() -> httpx.AsyncClient:
+    if SCHEDULER_SECRET is None:
+        raise ValueError("SCHEDULER_SECRET must be set in environment variables.")
+
+    headers = {"X-Scheduler-Secret": SCHEDULER_SECRET}
+    limits = httpx.Limits(
+        max_connections=MAX_CONCURRENT_REQUESTS,
+        max_keepalive_connections=MAX_CONCURRENT_REQUESTS,
+    )
+    return httpx.AsyncClient(headers=headers, limits=limits, timeout=30.0)
+
+
+async def send_notifications_via_api(
+    client: httpx.AsyncClient, notifications: list[dict]
+) -> int:
+    if not notifications:
+        return 0
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    # Batches go through the shared pooled client with bounded concurrency
+    sent_counts = await asyncio.gather(
+        *(
+            send_notification_batch(
+                client,
+                semaphore,
+                notifications[i : i + NOTIFICATION_BATCH_SIZE],
+            )
+            for i in range(0, len(notifications), NOTIFICATION_BATCH_SIZE)
+        )
+    )
+
+    return sum(sent_counts)
+
+
+def get_shard(shard_index: int, shard_count: int) -> tuple[int, int] | None:
+    """
+    (index, count) of this replica's shard, or None when it scans every user.
+    Users are assigned by `user_id % count`, which never changes as users are
+    added, so every user belongs to exactly one shard on every run.
+    """
+    if shard_count <= 1:
+        return None
+
+    if not 0 <= shard_index < shard_count:
+        raise ValueError("SCHEDULER_SHARD_INDEX must be in [0, SCHEDULER_SHARD_COUNT)")
+
+    return shard_index, shard_count
+
+
+def get_tomorrow_window(now_utc: datetime) -> tuple[datetime, datetime]:
+    tomorrow_start = datetime.combine(
+        now_utc.date() + timedelta(days=1),
+        datetime.min.time(),
+        tzinfo=timezone.utc,
+    )
+    return tomorrow_start, tomorrow_start + timedelta(days=1)
+
+
+def get_borrowed_books_scan_query(*conditions, shard=None):
+    """Project only what a reminder needs: (user_id, title, due date)."""
+    stmt = (
+        select(
+            BorrowOrderBook.user_id,
+            Book.title,
+            BorrowOrderBook.expected_return_date,
+        )
+        .join(BookDetails, BorrowOrderBook.book_details_id == BookDetails.id)
+        .join(Book, BookDetails.book_id == Book.id)
+        .where(
+            BorrowOrderBook.return_order_id.is_(None),
+            BorrowOrderBook.actual_return_date.is_(None),
+            # Inlined (not bound) so the planner can match the partial index
+            BorrowOrderBook.borrow_book_problem
+            == literal_column(f"'{BorrowBookProblem.NORMAL.value}'"),
+            *conditions,
+        )
+    )
+
+    if shard is not None:
+        shard_index, shard_count = shard
+        stmt = stmt.where(BorrowOrderBook.user_id % shard_count == shard_index)
+
+    return stmt
+
+
+async def stream_reminders(db: AsyncSession, stmt, reminder_status: str) -> int:
+    """
+    Stream the scan through a server-side cursor and send each chunk as soon as
+    it is read, so memory stays bounded by SCAN_CHUNK_SIZE.
+    """
+    found_count = 0
+
+    async with create_notification_api_client() as client:
+        result = await db.stream(stmt.execution_options(yield_per=SCAN_CHUNK_SIZE))
+        async for rows in result.partitions():
+            notifications = [
+                build_notification_payload(
+                    user_id=row.user_id,
+                    type=NotificationType.RETURN_REMINDER,
+                    data={
+                        "status": reminder_status,
+                        "book_title": row.title,
+                        "due_date": (
+                            row.expected_return_date.isoformat()
+                            if row.expected_return_date
+                            else None
+                        ),
+                    },
+                )
+                for row in rows
+            ]
+            found_count += len(notifications)
+            await send_notifications_via_api(client, notifications)
+
+    return found_count
 
 
 async def check_for_due_books():
     print("Checking for books due for return tomorrow...")
-    async with AsyncSessionLocal() as db:
+    async with BackgroundSessionLocal() as db:
         try:
-            now_utc = datetime.now(timezone.utc)
-            tomorrow_start = datetime.combine(
-                now_utc.date() + timedelta(days=1),
-                datetime.min.time(),
-                tzinfo=timezone.utc,
+            tomorrow_start, tomorrow_end = get_tomorrow_window(
+                datetime.now(timezone.utc)
             )
-            tomorrow_end = tomorrow_start + timedelta(days=1)
 
-            stmt = (
-                select(BorrowOrderBook)
-                .where(
-                    BorrowOrderBook.return_order_id.is_(None),
-                    BorrowOrderBook.actual_return_date.is_(None),
-                    BorrowOrderBook.expected_return_date >= tomorrow_start,
-                    BorrowOrderBook.expected_return_date < tomorrow_end,
-                    BorrowOrderBook.borrow_book_problem == BorrowBookProblem.NORMAL,
-                )
-                .options(
-                    selectinload(BorrowOrderBook.book_details).selectinload(
-                        BookDetails.book
-                    )
-                )
+            shard = get_shard(SCHEDULER_SHARD_INDEX, SCHEDULER_SHARD_COUNT)
+            stmt = get_borrowed_books_scan_query(
+                BorrowOrderBook.expected_return_date >= tomorrow_start,
+                BorrowOrderBook.expected_return_date < tomorrow_end,
+                shard=shard,
             )
-            result = await db.execute(stmt)
-            books_to_notify = result.scalars().all()
-            if books_to_notify:
-                print(f"Found {len(books_to_notify)} books due for return tomorrow.")
-                for book in books_to_notify:
-                    book_title = book.book_details.book.title
-                    due_date_str = (
-                        book.expected_return_date.isoformat()
-                        if book.expected_return_date
-                        else None
-                    )
-                    notification_data = {
-                        "status": "tomorrow",
-                        "book_title": book_title,
-                        "due_date": due_date_str,
-                    }
-                    await send_notification_via_api(
-                        user_id=book.user_id,
-                        type=NotificationType.RETURN_REMINDER,
-                        data=notification_data,
-                    )
+
+            found_count = await stream_reminders(db, stmt, "tomorrow")
+            if found_count:
+                print(f"Found {found_count} books due for return tomorrow.")
             else:
                 print("No books due for return tomorrow.")
+            return found_count
         except Exception as e:
             print(f"An error occurred in the 'due books' cron job: {e}")
             await db.rollback()
@@ -95,46 +252,22 @@ async def check_for_due_books():
 
 async def check_for_delayed_returns():
     print("Checking for delayed book returns...")
-    async with AsyncSessionLocal() as db:
+    async with BackgroundSessionLocal() as db:
         try:
             now = datetime.now(timezone.utc)
-            stmt = (
-                select(BorrowOrderBook)
-                .where(
-                    BorrowOrderBook.return_order_id.is_(None),
-                    BorrowOrderBook.actual_return_date.is_(None),
-                    BorrowOrderBook.expected_return_date < now,
-                    BorrowOrderBook.borrow_book_problem == BorrowBookProblem.NORMAL,
-                )
-                .options(
-                    selectinload(BorrowOrderBook.book_details).selectinload(
-                        BookDetails.book
-                    )
-                )
+
+            shard = get_shard(SCHEDULER_SHARD_INDEX, SCHEDULER_SHARD_COUNT)
+            stmt = get_borrowed_books_scan_query(
+                BorrowOrderBook.expected_return_date < now,
+                shard=shard,
             )
-            result = await db.execute(stmt)
-            delayed_books = result.scalars().all()
-            if delayed_books:
-                print(f"Found {len(delayed_books)} delayed book returns.")
-                for book in delayed_books:
-                    book_title = book.book_details.book.title
-                    due_date_str = (
-                        book.expected_return_date.isoformat()
-                        if book.expected_return_date
-                        else None
-                    )
-                    notification_data = {
-                        "status": "overdue",
-                        "book_title": book_title,
-                        "due_date": due_date_str,
-                    }
-                    await send_notification_via_api(
-                        user_id=book.user_id,
-                        type=NotificationType.RETURN_REMINDER,
-                        data=notification_data,
-                    )
+
+            found_count = await stream_reminders(db, stmt, "overdue")
+            if found_count:
+                print(f"Found {found_count} delayed book returns.")
             else:
                 print("No delayed book returns found.")
+            return found_count
         except Exception as e:
             print(f"An error occurred in the 'delayed returns' cron job: {e}")
             await db.rollback()
@@ -142,34 +275,233 @@ async def check_for_delayed_returns():
             await db.close()
 
 
+def get_return_reminder_digests_query(
+    now: datetime, shard: tuple[int, int] | None = None
+):
+    """
+    One row per user with all of their due-tomorrow and overdue books,
+    aggregated in SQL. Users whose latest reminder carries the same digest
+    hash are filtered out, so unchanged digests are not sent again.
+    """
+    tomorrow_start, tomorrow_end = get_tomorrow_window(now)
+
+    reminder_status = case(
+        (BorrowOrderBook.expected_return_date < now, "overdue"),
+        else_="tomorrow",
+    )
+    items = (
+        get_borrowed_books_scan_query(
+            or_(
+                BorrowOrderBook.expected_return_date < now,
+                and_(
+                    BorrowOrderBook.expected_return_date >= tomorrow_start,
+                    BorrowOrderBook.expected_return_date < tomorrow_end,
+                ),
+            ),
+            shard=shard,
+        )
+        .add_columns(reminder_status.label("status"))
+        .subquery("reminder_items")
+    )
+
+    items_json = func.jsonb_agg(
+        aggregate_order_by(
+            func.jsonb_build_object(
+                "book_title",
+                items.c.title,
+                "due_date",
+                items.c.expected_return_date,
+                "status",
+                items.c.status,
+            ),
+            items.c.expected_return_date,
+            items.c.title,
+        ),
+        type_=JSONB,
+    )
+
+    digests = (
+        select(
+            items.c.user_id,
+            func.count().label("items_count"),
+            func.min(items.c.expected_return_date).label("earliest_due_date"),
+            func.bool_or(items.c.status == "overdue").label("has_overdue"),
+            items_json.label("items"),
+            func.md5(cast(items_json, Text)).label("digest_hash"),
+        )
+        .group_by(items.c.user_id)
+        .cte("reminder_digests")
+    )
+
+    last_digest_hash = (
+        select(Notification.data["digest_hash"].astext)
+        .where(
+            Notification.user_id == digests.c.user_id,
+            Notification.type == NotificationType.RETURN_REMINDER,
+        )
+        .order_by(Notification.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+    return select(digests).where(
+        last_digest_hash.is_distinct_from(digests.c.digest_hash)
+    )
+
+
+def build_digest_notification_data(digest) -> dict:
+    # Keep the single-reminder fields so existing clients can still render it
+    return {
+        "status": "overdue" if digest.has_overdue else "tomorrow",
+        "book_title": (
+            digest.items[0]["book_title"]
+            if digest.items_count == 1
+            else f"{digest.items_count} books"
+        ),
+        "due_date": digest.earliest_due_date.isoformat(),
+        "items": digest.items,
+        "digest_hash": digest.digest_hash,
+    }
+
+
+async def check_for_return_reminders_digest():
+    print("Checking for due and overdue books (digest)...")
+    async with BackgroundSessionLocal() as db:
+        try:
+            now = datetime.now(timezone.utc)
+
+            shard = get_shard(SCHEDULER_SHARD_INDEX, SCHEDULER_SHARD_COUNT)
+            stmt = get_return_reminder_digests_query(now, shard)
+
+            sent_count = 0
+            async with create_notification_api_client() as client:
+                result = await db.stream(
+                    stmt.execution_options(yield_per=SCAN_CHUNK_SIZE)
+                )
+                async for digests in result.partitions():
+                    notifications = [
+                        build_notification_payload(
+                            user_id=digest.user_id,
+                            type=NotificationType.RETURN_REMINDER,
+                            data=build_digest_notification_data(digest),
+                        )
+                        for digest in digests
+                    ]
+                    sent_count += await send_notifications_via_api(
+                        client, notifications
+                    )
+
+            if sent_count:
+                print(f"Sent {sent_count} return reminder digests.")
+            else:
+                print("No new return reminder digests to send.")
+            return sent_count
+        except Exception as e:
+            print(f"An error occurred in the 'reminder digest' cron job: {e}")
+            await db.rollback()
+        finally:
+            await db.close()
+
+
+async def purge_expired_idempotency_keys():
+    print("Purging expired idempotency keys...")
+    async with BackgroundSessionLocal() as db:
+        try:
+            result = await db.execute(
+                delete(IdempotencyKey).where(
+                    IdempotencyKey.expires_at < datetime.now(timezone.utc)
+                )
+            )
+            await db.commit()
+            print(f"Purged {result.rowcount} expired idempotency keys.")
+            return result.rowcount
+        except Exception as e:
+            print(f"An error occurred in the 'idempotency purge' cron job: {e}")
+            await db.rollback()
+        finally:
+            await db.close()
+
+
+async def purge_pubsub_payloads():
+    print("Purging stored pub/sub payloads...")
+    async with BackgroundSessionLocal() as db:
+        try:
+            expired_before = datetime.now(timezone.utc) - timedelta(
+                minutes=settings.PUBSUB_PAYLOAD_TTL_MINUTES
+            )
+            result = await db.execute(
+                delete(PubSubPayload).where(PubSubPayload.created_at < expired_before)
+            )
+            await db.commit()
+            print(f"Purged {result.rowcount} pub/sub payloads.")
+            return result.rowcount
+        except Exception as e:
+            print(f"An error occurred in the 'pub/sub payload purge' cron job: {e}")
+            await db.rollback()
+        finally:
+            await db.close()
+
+
 async def main():
     scheduler = AsyncIOScheduler(timezone=utc)
 
-    scheduler.add_job(
-        check_for_due_books,
-        "cron",
-        hour=11,  # 11AM(utc) => 2PM(EEST)
-        minute=0,
-        # minute="*/1",
-    )
+    if settings.SCHEDULER_REMINDER_DIGEST:
+        # One notification per user per run instead of one per book
+        scheduler.add_job(
+            instrument_job(check_for_return_reminders_digest),
+            "cron",
+            hour=11,  # 11AM(utc) => 2PM(EEST)
+            minute=0,
+        )
+    else:
+        scheduler.add_job(
+            instrument_job(check_for_due_books),
+            "cron",
+            hour=11,  # 11AM(utc) => 2PM(EEST)
+            minute=0,
+            # minute="*/1",
+        )
+
+        scheduler.add_job(
+            instrument_job(check_for_delayed_returns),
+            "cron",
+            hour=11,  # 11AM(utc) => 2PM(EEST)
+            minute=0,
+            # minute="*/1",
+        )
 
+    # Expired keys are also taken over on reuse, this only keeps the table small
     scheduler.add_job(
-        check_for_delayed_returns,
-        "cron",
-        hour=11,  # 11AM(utc) => 2PM(EEST)
-        minute=0,
-        # minute="*/1",
+        instrument_job(purge_expired_idempotency_keys), "cron", hour="*/6", minute=30
     )
 
+    # Listeners fetch stored payloads within moments of the NOTIFY
+    scheduler.add_job(instrument_job(purge_pubsub_payloads), "cron", minute="*/15")
+
     scheduler.start()
     print("Scheduler started. Press Ctrl+C to exit.")
 
+    metrics_server = None
+    if settings.SCHEDULER_METRICS_PORT:
+        metrics_server = await serve_metrics(settings.SCHEDULER_METRICS_PORT)
+        print(f"Serving metrics on port {settings.SCHEDULER_METRICS_PORT}")
+
+    # Transactional emails queued by the API
+    email_worker = None
+    if settings.EMAIL_OUTBOX_WORKER_ENABLED:
+        email_worker = asyncio.create_task(EmailOutboxWorker().run_forever())
+
     # This is the correct way to keep the async loop running indefinitely.
     # It creates a future that never completes, preventing the script from exiting.
     try:
         await asyncio.Future()
     except asyncio.CancelledError:
         pass
+    finally:
+        if email_worker is not None:
+            email_worker.cancel()
+        if metrics_server is not None:
+            metrics_server.close()
 
 
 if __name__ == "__main__":
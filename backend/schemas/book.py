@@ -26,6 +26,10 @@ class AuthorCategorySchema(CreateAuthorCategoryRequest, IdSchema):
     model_config = ConfigDict(from_attributes=True)
 
 
+class AuthorCategoryCountSchema(AuthorCategorySchema):
+    books_count: int
+
+
 class BookDetailsSchema(BaseModel):
     status: BookStatus
     available_stock: int
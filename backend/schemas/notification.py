@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import List, Optional
 
 from models.notification import NotificationType
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class NotificationOut(BaseModel):
@@ -23,3 +23,7 @@ class NotificationRequest(BaseModel):
     user_id: int
     type: NotificationType
     data: dict
+
+
+class BulkNotificationRequest(BaseModel):
+    notifications: List[NotificationRequest] = Field(min_length=1, max_length=1000)
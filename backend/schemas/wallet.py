@@ -1,5 +1,6 @@
 from datetime import datetime
 from decimal import Decimal
+from typing import Optional
 
 from models.transaction import TransactionType
 from pydantic import BaseModel, ConfigDict
@@ -18,3 +19,14 @@ class TransactionSchema(BaseModel):
     user_id: int
 
     model_config = ConfigDict(from_attributes=True, use_enum_values=True)
+
+
+class TransactionHistoryItem(TransactionSchema):
+    # Wallet balance right after this transaction, only set when requested
+    balance_after: Optional[Decimal] = None
+
+
+class PaginatedTransactionsResponse(BaseModel):
+    items: list[TransactionHistoryItem]
+    next_cursor: Optional[str] = None
+    limit: int
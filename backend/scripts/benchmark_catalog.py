@@ -0,0 +1,119 @@
+"""
+Compares the catalog read paths against the configured database:
+the previous ORM path (hydrating BookDetails, Book, Author and Category
+through selectinload) and the column-projected path now used by
+get_borrow_books_crud / get_purchase_books_crud.
+
+Usage: python scripts/benchmark_catalog.py [iterations] [page_size]
+"""
+
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from crud.book import get_purchase_books_crud
+from db.database import AsyncSessionLocal, async_engine
+from models.book import Book, BookDetails, BookStatus
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import selectinload
+
+
+async def orm_purchase_page(db, page: int, limit: int):
+    """The ORM path as it was before the projection, kept here for comparison."""
+    base_query = (
+        select(BookDetails)
+        .where(BookDetails.status == BookStatus.PURCHASE)
+        .join(BookDetails.book)
+        .join(Book.author)
+        .join(Book.category)
+    )
+    count_query = select(func.count()).select_from(base_query.subquery())
+    total_count = (await db.execute(count_query)).scalar()
+
+    query = (
+        base_query.options(
+            selectinload(BookDetails.book).selectinload(Book.author),
+            selectinload(BookDetails.book).selectinload(Book.category),
+        )
+        .limit(limit)
+        .offset((page - 1) * limit)
+    )
+    books_for_purchase = await db.execute(query)
+
+    items = []
+    for book_details in books_for_purchase.scalars():
+        items.append(
+            {
+                "book_details_id": book_details.id,
+                "title": book_details.book.title,
+                "description": book_details.book.description,
+                "cover_img": book_details.book.cover_img,
+                "publish_year": book_details.book.publish_year,
+                "category": {
+                    "id": book_details.book.category.id,
+                    "name": book_details.book.category.name,
+                },
+                "author": {
+                    "id": book_details.book.author.id,
+                    "name": book_details.book.author.name,
+                },
+                "available_stock": book_details.available_stock,
+                "book_id": book_details.book.id,
+                "price": book_details.book.price,
+                "rating": str(book_details.book.rating),
+            }
+        )
+    return {"items": items, "total": total_count}
+
+
+async def projected_purchase_page(db, page: int, limit: int):
+    return await get_purchase_books_crud(db, page=page, limit=limit)
+
+
+async def measure(name: str, fetch_page, iterations: int, limit: int):
+    round_trips = 0
+
+    def count_round_trip(*args):
+        nonlocal round_trips
+        round_trips += 1
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_round_trip)
+    tracemalloc.start()
+    started = time.perf_counter()
+
+    for _ in range(iterations):
+        # A fresh session per page, like a request
+        async with AsyncSessionLocal() as db:
+            await fetch_page(db, 1, limit)
+
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    event.remove(async_engine.sync_engine, "before_cursor_execute", count_round_trip)
+
+    print(
+        f"{name:<10} {elapsed / iterations * 1000:8.2f} ms/page  "
+        f"{round_trips / iterations:4.1f} queries/page  "
+        f"{peak / 1024:8.1f} KiB peak"
+    )
+
+
+async def main(iterations: int, limit: int):
+    # SQL echo would dominate the timings
+    async_engine.echo = False
+
+    # Warm up connections and compiled statement caches
+    await measure("warmup", projected_purchase_page, 3, limit)
+    await measure("orm", orm_purchase_page, iterations, limit)
+    await measure("projected", projected_purchase_page, iterations, limit)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    asyncio.run(main(iterations, limit))
@@ -0,0 +1,70 @@
+"""
+Measures how long `import main` takes in a fresh interpreter, which is what a
+cold start or a recycled worker pays before serving its first request, using
+`python -X importtime`. Prints the median total and the slowest top-level
+packages, and checks that the recommendation stack (LangChain, OpenAI,
+PGVector) is not among them.
+
+Usage: python scripts/benchmark_importtime.py [runs] [top] [module]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Imported only when recommendations are first used
+DEFERRED_PACKAGES = ("langchain", "langchain_core", "langchain_openai", "openai")
+
+
+def import_times(module: str) -> dict:
+    """Cumulative import time in microseconds per module, for one run."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1])
+        sys.exit(1)
+
+    times = {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = times.get(name.strip(), 0) + int(cumulative)
+    return times
+
+
+def main(runs: int, top: int, module: str):
+    all_runs = [import_times(module) for _ in range(runs)]
+    totals = [run[module] for run in all_runs]
+
+    print(f"import {module}: median {statistics.median(totals) / 1000:.1f} ms")
+    print(f"  min {min(totals) / 1000:.1f} ms, max {max(totals) / 1000:.1f} ms")
+
+    # Top-level packages only, nested modules are included in their parent
+    last_run = all_runs[-1]
+    packages = {name: us for name, us in last_run.items() if "." not in name}
+    print("\nslowest top-level imports (last run):")
+    for name, us in sorted(packages.items(), key=lambda x: -x[1])[:top]:
+        print(f"  {us / 1000:9.1f} ms  {name}")
+
+    deferred = sorted(
+        name for name in last_run if name.split(".")[0] in DEFERRED_PACKAGES
+    )
+    if deferred:
+        print(f"\nimported eagerly but should be deferred: {', '.join(deferred[:10])}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    module = sys.argv[3] if len(sys.argv) > 3 else "main"
+    main(runs, top, module)
@@ -0,0 +1,82 @@
+"""
+Shows what a slow payment provider does to unrelated requests: a ticker task
+stands in for the rest of the app while checkout sessions are created against
+the fake gateway, first with the blocking SDK-style call made inline (as the
+wallet endpoints used to) and then through the gateway's thread pool.
+
+Usage: python scripts/benchmark_payments.py [checkouts] [latency_ms]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.payments import FakePaymentGateway
+from settings import settings
+
+TICK_SECONDS = 0.01
+
+CHECKOUT = {
+    "amount": 10_000,
+    "name": "Wallet Top-up",
+    "description": "Add EGP 100.00 to your e-wallet",
+    "success_url": "http://localhost/success?session_id={CHECKOUT_SESSION_ID}",
+    "cancel_url": "http://localhost/cancel",
+    "metadata": {"user_id": "1"},
+}
+
+
+async def ticker(stop: asyncio.Event, lags: list):
+    """Records how late each 10ms tick fires, i.e. the event loop lag."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(time.perf_counter() - started - TICK_SECONDS)
+
+
+async def blocking_checkout(gateway: FakePaymentGateway):
+    return gateway._create_checkout_session(*CHECKOUT.values())
+
+
+async def offloaded_checkout(gateway: FakePaymentGateway):
+    return await gateway.create_checkout_session(**CHECKOUT)
+
+
+async def measure(name: str, checkout, gateway, checkouts: int):
+    stop = asyncio.Event()
+    lags: list = []
+    ticks = asyncio.create_task(ticker(stop, lags))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(checkout(gateway) for _ in range(checkouts)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticks
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99)] if lags else 0
+
+    print(
+        f"{name:<10} {elapsed * 1000:8.1f} ms total  "
+        f"loop lag p99 {p99 * 1000:7.1f} ms  max {max(lags, default=0) * 1000:7.1f} ms"
+    )
+
+
+async def main(checkouts: int, latency: float):
+    gateway = FakePaymentGateway(
+        max_workers=settings.PAYMENT_GATEWAY_MAX_WORKERS,
+        deadline_seconds=settings.PAYMENT_GATEWAY_DEADLINE_SECONDS,
+        latency=latency,
+    )
+    await measure("blocking", blocking_checkout, gateway, checkouts)
+    await measure("offloaded", offloaded_checkout, gateway, checkouts)
+    gateway.close()
+
+
+if __name__ == "__main__":
+    checkouts = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    latency_ms = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(main(checkouts, latency_ms / 1000))
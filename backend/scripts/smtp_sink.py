@@ -0,0 +1,61 @@
+"""
+Minimal local SMTP server that accepts every message and prints its headers,
+a stand-in mail server for running the email outbox worker without sending
+real emails. Point the backend at it with MAIL_SERVER=localhost,
+MAIL_PORT=1025, MAIL_STARTTLS=False and USE_CREDENTIALS=False.
+
+Usage: python scripts/smtp_sink.py [port]
+"""
+
+import asyncio
+import sys
+from email import message_from_bytes
+
+
+async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    async def reply(line: str):
+        writer.write(f"{line}\r\n".encode())
+        await writer.drain()
+
+    await reply("220 smtp-sink ready")
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        command = line.decode(errors="replace").strip().upper()
+
+        if command.startswith(("EHLO", "HELO")):
+            await reply("250 smtp-sink")
+        elif command.startswith(("MAIL FROM", "RCPT TO", "RSET", "NOOP")):
+            await reply("250 OK")
+        elif command == "DATA":
+            await reply("354 End data with <CR><LF>.<CR><LF>")
+            data = bytearray()
+            while (chunk := await reader.readline()) not in (b".\r\n", b""):
+                # Undo dot-stuffing
+                data += chunk[1:] if chunk.startswith(b"..") else chunk
+            message = message_from_bytes(bytes(data))
+            print(f"To: {message['To']} | Subject: {message['Subject']}")
+            await reply("250 OK queued")
+        elif command == "QUIT":
+            await reply("221 Bye")
+            break
+        else:
+            await reply("502 Command not implemented")
+
+    writer.close()
+
+
+async def main(port: int):
+    server = await asyncio.start_server(handle_client, "0.0.0.0", port)
+    print(f"SMTP sink listening on port {port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 1025
+    try:
+        asyncio.run(main(port))
+    except KeyboardInterrupt:
+        pass
@@ -14,6 +14,10 @@ class Settings(BaseSettings):
 
     # OpenAI settings for RAG system
     OPENAI_API_KEY: str | None = os.getenv("OPENAI_API_KEY")
+    # Load LangChain in the background at startup instead of on first use
+    RAG_WARMUP_ON_STARTUP: bool = (
+        os.getenv("RAG_WARMUP_ON_STARTUP", "True").lower() == "true"
+    )
 
     # Session settings
     SESSION_EXPIRE_MINUTES: int = 60 * 24 * 30 * 6  # 6 months
@@ -40,6 +44,41 @@ class Settings(BaseSettings):
     MAIL_SSL_TLS: bool = os.getenv("MAIL_SSL_TLS", "False").lower() == "true"
     USE_CREDENTIALS: bool = os.getenv("USE_CREDENTIALS", "True").lower() == "true"
 
+    # Email outbox worker
+    EMAIL_OUTBOX_WORKER_ENABLED: bool = (
+        os.getenv("EMAIL_OUTBOX_WORKER_ENABLED", "True").lower() == "true"
+    )
+    EMAIL_OUTBOX_BATCH_SIZE: int = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", 50))
+    EMAIL_OUTBOX_POLL_SECONDS: int = int(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", 2))
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", 8))
+    EMAIL_OUTBOX_RETRY_BASE_SECONDS: int = int(
+        os.getenv("EMAIL_OUTBOX_RETRY_BASE_SECONDS", 30)
+    )
+    EMAIL_OUTBOX_RETRY_MAX_SECONDS: int = int(
+        os.getenv("EMAIL_OUTBOX_RETRY_MAX_SECONDS", 3600)
+    )
+    EMAIL_SMTP_TIMEOUT_SECONDS: int = int(os.getenv("EMAIL_SMTP_TIMEOUT_SECONDS", 30))
+    EMAIL_SMTP_IDLE_SECONDS: int = int(os.getenv("EMAIL_SMTP_IDLE_SECONDS", 60))
+
+    # Admission control, sized to the oltp pool (10 + 20 connections)
+    ADMISSION_CONTROL_ENABLED: bool = (
+        os.getenv("ADMISSION_CONTROL_ENABLED", "True").lower() == "true"
+    )
+    ADMISSION_MAX_CONCURRENCY: int = int(os.getenv("ADMISSION_MAX_CONCURRENCY", 30))
+    ADMISSION_DEFAULT_LANE_SHARE: float = float(
+        os.getenv("ADMISSION_DEFAULT_LANE_SHARE", 0.8)
+    )
+    ADMISSION_LOW_LANE_SHARE: float = float(os.getenv("ADMISSION_LOW_LANE_SHARE", 0.5))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", 100))
+    ADMISSION_QUEUE_TIMEOUT_MS: int = int(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", 500))
+    ADMISSION_RETRY_AFTER_SECONDS: int = int(
+        os.getenv("ADMISSION_RETRY_AFTER_SECONDS", 2)
+    )
+
+    # Password hashing
+    PASSWORD_BCRYPT_ROUNDS: int = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", 12))
+    PASSWORD_HASH_CONCURRENCY: int = int(os.getenv("PASSWORD_HASH_CONCURRENCY", 2))
+
     # Cloudinary Configuration
     CLOUDINARY_CLOUD_NAME: str | None = os.getenv("CLOUDINARY_CLOUD_NAME")
     CLOUDINARY_API_KEY: str | None = os.getenv("CLOUDINARY_API_KEY")
@@ -47,9 +86,86 @@ class Settings(BaseSettings):
 
     # Stripe Configuration
     STRIPE_SECRET_KEY: str | None = os.getenv("STRIPE_SECRET_KEY")
+    STRIPE_TIMEOUT_SECONDS: int = int(os.getenv("STRIPE_TIMEOUT_SECONDS", 10))
+    STRIPE_MAX_NETWORK_RETRIES: int = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", 2))
+
+    # Payment gateway, "stripe" or "fake" for local runs without Stripe
+    PAYMENT_GATEWAY: str = os.getenv("PAYMENT_GATEWAY", "stripe")
+    PAYMENT_GATEWAY_MAX_WORKERS: int = int(
+        os.getenv("PAYMENT_GATEWAY_MAX_WORKERS", 8)
+    )
+    PAYMENT_GATEWAY_DEADLINE_SECONDS: int = int(
+        os.getenv("PAYMENT_GATEWAY_DEADLINE_SECONDS", 35)
+    )
 
     # Scheduler Cron Job
     SCHEDULER_SECRET: str | None = os.getenv("SCHEDULER_SECRET")
-    
+    SCHEDULER_SCAN_CHUNK_SIZE: int = int(os.getenv("SCHEDULER_SCAN_CHUNK_SIZE", 1000))
+    SCHEDULER_SHARD_INDEX: int = int(os.getenv("SCHEDULER_SHARD_INDEX", 0))
+    SCHEDULER_SHARD_COUNT: int = int(os.getenv("SCHEDULER_SHARD_COUNT", 1))
+    SCHEDULER_REMINDER_DIGEST: bool = (
+        os.getenv("SCHEDULER_REMINDER_DIGEST", "False").lower() == "true"
+    )
+
+    # WebSocket pub/sub across workers (Postgres LISTEN/NOTIFY)
+    WEBSOCKET_PUBSUB_ENABLED: bool = (
+        os.getenv("WEBSOCKET_PUBSUB_ENABLED", "True").lower() == "true"
+    )
+    WEBSOCKET_PUBSUB_CHANNEL: str = os.getenv(
+        "WEBSOCKET_PUBSUB_CHANNEL", "websocket_events"
+    )
+    # Oversized pub/sub events are stored, and only kept this long
+    PUBSUB_PAYLOAD_TTL_MINUTES: int = int(os.getenv("PUBSUB_PAYLOAD_TTL_MINUTES", 60))
+
+    # Conditional responses (ETag) for the catalog and reference data
+    CATALOG_VERSIONS_CHANNEL: str = os.getenv(
+        "CATALOG_VERSIONS_CHANNEL", "catalog_versions"
+    )
+    # Stock and bestsellers change with orders, which don't bump the stamp
+    CATALOG_STOCK_ETAG_SECONDS: int = int(os.getenv("CATALOG_STOCK_ETAG_SECONDS", 30))
+    BESTSELLERS_ETAG_SECONDS: int = int(os.getenv("BESTSELLERS_ETAG_SECONDS", 300))
+    # Sessions seen valid are trusted this long when answering a 304, per worker
+    SESSION_CACHE_SECONDS: int = int(os.getenv("SESSION_CACHE_SECONDS", 60))
+    SESSION_CACHE_MAX_ENTRIES: int = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", 10000))
+
+    # Prometheus /metrics, per worker; requires "Bearer <token>" when set
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+    # The scheduler serves its job metrics on its own port, 0 to disable
+    SCHEDULER_METRICS_PORT: int = int(os.getenv("SCHEDULER_METRICS_PORT", 9101))
+
+    # Per-request statement tracking and N+1 detection
+    QUERY_TRACKING_ENABLED: bool = (
+        os.getenv("QUERY_TRACKING_ENABLED", "True").lower() == "true"
+    )
+    # The same statement shape this many times in one request is flagged
+    QUERY_REPEAT_THRESHOLD: int = int(os.getenv("QUERY_REPEAT_THRESHOLD", 5))
+    # Statements per request before it's reported, 0 for no limit
+    QUERY_BUDGET_PER_REQUEST: int = int(os.getenv("QUERY_BUDGET_PER_REQUEST", 0))
+    # X-DB-* response headers; for development only, they reveal SQL
+    QUERY_DEBUG_HEADERS: bool = (
+        os.getenv("QUERY_DEBUG_HEADERS", "False").lower() == "true"
+    )
+    # Fail the offending statement instead of only reporting it, for tests
+    QUERY_STRICT_MODE: bool = os.getenv("QUERY_STRICT_MODE", "False").lower() == "true"
+
+    # WebSocket heartbeat
+    WEBSOCKET_PING_INTERVAL_SECONDS: int = int(
+        os.getenv("WEBSOCKET_PING_INTERVAL_SECONDS", 25)
+    )
+    WEBSOCKET_IDLE_TIMEOUT_SECONDS: int = int(
+        os.getenv("WEBSOCKET_IDLE_TIMEOUT_SECONDS", 60)
+    )
+
+    # Order-board delta stream
+    ORDER_BOARD_BUFFER_SIZE: int = int(os.getenv("ORDER_BOARD_BUFFER_SIZE", 1000))
+    ORDER_BOARD_COALESCE_MS: int = int(os.getenv("ORDER_BOARD_COALESCE_MS", 50))
+
+    # Idempotency keys
+    IDEMPOTENCY_KEY_TTL_HOURS: int = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", 24))
+    IDEMPOTENCY_LOCK_TIMEOUT_SECONDS: int = int(
+        os.getenv("IDEMPOTENCY_LOCK_TIMEOUT_SECONDS", 10)
+    )
+
 
 settings = Settings()
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from core.http_cache import CATALOG, catalog_versions, if_none_match
+from db.database import get_db
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from utils.auth import SessionCache, session_cache
+
+ETAG = 'W/"catalog-1"'
+
+
+class FakeDB:
+    """Answers the session lookup with `session`, counting the queries."""
+
+    def __init__(self, session):
+        self.session = session
+        self.queries = 0
+
+    async def execute(self, stmt):
+        self.queries += 1
+        return SimpleNamespace(
+            scalars=lambda: SimpleNamespace(first=lambda: self.session)
+        )
+
+
+@pytest.fixture
+def db():
+    expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+    return FakeDB(SimpleNamespace(user_id=7, expires_at=expires_at))
+
+
+@pytest.fixture
+def client(monkeypatch, db):
+    monkeypatch.setattr(catalog_versions, "get_etag", lambda *a, **kw: ETAG)
+    monkeypatch.setattr(session_cache, "entries", {})
+
+    app = FastAPI()
+
+    @app.get("/authors")
+    async def authors(_etag=Depends(if_none_match(CATALOG))):
+        return []
+
+    async def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    client = TestClient(app)
+    client.cookies.set("session_token", "token")
+    return client
+
+
+def test_cached_session_answers_304_without_a_lookup(client, db):
+    first = client.get("/authors", headers={"If-None-Match": ETAG})
+    assert first.status_code == 304
+    assert db.queries == 1
+
+    second = client.get("/authors", headers={"If-None-Match": ETAG})
+    assert second.status_code == 304
+    assert second.headers["ETag"] == ETAG
+    assert db.queries == 1
+
+
+def test_unknown_session_gets_no_304(client, db):
+    db.session = None
+    response = client.get("/authors", headers={"If-None-Match": ETAG})
+    assert response.status_code == 401
+    assert "token" not in session_cache.entries
+
+
+def test_stale_etag_leaves_the_session_to_the_route(client, db):
+    response = client.get("/authors", headers={"If-None-Match": 'W/"catalog-0"'})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == ETAG
+    assert db.queries == 0
+
+
+def test_session_cache_expiry_and_eviction():
+    cache = SessionCache(ttl=60, max_entries=2)
+    now = datetime.now(timezone.utc)
+    cache.add("expired", 1, now - timedelta(seconds=1))
+    assert cache.get("expired") is None
+
+    cache.add("a", 1, now + timedelta(days=1))
+    cache.add("b", 2, now + timedelta(days=1))
+    cache.add("c", 1, now + timedelta(days=1))
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+    cache.discard_user(1)
+    assert cache.get("c") is None
+    assert cache.get("b") == 2
+
+
+def test_disabled_session_cache_stores_nothing():
+    cache = SessionCache(ttl=0, max_entries=10)
+    cache.add("token", 1, datetime.now(timezone.utc) + timedelta(days=1))
+    assert cache.get("token") is None
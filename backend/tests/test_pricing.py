@@ -0,0 +1,179 @@
+"""
+BorrowPricing, the borrow listing's SQL fee columns and
+calculate_borrow_order_book_fees must agree bit for bit (same Decimal digits
+and exponent) for any price, settings, borrowing weeks and promo code. Inputs
+are drawn from seeded generators, so every run checks the same cases. Equal
+values with different exponents (10 and 10.00) are mixed in, since they must
+not share a cache entry.
+
+The SQL comparison needs a Postgres database in TEST_DATABASE_URL.
+"""
+
+import asyncio
+import os
+import random
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import Integer, Numeric, String, cast, column, select, values
+from sqlalchemy.ext.asyncio import create_async_engine
+from utils.order import calculate_borrow_order_book_fees
+from utils.pricing import BorrowPricing, borrow_fee_columns
+
+SEEDS = range(40)
+CASES_PER_SEED = 500
+SQL_CASES = 5000
+
+
+def random_money(rng: random.Random, max_cents: int) -> Decimal:
+    return Decimal(rng.randint(0, max_cents)).scaleb(-2)
+
+
+def random_perc(rng: random.Random) -> Decimal:
+    # Numeric(4, 2)
+    return Decimal(rng.randint(0, 9999)).scaleb(-2)
+
+
+def vary_exponent(rng: random.Random, value: Decimal) -> Decimal:
+    """The same value, sometimes without its trailing zeros."""
+    return rng.choice([value, value.normalize()])
+
+
+def random_case(rng: random.Random) -> dict:
+    # Small values hit rounding boundaries far more often than large ones
+    max_cents = rng.choice([100, 10_000, 1_000_000, 100_000_000 - 1])
+    return {
+        "book_price": vary_exponent(rng, random_money(rng, max_cents)),
+        "borrowing_weeks": rng.choice([1, rng.randint(1, 52)]),
+        "borrow_perc": vary_exponent(rng, random_perc(rng)),
+        "deposit_perc": vary_exponent(rng, random_perc(rng)),
+        "delay_perc": vary_exponent(rng, random_perc(rng)),
+        "min_borrow_fee": vary_exponent(rng, random_money(rng, 100_000)),
+        "promo_code_perc": rng.choice([None, random_perc(rng)]),
+    }
+
+
+def normalized(case: dict) -> dict:
+    return {
+        key: value.normalize() if isinstance(value, Decimal) else value
+        for key, value in case.items()
+    }
+
+
+def pricing_fees(case: dict) -> dict:
+    pricing = BorrowPricing(
+        borrow_perc=case["borrow_perc"],
+        deposit_perc=case["deposit_perc"],
+        delay_perc=case["delay_perc"],
+        min_borrow_fee=case["min_borrow_fee"],
+    )
+    return pricing.fees(
+        case["book_price"], case["borrowing_weeks"], case["promo_code_perc"]
+    )
+
+
+def assert_same_decimals(actual: dict, expected: dict, case: dict):
+    for key, value in expected.items():
+        assert actual[key].as_tuple() == value.as_tuple(), (key, case)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_pricing_matches_reference(seed):
+    rng = random.Random(seed)
+    for _ in range(CASES_PER_SEED):
+        case = random_case(rng)
+        expected = calculate_borrow_order_book_fees(**case)
+        assert_same_decimals(pricing_fees(case), expected, case)
+        # Served from the cache the first call filled
+        assert_same_decimals(pricing_fees(case), expected, case)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_pricing_cache_keeps_exponents_apart(seed):
+    rng = random.Random(seed)
+    for _ in range(CASES_PER_SEED):
+        case = random_case(rng)
+        # The twin compares equal to the case, so a cache keyed on values
+        # would hand it the case's results
+        for variant in (case, normalized(case)):
+            expected = calculate_borrow_order_book_fees(**variant)
+            assert_same_decimals(pricing_fees(variant), expected, variant)
+
+
+def test_pricing_rounds_half_away_from_zero():
+    case = {
+        "book_price": Decimal("10.10"),
+        "borrowing_weeks": 1,
+        "borrow_perc": Decimal("12.50"),
+        "deposit_perc": Decimal("5.00"),
+        "delay_perc": Decimal("0.00"),
+        "min_borrow_fee": Decimal("0.00"),
+        "promo_code_perc": None,
+    }
+    fees = pricing_fees(case)
+    # 1.2625 and 0.505
+    assert fees["borrow_fees_per_week"].as_tuple() == Decimal("1.26").as_tuple()
+    assert fees["deposit_fees"].as_tuple() == Decimal("0.51").as_tuple()
+
+
+async def fetch_sql_fees(database_url: str, cases: list) -> list:
+    # Sent as text and cast to the column types, as the listing reads them
+    cases_table = values(
+        column("id", Integer),
+        column("book_price", String),
+        column("borrow_perc", String),
+        column("deposit_perc", String),
+        column("min_borrow_fee", String),
+        name="cases",
+    ).data(
+        [
+            (
+                index,
+                str(case["book_price"]),
+                str(case["borrow_perc"]),
+                str(case["deposit_perc"]),
+                str(case["min_borrow_fee"]),
+            )
+            for index, case in enumerate(cases)
+        ]
+    )
+    stmt = select(
+        cases_table.c.id,
+        *borrow_fee_columns(
+            cast(cases_table.c.book_price, Numeric(10, 2)),
+            cast(cases_table.c.borrow_perc, Numeric(4, 2)),
+            cast(cases_table.c.deposit_perc, Numeric(4, 2)),
+            cast(cases_table.c.min_borrow_fee, Numeric(6, 2)),
+        ),
+    ).order_by(cases_table.c.id)
+
+    engine = create_async_engine(database_url)
+    try:
+        async with engine.connect() as conn:
+            return (await conn.execute(stmt)).all()
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.skipif(
+    not os.getenv("TEST_DATABASE_URL"), reason="TEST_DATABASE_URL is not set"
+)
+def test_sql_fee_columns_match_pricing():
+    rng = random.Random(0)
+    cases = []
+    for _ in range(SQL_CASES // 2):
+        case = random_case(rng)
+        case["borrowing_weeks"] = 1
+        case["promo_code_perc"] = None
+        cases.extend([case, normalized(case)])
+
+    rows = asyncio.run(fetch_sql_fees(os.environ["TEST_DATABASE_URL"], cases))
+
+    assert len(rows) == len(cases)
+    for case, row in zip(cases, rows):
+        expected = calculate_borrow_order_book_fees(**case)
+        actual = pricing_fees(case)
+        for key in ("borrow_fees_per_week", "deposit_fees"):
+            sql_value = getattr(row, key)
+            assert sql_value.as_tuple() == expected[key].as_tuple(), (key, case)
+            assert sql_value.as_tuple() == actual[key].as_tuple(), (key, case)
@@ -0,0 +1,82 @@
+"""
+Statements run for the app's own bookkeeping are not counted against the
+request, so strict mode never fails them. The pub/sub test needs a Postgres
+database in TEST_DATABASE_URL.
+"""
+
+import asyncio
+import os
+
+import pytest
+from core.metrics import instrument_engine
+from core.pubsub import PostgresPubSub
+from core.query_tracker import UNTRACKED, QueryBudgetExceeded, track_queries
+from db.database import internal_engine
+from sqlalchemy import create_engine, text
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine, "test")
+    yield engine
+    engine.dispose()
+
+
+def test_strict_mode_fails_the_statement_over_budget(engine):
+    with engine.connect() as conn, track_queries(budget=1) as stats:
+        conn.execute(text("SELECT 1"))
+        with pytest.raises(QueryBudgetExceeded):
+            conn.execute(text("SELECT 2"))
+    assert stats.count == 1
+
+
+def test_untracked_statements_are_not_counted(engine):
+    with engine.connect() as conn, track_queries(budget=1) as stats:
+        for _ in range(5):
+            conn.execute(text("SELECT 1"), execution_options=UNTRACKED)
+        untracked_engine = engine.execution_options(**UNTRACKED)
+        with untracked_engine.connect() as untracked_conn:
+            for _ in range(5):
+                untracked_conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 1"))
+    assert stats.count == 1
+    assert not stats.get_suspected_n_plus_one()
+
+
+def test_internal_engine_is_untracked():
+    assert internal_engine.get_execution_options()["track_queries"] is False
+
+
+@pytest.mark.skipif(
+    not os.getenv("TEST_DATABASE_URL"), reason="TEST_DATABASE_URL is not set"
+)
+def test_strict_mode_does_not_break_pubsub_delivery():
+    async def run():
+        received = []
+        delivered = asyncio.Event()
+
+        def handler(event):
+            received.append(event)
+            if len(received) == 3:
+                delivered.set()
+
+        pubsub = PostgresPubSub("test_query_tracker")
+        connected = asyncio.Event()
+
+        async def on_connect():
+            connected.set()
+
+        await pubsub.start(handler, on_connect=on_connect)
+        try:
+            await asyncio.wait_for(connected.wait(), 10)
+            with track_queries(budget=1, repeat_threshold=2):
+                assert await pubsub.publish({"n": 1})
+                assert await pubsub.publish({"n": 2})
+                assert await pubsub.publish_many([{"n": 3}])
+            await asyncio.wait_for(delivered.wait(), 10)
+        finally:
+            await pubsub.stop()
+        return received
+
+    assert asyncio.run(run()) == [{"n": 1}, {"n": 2}, {"n": 3}]
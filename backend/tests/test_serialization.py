@@ -0,0 +1,53 @@
+from decimal import Decimal
+
+import fastapi.routing
+import pytest
+from core.serialization import JSONResponse, ORJSONRoute, dumps
+from fastapi import APIRouter, FastAPI, Response
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+
+class Total(BaseModel):
+    total: Decimal
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def jsonable_encoder(*args, **kwargs):
+        raise AssertionError("jsonable_encoder ran on the response")
+
+    # Only routes without a response model would reach it
+    monkeypatch.setattr(fastapi.routing, "jsonable_encoder", jsonable_encoder)
+
+    router = APIRouter(route_class=ORJSONRoute)
+
+    @router.get("/raw", status_code=201)
+    async def raw(response: Response):
+        response.headers["X-Test"] = "1"
+        response.set_cookie("session_token", "token")
+        return {"balance": Decimal("12.30"), "fee": Decimal("5")}
+
+    @router.get("/model", response_model=Total)
+    async def model():
+        return {"total": Decimal("1.10")}
+
+    app = FastAPI(default_response_class=JSONResponse)
+    app.include_router(router)
+    return TestClient(app)
+
+
+def test_decimals_render_as_strings():
+    assert dumps({"amount": Decimal("10.00")}) == b'{"amount":"10.00"}'
+
+
+def test_route_without_model_skips_jsonable_encoder(client):
+    response = client.get("/raw")
+    assert response.status_code == 201
+    assert response.text == '{"balance":"12.30","fee":"5"}'
+    assert response.headers["x-test"] == "1"
+    assert "session_token=token" in response.headers["set-cookie"]
+
+
+def test_route_with_model_is_unchanged(client):
+    assert client.get("/model").text == '{"total":"1.10"}'
@@ -1,9 +1,12 @@
+import time
 from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
 
 from db.database import get_db
 from fastapi import Cookie, Depends, HTTPException, status
 from models.session import Session
 from models.user import User, UserRole
+from settings import settings
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
@@ -19,6 +22,55 @@ async def get_user_by_email(email: str, db: AsyncSession):
     return result.scalars().first()
 
 
+class SessionCache:
+    """
+    Session tokens this worker has recently seen valid in the database, so a
+    304 can be answered without a lookup. Entries live for at most `ttl`
+    seconds and never past the session's own expiry. Logout and password
+    resets drop them here, but other workers keep theirs until the ttl runs
+    out, which bounds how long a revoked token can still get a 304.
+    """
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # token -> (user_id, monotonic deadline), oldest first
+        self.entries: Dict[str, Tuple[int, float]] = {}
+
+    def get(self, token: str) -> Optional[int]:
+        entry = self.entries.get(token)
+        if entry is None:
+            return None
+        user_id, deadline = entry
+        if deadline <= time.monotonic():
+            del self.entries[token]
+            return None
+        return user_id
+
+    def add(self, token: str, user_id: int, expires_at: datetime):
+        if self.ttl <= 0:
+            return
+        remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        if remaining <= 0:
+            return
+        self.entries.pop(token, None)
+        while len(self.entries) >= self.max_entries:
+            del self.entries[next(iter(self.entries))]
+        self.entries[token] = (user_id, time.monotonic() + min(self.ttl, remaining))
+
+    def discard(self, token: str):
+        self.entries.pop(token, None)
+
+    def discard_user(self, user_id: int):
+        for token in [t for t, (uid, _) in self.entries.items() if uid == user_id]:
+            del self.entries[token]
+
+
+session_cache = SessionCache(
+    settings.SESSION_CACHE_SECONDS, settings.SESSION_CACHE_MAX_ENTRIES
+)
+
+
 async def get_user_session(
     session_token: str | None = Cookie(None),
 ):
@@ -47,6 +99,7 @@ async def get_user_id_via_session(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Session token has expired.",
         )
+    session_cache.add(session_token, session_data.user_id, session_data.expires_at)
     return session_data.user_id
 
 
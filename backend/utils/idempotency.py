@@ -0,0 +1,116 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import orjson
+from fastapi import HTTPException, status
+from models.idempotency import IdempotencyKey
+from settings import settings  # type: ignore
+from sqlalchemy import func, null, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Postgres lock_not_available, raised once lock_timeout runs out
+LOCK_NOT_AVAILABLE = "55P03"
+
+# Seconds the claim's statement_timeout exceeds its lock_timeout by
+CLAIM_STATEMENT_TIMEOUT_MARGIN = 5
+
+# The key column holds the scope prefix too
+MAX_IDEMPOTENCY_KEY_LENGTH = 200
+
+
+def hash_request(payload) -> str:
+    """sha256 of the request payload with sorted keys, so key order is irrelevant."""
+    return hashlib.sha256(
+        orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    ).hexdigest()
+
+
+async def claim_idempotency_key(
+    db: AsyncSession, key: str, request_hash: str
+) -> Optional[IdempotencyKey]:
+    """
+    Claims `key` inside the caller's transaction, before any of its writes.
+
+    Returns None when the request owns the key and should run; the row stays
+    locked until the caller commits or rolls back, so a duplicate sent
+    meanwhile waits for the outcome instead of running twice. Returns the
+    stored key when the request already ran, for the caller to replay.
+    """
+    lock_timeout_seconds = settings.IDEMPOTENCY_LOCK_TIMEOUT_SECONDS
+    now = datetime.now(timezone.utc)
+    stmt = insert(IdempotencyKey).values(
+        key=key,
+        request_hash=request_hash,
+        expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+    )
+    # Expired keys are taken over as if they were new
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IdempotencyKey.key],
+        set_={
+            "request_hash": stmt.excluded.request_hash,
+            "status_code": null(),
+            "response_body": null(),
+            "created_at": func.now(),
+            "expires_at": stmt.excluded.expires_at,
+        },
+        where=IdempotencyKey.expires_at < now,
+    ).returning(IdempotencyKey.key)
+
+    try:
+        # Bounds how long a duplicate waits on the request holding the key.
+        # The pool's statement_timeout may be shorter and would cancel the
+        # wait first (57014 instead of 55P03), so it is lifted past it.
+        await db.execute(
+            select(
+                func.set_config("lock_timeout", f"{lock_timeout_seconds}s", True),
+                func.set_config(
+                    "statement_timeout",
+                    f"{lock_timeout_seconds + CLAIM_STATEMENT_TIMEOUT_MARGIN}s",
+                    True,
+                ),
+            )
+        )
+        claimed = (await db.execute(stmt)).scalar_one_or_none()
+        await db.execute(text("SET LOCAL lock_timeout TO DEFAULT"))
+        await db.execute(text("SET LOCAL statement_timeout TO DEFAULT"))
+    except DBAPIError as e:
+        if getattr(e.orig, "sqlstate", None) != LOCK_NOT_AVAILABLE:
+            raise
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still in progress.",
+            headers={"Retry-After": str(lock_timeout_seconds)},
+        )
+
+    if claimed is not None:
+        return None
+
+    stored = (
+        await db.execute(select(IdempotencyKey).where(IdempotencyKey.key == key))
+    ).scalar_one()
+
+    if stored.request_hash != request_hash:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request.",
+        )
+
+    return stored
+
+
+async def store_idempotent_response(
+    db: AsyncSession, key: str, status_code: int, response_body: dict
+):
+    """Records the response of a claimed key; commits with the caller's work."""
+    await db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.key == key)
+        .values(status_code=status_code, response_body=response_body)
+        .execution_options(synchronize_session=False)
+    )
+
@@ -1,9 +1,12 @@
 import os
 import traceback
+from typing import List
 
 from core.websocket import webSocket_connection_manager
 from fastapi import Header, HTTPException, status
 from models.notification import Notification, NotificationType
+from schemas.notification import NotificationRequest
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
@@ -44,6 +47,66 @@ async def send_notification(
         await db.rollback()
 
 
+async def send_bulk_notifications(
+    db: AsyncSession,
+    notifications: List[NotificationRequest],
+) -> int:
+    # One multi-row INSERT ... RETURNING for the whole batch
+    stmt = (
+        insert(Notification)
+        .values(
+            [
+                {
+                    "user_id": notification.user_id,
+                    "type": notification.type,
+                    "data": notification.data,
+                }
+                for notification in notifications
+            ]
+        )
+        .returning(
+            Notification.id,
+            Notification.user_id,
+            Notification.type,
+            Notification.data,
+            Notification.created_at,
+            Notification.read_at,
+        )
+    )
+
+    try:
+        result = await db.execute(stmt)
+        inserted_notifications = result.all()
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    # Pushed as one pub/sub batch, not one NOTIFY per recipient
+    await webSocket_connection_manager.send_personal_messages(
+        [
+            (
+                {
+                    "id": notification.id,
+                    "user_id": notification.user_id,
+                    "type": notification.type.value,
+                    "data": notification.data,
+                    "created_at": notification.created_at.isoformat(),
+                    "read_at": (
+                        notification.read_at.isoformat()
+                        if notification.read_at
+                        else None
+                    ),
+                },
+                notification.user_id,
+            )
+            for notification in inserted_notifications
+        ]
+    )
+
+    return len(inserted_notifications)
+
+
 async def get_scheduler_secret(
     x_scheduler_secret: str = Header(..., alias="X-Scheduler-Secret"),
 ):
@@ -58,7 +58,9 @@ def calculate_borrow_order_book_fees(
         borrow_fees = original_borrowing_fees - promo_code_discount
 
     return {
-        "borrow_fees_per_week": base_borrow_fee_per_week,
+        "borrow_fees_per_week": base_borrow_fee_per_week.quantize(
+            Decimal("0.01"), rounding=ROUND_HALF_UP
+        ),
         "borrow_fees": borrow_fees.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
         "deposit_fees": deposit_fees.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
         "delay_fees_per_day": delay_fees_per_day.quantize(
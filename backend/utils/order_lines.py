@@ -0,0 +1,111 @@
+from typing import Dict, Iterable, List, Tuple
+
+from models.book import BookDetails
+from models.order import BorrowBookProblem, BorrowOrderBook, PurchaseOrderBook
+from sqlalchemy import Integer, bindparam, func, insert, update
+from sqlalchemy.dialects.postgresql import ARRAY
+
+# Set-based statements for order and return lines. Each one persists any number
+# of lines in a single statement; the array parameters keep the SQL text the
+# same whatever the line count. The UPDATEs skip ORM session synchronization,
+# callers that hold the affected objects update them with set_committed_value.
+
+
+def insert_borrow_order_lines(order_id, user_id: int, lines: List[dict]):
+    """
+    Multi-row INSERT of borrow lines returning their ids. `order_id` may be a
+    SQL expression, e.g. the id of an order inserted in the same statement.
+    """
+    return (
+        insert(BorrowOrderBook)
+        .values(
+            [
+                {
+                    **line,
+                    "borrow_book_problem": BorrowBookProblem.NORMAL.value,
+                    "order_id": order_id,
+                    "user_id": user_id,
+                }
+                for line in lines
+            ]
+        )
+        .returning(BorrowOrderBook.id)
+    )
+
+
+def insert_purchase_order_lines(order_id, user_id: int, lines: List[dict]):
+    """Multi-row INSERT of purchase lines returning their ids."""
+    return (
+        insert(PurchaseOrderBook)
+        .values(
+            [{**line, "order_id": order_id, "user_id": user_id} for line in lines]
+        )
+        .returning(PurchaseOrderBook.id)
+    )
+
+
+def adjust_book_stock(stock_changes: Dict[int, int]):
+    """
+    UPDATE available_stock by a signed amount per book details id, returning
+    the ids it changed. Rows that would go below zero are left alone, so the
+    caller compares the returned ids against what it asked for.
+    """
+    changes = func.unnest(
+        bindparam(
+            "book_details_ids", list(stock_changes), type_=ARRAY(Integer), unique=True
+        ),
+        bindparam(
+            "stock_changes",
+            list(stock_changes.values()),
+            type_=ARRAY(Integer),
+            unique=True,
+        ),
+    ).table_valued("book_details_id", "stock_change")
+
+    return (
+        update(BookDetails)
+        .where(
+            BookDetails.id == changes.c.book_details_id,
+            BookDetails.available_stock + changes.c.stock_change >= 0,
+        )
+        .values(available_stock=BookDetails.available_stock + changes.c.stock_change)
+        .returning(BookDetails.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def sum_stock_changes(changes: Iterable[Tuple[int, int]]) -> Dict[int, int]:
+    """
+    Fold (book_details_id, change) pairs into one change per book, e.g. two
+    borrow lines of the same book.
+    """
+    stock_changes: Dict[int, int] = {}
+    for book_details_id, change in changes:
+        stock_changes[book_details_id] = stock_changes.get(book_details_id, 0) + change
+    return stock_changes
+
+
+def assign_return_order(return_order_id: int, user_id: int, borrow_order_book_ids):
+    """
+    Attach borrow lines to a return order with `id = ANY(...)`, skipping lines
+    that another return order claimed meanwhile. Returns the ids it updated.
+    """
+    return (
+        update(BorrowOrderBook)
+        .where(
+            BorrowOrderBook.id
+            == func.any(
+                bindparam(
+                    "borrow_order_book_ids",
+                    list(borrow_order_book_ids),
+                    type_=ARRAY(Integer),
+                    unique=True,
+                )
+            ),
+            BorrowOrderBook.user_id == user_id,
+            BorrowOrderBook.return_order_id.is_(None),
+        )
+        .values(return_order_id=return_order_id)
+        .returning(BorrowOrderBook.id)
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,154 @@
+from decimal import Decimal
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from sqlalchemy import func
+from utils.order import calculate_borrow_order_book_fees
+
+# Money is 2 decimal places and percentages are Numeric(4, 2), so prices are
+# handled in cents and percentages in hundredths of a percent. A fee such as
+# price * perc / 100 is then an exact integer count of millionths.
+MICROS_PER_UNIT = 10**6
+
+
+def _to_minor_units(value: Decimal) -> Optional[int]:
+    """Hundredths of `value` as an int, or None if it has more precision."""
+    scaled = value * 100
+    if scaled != scaled.to_integral_value():
+        return None
+    return int(scaled)
+
+
+def _round_half_up_to_cents(numerator: int, denominator: int) -> Decimal:
+    """Round numerator / denominator (in millionths) to cents, half away from zero."""
+    cents_denominator = denominator * (MICROS_PER_UNIT // 100)
+    cents, remainder = divmod(abs(numerator), cents_denominator)
+    if 2 * remainder >= cents_denominator:
+        cents += 1
+    if numerator < 0:
+        cents = -cents
+    return Decimal(cents).scaleb(-2)
+
+
+def _cache_key(value: Optional[Decimal]) -> Optional[str]:
+    # Decimal("10") == Decimal("10.00") with the same hash, but the exponent
+    # shows in the results, so the key is the exact string form
+    return None if value is None else str(value)
+
+
+@lru_cache(maxsize=4096)
+def _borrow_fees(
+    book_price_key: str,
+    borrowing_weeks: int,
+    promo_code_perc_key: Optional[str],
+    settings_version: Tuple[str, str, str, str],
+) -> dict:
+    book_price = Decimal(book_price_key)
+    promo_code_perc = (
+        Decimal(promo_code_perc_key) if promo_code_perc_key is not None else None
+    )
+    borrow_perc, deposit_perc, delay_perc, min_borrow_fee = map(
+        Decimal, settings_version
+    )
+    units = [
+        _to_minor_units(value)
+        for value in (book_price, borrow_perc, deposit_perc, delay_perc, min_borrow_fee)
+    ]
+    promo_units = (
+        _to_minor_units(promo_code_perc) if promo_code_perc is not None else 0
+    )
+    if None in units or promo_units is None:
+        # Not representable in minor units, use the Decimal arithmetic as is
+        return calculate_borrow_order_book_fees(
+            book_price=book_price,
+            borrowing_weeks=borrowing_weeks,
+            borrow_perc=borrow_perc,
+            deposit_perc=deposit_perc,
+            delay_perc=delay_perc,
+            min_borrow_fee=min_borrow_fee,
+            promo_code_perc=promo_code_perc,
+        )
+
+    price, borrow, deposit, delay, min_fee = units
+
+    # All amounts below are in millionths
+    base_borrow_fee_per_week = max(price * borrow, min_fee * 10**4)
+    original_borrowing_fees = base_borrow_fee_per_week * borrowing_weeks
+    # promo / 100 in hundredths of a percent leaves a denominator of 10**4
+    promo_code_discount = original_borrowing_fees * promo_units
+
+    return {
+        "borrow_fees_per_week": _round_half_up_to_cents(base_borrow_fee_per_week, 1),
+        "borrow_fees": _round_half_up_to_cents(
+            original_borrowing_fees * 10**4 - promo_code_discount, 10**4
+        ),
+        "deposit_fees": _round_half_up_to_cents(price * deposit, 1),
+        # base / 7 + price * delay, over a common denominator of 7
+        "delay_fees_per_day": _round_half_up_to_cents(
+            base_borrow_fee_per_week + 7 * price * delay, 7
+        ),
+        "promo_code_discount": _round_half_up_to_cents(promo_code_discount, 10**4),
+    }
+
+
+class BorrowPricing:
+    """
+    Borrow fees for one snapshot of the fee settings, with the same results as
+    calculate_borrow_order_book_fees. Identical inputs are computed once, so
+    books sharing a price across carts and orders cost a single calculation.
+    """
+
+    def __init__(
+        self,
+        borrow_perc: Decimal,
+        deposit_perc: Decimal,
+        delay_perc: Decimal,
+        min_borrow_fee: Decimal,
+    ):
+        # Changing any setting changes the memoization key
+        self.settings_version = tuple(
+            _cache_key(value)
+            for value in (borrow_perc, deposit_perc, delay_perc, min_borrow_fee)
+        )
+
+    @classmethod
+    def from_settings(cls, settings) -> "BorrowPricing":
+        return cls(
+            borrow_perc=settings.borrow_perc,
+            deposit_perc=settings.deposit_perc,
+            delay_perc=settings.delay_perc,
+            min_borrow_fee=settings.min_borrow_fee,
+        )
+
+    def fees(
+        self,
+        book_price: Decimal,
+        borrowing_weeks: int,
+        promo_code_perc: Optional[Decimal] = None,
+    ) -> dict:
+        # Copied so callers can't mutate the cached result
+        return dict(
+            _borrow_fees(
+                _cache_key(book_price),
+                borrowing_weeks,
+                _cache_key(promo_code_perc),
+                self.settings_version,
+            )
+        )
+
+
+def borrow_fee_columns(book_price, borrow_perc, deposit_perc, min_borrow_fee):
+    """
+    SQL expressions for the weekly borrow fee and deposit of a one-week borrow,
+    so listings get them straight from the query. numeric round() rounds half
+    away from zero and always returns scale 2, so the values come back as the
+    same Decimals, exponent included, as BorrowPricing's.
+    """
+    borrow_fees_per_week = func.round(
+        func.greatest(book_price * borrow_perc / 100, min_borrow_fee), 2
+    )
+    deposit_fees = func.round(book_price * deposit_perc / 100, 2)
+    return (
+        borrow_fees_per_week.label("borrow_fees_per_week"),
+        deposit_fees.label("deposit_fees"),
+    )
@@ -1,16 +1,9 @@
 from core.websocket import webSocket_connection_manager
 from models.order import Order, PickUpType, ReturnOrder
-from models.user import UserRole
+from models.user import User, UserRole
 
 
-async def send_created_order(
-    order: Order, borrow_order_books: list, purchase_order_books: list
-):
-    number_of_purchase_books = 0
-
-    for book in purchase_order_books:
-        number_of_purchase_books += book.quantity
-
+async def send_created_order(order: Order, user: User, number_of_books: int):
     new_order_object = {
         "id": order.id,
         "created_at": order.created_at.isoformat(),
@@ -18,21 +11,21 @@ async def send_created_order(
         "pickup_type": order.pickup_type.value,
         "phone_number": order.phone_number,
         "user": {
-            "first_name": order.user.first_name,
-            "last_name": order.user.last_name,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
         },
-        "number_of_books": len(borrow_order_books) + number_of_purchase_books,
+        "number_of_books": number_of_books,
         "courier_id": order.courier_id,
         "pickup_date": order.pickup_date,
         "status": order.status,
     }
     if order.pickup_type == PickUpType.COURIER:
-        await webSocket_connection_manager.broadcast_to_role(
+        await webSocket_connection_manager.publish_board_change(
             {"message": "order_created", "order": new_order_object}, UserRole.COURIER
         )
 
     if order.pickup_type == PickUpType.SITE:
-        await webSocket_connection_manager.broadcast_to_role(
+        await webSocket_connection_manager.publish_board_change(
             {"message": "order_created", "order": new_order_object}, UserRole.EMPLOYEE
         )
 
@@ -56,20 +49,20 @@ async def send_created_return_order(
         "status": return_order.status.value,
     }
     if return_order.pickup_type == PickUpType.COURIER:
-        await webSocket_connection_manager.broadcast_to_role(
+        await webSocket_connection_manager.publish_board_change(
             {"message": "return_order_created", "return_order": new_order_object},
             UserRole.COURIER,
         )
 
     if return_order.pickup_type == PickUpType.SITE:
-        await webSocket_connection_manager.broadcast_to_role(
+        await webSocket_connection_manager.publish_board_change(
             {"message": "return_order_created", "return_order": new_order_object},
             UserRole.EMPLOYEE,
         )
 
 
 async def send_updated_order(order: Order, userRole: UserRole):
-    await webSocket_connection_manager.broadcast_to_role(
+    await webSocket_connection_manager.publish_board_change(
         {
             "message": "order_status_updated",
             "courier_id": order.courier_id,
@@ -81,7 +74,7 @@ async def send_updated_order(order: Order, userRole: UserRole):
 
 
 async def send_updated_return_order(return_order: Order, userRole: UserRole):
-    await webSocket_connection_manager.broadcast_to_role(
+    await webSocket_connection_manager.publish_board_change(
         {
             "message": "return_order_status_updated",
             "return_order_id": return_order.id,
@@ -108,7 +101,7 @@ async def send_courier_return_order(return_order: ReturnOrder):
         "status": return_order.status.value,
     }
 
-    await webSocket_connection_manager.broadcast_to_role(
+    await webSocket_connection_manager.publish_board_change(
         {"message": "courier_return_order", "return_order": new_order_object},
         UserRole.EMPLOYEE,
     )
@@ -1,4 +1,7 @@
+import base64
+from datetime import datetime
 from decimal import Decimal
+from typing import Tuple
 
 from fastapi import HTTPException, status
 from models.transaction import Transaction, TransactionType
@@ -50,3 +53,20 @@ async def add_to_wallet(
     db.add(transaction)
 
     return transaction
+
+
+def encode_transactions_cursor(created_at: datetime, transaction_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{transaction_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_transactions_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, transaction_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(transaction_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid transactions cursor.",
+        )
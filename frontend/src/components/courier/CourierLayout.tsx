@@ -98,7 +98,17 @@ const CourierLayout = () => {
     console.error("Socket error:", event);
   }
 
-  connectWebSocket(onSocketOpen, onSocketMessage, onSocketClose, onSocketError);
+  function onOrderBoardReset() {
+    queryClient.invalidateQueries({ queryKey: ["allStaffOrders"] });
+  }
+
+  connectWebSocket(
+    onSocketOpen,
+    onSocketMessage,
+    onSocketClose,
+    onSocketError,
+    { onReset: onOrderBoardReset },
+  );
 
   return (
     <div className="min-h-screen bg-gray-50">
@@ -111,7 +111,17 @@ const EmployeeLayout = () => {
     console.error("Socket error:", event);
   }
 
-  connectWebSocket(onSocketOpen, onSocketMessage, onSocketClose, onSocketError);
+  function onOrderBoardReset() {
+    queryClient.invalidateQueries({ queryKey: ["allStaffOrders"] });
+  }
+
+  connectWebSocket(
+    onSocketOpen,
+    onSocketMessage,
+    onSocketClose,
+    onSocketError,
+    { onReset: onOrderBoardReset },
+  );
 
   return (
     <div className="flex">
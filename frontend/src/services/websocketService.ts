@@ -1,8 +1,17 @@
 const API_BASE_URL = import.meta.env.VITE_APP_API_URL;
 
 let socket: WebSocket | null = null;
+// Last order-board version applied, sent back as `since` on reconnect.
+let boardVersion: number | null = null;
 
-const getWebSocketURL = (): string | null => {
+export type OrderBoardOptions = {
+  // The deltas since the last version are gone, reload the whole board.
+  onReset: () => void;
+};
+
+type OrderBoardDelta = { version: number; message: string };
+
+const getWebSocketURL = (orderBoard?: OrderBoardOptions): string | null => {
   if (!API_BASE_URL) {
     console.error("VITE_APP_API_URL is not defined in your .env file.");
     return null;
@@ -11,27 +20,72 @@ const getWebSocketURL = (): string | null => {
   // Convert http/https to ws/wss for the WebSocket protocol.
   const wsUrl = API_BASE_URL.replace(/^http/, "ws");
 
+  if (orderBoard) {
+    return `${wsUrl}/ws?since=${boardVersion ?? 0}`;
+  }
   return `${wsUrl}/ws`;
 };
 
+const handleOrderBoardMessage = (
+  data: { message: string; version: number | null; deltas?: OrderBoardDelta[] },
+  onMessage: (event: MessageEvent) => void,
+  orderBoard: OrderBoardOptions,
+) => {
+  // Without a version yet, the first frame only tells us where the stream is.
+  if (data.message === "order_board_reset" || boardVersion === null) {
+    boardVersion = data.version;
+    orderBoard.onReset();
+    return;
+  }
+
+  for (const delta of data.deltas ?? []) {
+    // Replayed deltas may repeat ones that were already applied.
+    if (delta.version <= boardVersion) continue;
+    boardVersion = delta.version;
+    // Deltas carry the fields of the plain message, so handlers are shared.
+    onMessage(new MessageEvent("message", { data: JSON.stringify(delta) }));
+  }
+};
+
 export const connectWebSocket = (
   onOpen: () => void,
   onMessage: (event: MessageEvent) => void,
   onClose: () => void,
   onError: (event: Event) => void,
+  orderBoard?: OrderBoardOptions,
 ) => {
   if (socket && socket.readyState === WebSocket.OPEN) {
     console.log("WebSocket is already connected.");
     return;
   }
 
-  const url = getWebSocketURL();
+  const url = getWebSocketURL(orderBoard);
   if (!url) return; // Don't connect if we can't get a URL (e.g., no token)
 
   socket = new WebSocket(url);
 
   socket.onopen = onOpen;
-  socket.onmessage = onMessage;
+  socket.onmessage = (event: MessageEvent) => {
+    // Answer the server heartbeat so the connection is not evicted as idle.
+    try {
+      const data = JSON.parse(event.data);
+      if (data.message === "ping") {
+        socket?.send("pong");
+        return;
+      }
+      if (
+        orderBoard &&
+        (data.message === "order_board_deltas" ||
+          data.message === "order_board_reset")
+      ) {
+        handleOrderBoardMessage(data, onMessage, orderBoard);
+        return;
+      }
+    } catch {
+      // Not JSON, let the caller deal with it.
+    }
+    onMessage(event);
+  };
   socket.onclose = onClose;
   socket.onerror = onError;
 };
@@ -41,6 +95,7 @@ export const disconnectWebSocket = () => {
     socket.close();
     socket = null;
   }
+  boardVersion = null;
 };
 
 export const getSocket = () => socket;